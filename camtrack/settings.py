@@ -38,10 +38,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django_select2',
     'contracts.apps.ContractsConfig',
 ]
 
 MIDDLEWARE = [
+    'contracts.middleware.PerformanceBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -129,6 +131,89 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Background exports (contracts.services.jobs), 0 runs them inline after commit
+EXPORT_JOB_WORKERS = 2
+
+# Background device imports (contracts.services.import_sessions), same rule
+IMPORT_JOB_WORKERS = 1
+
+# Per-view budgets checked by contracts.middleware.PerformanceBudgetMiddleware, keyed
+# by URL name and laid over "default". Metrics: queries, db_ms, template_ms, total_ms
+# and response_bytes. Breaches are logged, and fail the test suite (see TEST_RUNNER).
+PERFORMANCE_BUDGETS = {
+    'default': {'queries': 12, 'total_ms': 3000},
+    'contract_list': {'queries': 5},
+    'warehouse_list': {'queries': 6},
+    'contract_detail': {'queries': 15},
+    'warehouse_detail': {'queries': 10},
+    'maintenance_list': {'queries': 10},
+    'task_list': {'queries': 9},
+    'coordination_list': {'queries': 9},
+    # Counter rebuild and fragment versions of the touched warehouses included
+    'bulk_update_devices': {'queries': 16},
+    # One page query per synced model and one for the tombstones
+    'sync': {'queries': 14},
+}
+
+# Raise instead of logging when a request goes over budget
+PERFORMANCE_BUDGETS_STRICT = False
+
+TEST_RUNNER = 'contracts.testing.BudgetTestRunner'
+
+# Template fragments and reference data (contracts.services.fragments / .reference).
+# Local memory is per process: when running several workers switch to a shared
+# backend so invalidations reach all of them, e.g.
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'cache',
+# or Redis through django-redis:
+#   'BACKEND': 'django_redis.cache.RedisCache',
+#   'LOCATION': 'redis://127.0.0.1:6379/1',
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'camtrack',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Querysets of the AJAX Select2 widgets, one entry per rendered form: they must
+    # outlive a form left open for days, so neither time out nor get culled with the
+    # short-lived entries above. A form rendered by one worker is queried by any
+    # other, so the entries live in a directory all of them share (or in Redis,
+    # see above).
+    'select2': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SELECT2_CACHE_DIR', BASE_DIR / 'cache' / 'select2'),
+        'TIMEOUT': 7 * 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Cache alias and lifetime (seconds) of the contracts, zones and categories of the
+# filter dropdowns; saves and deletes evict them sooner
+REFERENCE_CACHE_ALIAS = 'default'
+REFERENCE_CACHE_TIMEOUT = 300
+
+# Rows are stamped (updated_at) when saved but seen when their transaction commits.
+# Code writing synced rows in bulk commits them SYNC_BATCH_SIZE rows at a time
+# (sync.batches), each batch well within SYNC_MAX_TRANSACTION_SECONDS, which on
+# PostgreSQL is also the statement timeout of those transactions. The sync feed and
+# the API validators hold back the changes of the last SYNC_SETTLE_SECONDS, which
+# must be longer, so no commit lands behind a position already handed out
+SYNC_BATCH_SIZE = 500
+SYNC_MAX_TRANSACTION_SECONDS = 20
+SYNC_SETTLE_SECONDS = 30
+
+# Seconds a {% cachefragment %} stays cached when nothing it shows changes
+# (contracts.services.fragments invalidates it sooner on change)
+FRAGMENT_CACHE_TIMEOUT = 600
+
+# AJAX Select2 widgets (contracts.fields) keep their queryset in this cache between the
+# form page and the choices requests: every process must share it (file or Redis)
+SELECT2_CACHE_BACKEND = 'select2'
+# base.html already loads jQuery and Select2, the widgets only add django_select2.js
+SELECT2_JS = []
+SELECT2_CSS = []
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,211 @@
+import hashlib
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.db.models import Max
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_GET
+
+from .models import Contract, CoordinationRequest, Device, MaintenanceCard, Task, Tombstone, Zone
+from .services import keyset, sync
+from .services.devices import filter_devices
+from .views import ContractListView, CoordinationListView, MaintenanceListView, TaskListView
+
+
+# Read-only JSON API, versioned in the URL (/api/v1/<resource>/). Each resource is
+# filtered by the same code as its HTML list (same query parameters, same default
+# contract) and paginated with the same keyset cursors. ``?fields=a,b`` names the
+# columns to read, so a page is one values() query of just those columns.
+#
+# Responses carry an ETag and a Last-Modified read from the database: the newest
+# updated_at of the models a resource shows, or the newest tombstone of one of them.
+# A poll with If-None-Match (or If-Modified-Since) then costs one MAX() per model,
+# each answered by the model's (updated_at, id) sync index, instead of the rows.
+#
+# A row is stamped when saved but seen when its transaction commits, at most
+# SYNC_SETTLE_SECONDS later (services.sync). While the newest change is that recent,
+# plus the second Last-Modified is rounded to, a change may still be on its way and
+# no validator is sent.
+
+API_VERSION = 'v1'
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class ApiError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Resource:
+    model: type
+    # The HTML list whose get_queryset() and keyset_ordering the resource shares
+    list_view: Optional[type] = None
+    # Without a list view: the ordering, and a function filtering the rows from the query parameters
+    ordering: tuple = ('pk',)
+    filter_rows: Optional[Callable] = None
+    # Annotations of the queryset that can be selected like columns
+    extra_fields: tuple = ()
+    # Other models whose changes move rows in or out of the resource (filters, default contract)
+    depends_on: tuple = ()
+
+    @property
+    def fields(self):
+        return tuple(f.attname for f in self.model._meta.concrete_fields) + self.extra_fields
+
+    @property
+    def models(self):
+        return (self.model, *self.depends_on)
+
+    def queryset(self, request):
+        """``(queryset, ordering)`` of the rows ``request`` asks for."""
+        if self.list_view is not None:
+            view = self.list_view()
+            view.setup(request)
+            return view.get_queryset(), tuple(view.keyset_ordering)
+        queryset = self.model.objects.all()
+        if self.filter_rows is not None:
+            queryset = self.filter_rows(queryset, request.GET)
+        return queryset, self.ordering
+
+
+def _filter_zones(zones, params):
+    contract = params.get('contract')
+    return zones.filter(contract_id=contract) if contract else zones
+
+
+def _filter_devices(devices, params):
+    # The warehouse detail page filters, with the warehouse as a parameter
+    warehouse = params.get('warehouse')
+    if warehouse:
+        devices = devices.filter(warehouse_id=warehouse)
+    return filter_devices(
+        devices,
+        status=params.get('status'),
+        zone=params.get('zone'),
+        query=params.get('q'),
+        category=params.get('category'),
+    )
+
+
+RESOURCES = {
+    'contracts': Resource(Contract, list_view=ContractListView),
+    'zones': Resource(Zone, filter_rows=_filter_zones),
+    'devices': Resource(Device, filter_rows=_filter_devices),
+    'maintenance': Resource(MaintenanceCard, list_view=MaintenanceListView, depends_on=(Device, Zone, Contract)),
+    'tasks': Resource(
+        Task, list_view=TaskListView,
+        extra_fields=('sla_remaining_days', 'sla_delay_days', 'sla_late_days', 'sla_status'),
+        depends_on=(Zone, Contract),
+    ),
+    'coordination': Resource(CoordinationRequest, list_view=CoordinationListView, depends_on=(Zone, Contract)),
+}
+
+
+def selected_fields(resource, params):
+    """The ``?fields=`` columns, every column when absent."""
+    value = params.get('fields', '')
+    if not value.strip():
+        return resource.fields
+    names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}.")
+    return tuple(names)
+
+
+def page_size(params, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    value = params.get('limit')
+    if not value:
+        return default
+    try:
+        size = int(value)
+    except ValueError:
+        raise ApiError(f"Invalid limit: {value}.")
+    return min(max(size, 1), maximum)
+
+
+def _page_url(request, cursor):
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f"{request.path}?{params.urlencode()}"
+
+
+def last_change(config, now=None):
+    """
+    When the rows of ``config`` last changed, None while that change is too recent
+    to be sure no earlier one is still committing.
+    """
+    now = now or timezone.now()
+    moments = [model.objects.aggregate(moment=Max('updated_at'))['moment'] for model in config.models]
+    names = [model._meta.model_name for model in config.models]
+    moments.append(Tombstone.objects.filter(model__in=names).aggregate(moment=Max('deleted_at'))['moment'])
+    newest = max((moment for moment in moments if moment), default=None)
+    if newest and newest > now - sync.settle_delay() - timedelta(seconds=1):
+        return None
+    # The SLA columns of the tasks change with the day, not with a save
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(newest or day, day)
+
+
+def _modified(request, resource):
+    # Read once for both validators
+    if not hasattr(request, '_api_modified'):
+        request._api_modified = last_change(RESOURCES[resource])
+    return request._api_modified
+
+
+def _etag(request, resource):
+    modified = _modified(request, resource)
+    if modified is None:
+        return None
+    key = "|".join([API_VERSION, resource, modified.isoformat(), request.GET.urlencode()])
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+@login_required
+@require_GET
+@condition(etag_func=_etag, last_modified_func=_modified)
+def resource_list(request, resource):
+    config = RESOURCES[resource]
+    try:
+        fields = selected_fields(config, request.GET)
+        queryset, ordering = config.queryset(request)
+        # The cursor needs the ordering columns even when they were not asked for
+        columns = list(dict.fromkeys([*fields, *(name.lstrip('-') for name in ordering)]))
+        page = keyset.paginate(queryset.values(*columns), ordering, request.GET.get('cursor'), page_size(request.GET))
+    except keyset.InvalidCursor:
+        return JsonResponse({"error": "Invalid page cursor."}, status=400)
+    except (ApiError, ValidationError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({
+        "version": API_VERSION,
+        "resource": resource,
+        "results": [{name: row[name] for name in fields} for row in page],
+        "next": _page_url(request, page.next_cursor),
+        "previous": _page_url(request, page.previous_cursor),
+    })
+
+
+@login_required
+@require_GET
+def sync_feed(request):
+    """
+    ``/sync/?since=<cursor>``: the rows changed and deleted since the previous poll,
+    whose ``cursor`` the client sends back. No cursor starts a full sync.
+    """
+    try:
+        limit = page_size(request.GET, default=sync.DEFAULT_LIMIT, maximum=sync.MAX_LIMIT)
+        result = sync.changes(request.GET.get('since'), limit)
+    except keyset.InvalidCursor:
+        return JsonResponse({"error": "Invalid sync cursor, start again without one."}, status=400)
+    except ApiError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(asdict(result))
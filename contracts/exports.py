@@ -0,0 +1,271 @@
+from datetime import date, datetime
+from io import BytesIO
+
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.text import slugify
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .models import Device
+from .services import keyset
+from .services.excel import EXPORT_CHUNK_SIZE, XLSX_CONTENT_TYPE, queryset_rows, write_xlsx
+from .services.pdf_assets import logo as pdf_logo, register_fonts
+from .services.text import shape, shape_row, shape_rows
+
+
+# Excel and PDF reports of the ExportMixin views (contracts.views). openpyxl, reportlab,
+# svglib and the Arabic shaping libraries are only needed here, so the views import
+# this module inside their export methods: a worker loads them with its first export,
+# not at startup. Each function takes the view, for its filters and export progress.
+
+
+def export_response(content, file_type, model_name):
+    timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
+    safe_model_name = slugify(model_name) or "export"
+    filename = f"export_{safe_model_name}_{timestamp}.{file_type}"
+
+    content_types = {
+        "xlsx": XLSX_CONTENT_TYPE,
+        "pdf": "application/pdf",
+    }
+    content_type = content_types.get(file_type, "application/octet-stream")
+
+    # الملفات تُرسل على دفعات بدلاً من تحميلها كاملة في الذاكرة
+    if hasattr(content, "read"):
+        response = FileResponse(content, content_type=content_type)
+    else:
+        response = HttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def model_excel(view, queryset):
+    opts = queryset.model._meta
+    fields = view.get_export_fields(queryset.model)
+
+    output = write_xlsx(
+        title=opts.verbose_name_plural,
+        headers=[str(field.verbose_name) for field in fields],
+        rows=view.track_export(queryset_rows(queryset, fields, ordering=view.get_export_ordering())),
+    )
+    return export_response(output, "xlsx", opts.model_name)
+
+
+def model_pdf(view, queryset):
+    model_name = queryset.model._meta.model_name
+    buffer = BytesIO()
+
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=landscape(A4),
+        rightMargin=10,
+        leftMargin=10,
+        topMargin=4,
+        bottomMargin=20
+    )
+
+    register_fonts()
+
+    elements = []
+
+    # ✅ إضافة صورة SVG
+    drawing = pdf_logo()
+    drawing.scale(1, 1)  # التحكم بالحجم
+
+    # إعداد العنوان
+    title_text = shape(f"تقرير {queryset.model._meta.verbose_name_plural}")
+    title_style = ParagraphStyle(name="Title", fontName="Janna", fontSize=20, alignment=1, spaceAfter=0)
+    title_paragraph = Paragraph(title_text, title_style)
+
+    # إنشاء جدول مكون من عمودين: [الصورة, العنوان]
+    title_table = Table(
+        data=[[drawing, title_paragraph]],
+        colWidths=[80, 650],  # يمكنك تعديل العرض حسب حجم الصورة والعنوان
+        hAlign='RIGHT'
+    )
+    title_table.setStyle(TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("ALIGN", (0, 0), (0, 0), "RIGHT"),  # الصورة
+        ("ALIGN", (1, 0), (1, 0), "RIGHT"),  # العنوان
+    ]))
+
+    elements.append(title_table)
+    elements.append(Spacer(1, 25))
+
+    # ✅ جدول البيانات
+    fields = [[field.name, field.verbose_name] for field in reversed(view.get_export_fields(queryset.model))]
+    headers = shape_row(field[1] for field in fields)
+    table_data = [headers]
+    max_col_lengths = [len(h) for h in headers]
+
+    ordering = view.get_export_ordering()
+    objects = keyset.iterate(queryset, ordering, EXPORT_CHUNK_SIZE) if ordering else queryset
+    for obj in view.track_export(objects):
+        row = []
+        for i, field in enumerate(fields):
+            value = getattr(obj, field[0], "")
+            if hasattr(obj, f"get_{field[0]}_display"):
+                value = getattr(obj, f"get_{field[0]}_display")()
+            elif isinstance(value, (datetime, date)):
+                value = value.strftime("%Y-%m-%d")
+            elif isinstance(value, bool):
+                value = "نعم" if value else "لا"
+
+            value = shape(value)
+
+            max_col_lengths[i] = max(max_col_lengths[i], len(value))
+            row.append(value)
+        table_data.append(row)
+
+    # ✅ تحديد عرض الأعمدة تلقائيًا
+    total_width = 780
+    min_width = 55
+    max_width = 220 
+    col_widths = []
+    sum_lengths = sum(max_col_lengths) or 1 
+    col_widths = [
+      max(min_width, min((length / sum_lengths) * total_width, max_width)) 
+      for length in max_col_lengths
+    ]
+
+    table = Table(table_data, colWidths=col_widths, repeatRows=1)
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+        ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
+        ("FONTNAME", (0, 0), (-1, -1), "Janna"),
+        ("FONTSIZE", (0, 0), (-1, -1), 10),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+    ]))
+
+    elements.append(table)
+    elements.append(Spacer(1, 16))
+
+    doc.build(elements)
+    return export_response(buffer.getvalue(), "pdf", model_name)
+
+
+def warehouse_excel(view, queryset):
+    warehouse = view.object
+
+    titles = [f"Warehouse: {warehouse.name} ({warehouse.location})"]
+    if warehouse.contract:
+        titles.append(f"Linked Contract: {warehouse.contract.name} ({warehouse.contract.contract_number})")
+
+    stats = [
+        ("Statistics", "Count"),
+        ("Total Zones", warehouse.count_zones),
+        ("Total Devices", warehouse.count_devices),
+        ("In Warehouse", warehouse.count_in_warehouse),
+        ("Installed", warehouse.count_installed),
+        ("Damaged", warehouse.count_damaged),
+    ]
+
+    status_labels = dict(Device.DEVICE_STATUS_CHOICES)
+    rows = (
+        (serial, name, category or "", status_labels.get(status, ""), ip, transfer_date, installation_date,
+         responsible, notes or "")
+        for serial, name, category, status, ip, transfer_date, installation_date, responsible, notes
+        in queryset.values_list(
+            'serial_number', 'name', 'device_category__name', 'status', 'ip_address',
+            'transfer_date', 'installation_date', 'responsible_person', 'notes',
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    headers = ["Serial", "Name", "Category", "Status", "IP", "Transfer Date", "Installation Date", "Responsible", "Notes"]
+    output = write_xlsx("Devices", headers, view.track_export(rows), widths=[20] * len(headers), titles=titles, preamble=stats)
+
+    filename = f"devices_{warehouse.name}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def warehouse_pdf(view, queryset):
+    warehouse = view.object
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=20, leftMargin=20, topMargin=20, bottomMargin=20)
+
+    register_fonts()
+
+    content = []
+    drawing = pdf_logo()
+
+    title_text = shape(f"تقرير أجهزة العقد  : {warehouse.contract.name} - {warehouse.contract.contract_number}")
+    title_paragraph = Paragraph(title_text, ParagraphStyle(name="Title", fontName="Janna", fontSize=20, alignment=1))
+
+    title_table = Table([[drawing, title_paragraph]], colWidths=[80, 650], hAlign='RIGHT')
+    title_table.setStyle(TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("ALIGN", (0, 0), (0, 0), "RIGHT"),
+        ("ALIGN", (1, 0), (1, 0), "RIGHT"),
+    ]))
+
+    content.append(title_table)
+    content.append(Spacer(1, 25))
+
+    stats = [
+        f"عدد الأجهزة في المخزن: {warehouse.count_in_warehouse}",
+        f"المخزن: {warehouse.name} - {warehouse.location}",
+        f"إجمالي المناطق: {warehouse.count_zones}",
+        f"إجمالي الأجهزة: {warehouse.count_devices}",
+        f"عدد الأجهزة المعطلة: {warehouse.count_damaged}",
+        f"عدد الأجهزة المركبة: {warehouse.count_installed}"
+    ]
+
+    reshaped_stats = [
+        Paragraph(shape(s), ParagraphStyle("stat_text", fontName="Janna", fontSize=11, alignment=2))
+        for s in stats
+    ]
+
+    row_size = 2
+    stat_rows = [reshaped_stats[i:i + row_size] for i in range(0, len(reshaped_stats), row_size)]
+    stats_table = Table(stat_rows, colWidths=[380] * row_size, hAlign='RIGHT')
+    stats_table.setStyle(TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
+        ("FONTNAME", (0, 0), (-1, -1), "Janna"),
+        ("FONTSIZE", (0, 0), (-1, -1), 11),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+    ]))
+
+    content.append(stats_table)
+    content.append(Spacer(1, 20))
+
+    headers = ["ملاحظات", "المنطقة", "تاريخ التركيب", "تاريخ النقل", "المسؤول", "IP", "الحالة", "الفئة", "الاسم", "الرقم التسلسلي"]
+    data = [shape_row(headers)]
+    rows = []
+
+    for device in view.track_export(queryset):
+        row = [
+            device.notes or "",
+            device.zone.name if device.zone else "المخزن",
+            device.installation_date.strftime("%Y-%m-%d") if device.installation_date else "",
+            device.transfer_date.strftime("%Y-%m-%d") if device.transfer_date else "",
+            device.responsible_person or "",
+            device.ip_address or "",
+            dict(Device.DEVICE_STATUS_CHOICES).get(device.status, ""),
+            device.device_category.name if device.device_category else "",
+            device.name,
+            device.serial_number
+        ]
+        rows.append(row)
+    # تشكيل النص عموداً بعمود: القيم المتكررة تُعالج مرة واحدة
+    data.extend(shape_rows(rows))
+
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("FONTNAME", (0, 0), (-1, -1), "Janna"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+        ("ALIGN", (0, 0), (-1, -1), "RIGHT")
+    ]))
+
+    content.append(table)
+    doc.build(content)
+
+    filename = f"devices_{warehouse.name}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return HttpResponse(buffer.getvalue(), content_type="application/pdf", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -0,0 +1,60 @@
+from django import forms
+from django.forms.models import ModelChoiceIterator, ModelChoiceIteratorValue
+from django_select2.forms import ModelSelect2Widget
+
+from .models import Zone
+
+
+# Select options labelled by the database rather than by the models' __str__, most of
+# which read a related object (one query per option). Small choice sets use
+# LabelledModelChoiceField (one values_list query for every option); the zones, which
+# grow with every contract, use an AJAX Select2 widget that loads them page by page.
+
+
+class ValuesChoiceIterator(ModelChoiceIterator):
+    """Options of a LabelledModelChoiceField, read with one ``values_list`` query."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        rows = self.queryset.values_list('pk', *self.field.label_fields)
+        for pk, *values in rows:
+            yield ModelChoiceIteratorValue(pk, None), self.field.label_format.format(*values)
+
+
+class LabelledModelChoiceField(forms.ModelChoiceField):
+    """
+    A ModelChoiceField whose option labels are ``label_format`` filled with the
+    ``label_fields`` values (lookups such as "contract__name" work), not ``str(obj)``.
+    """
+    iterator = ValuesChoiceIterator
+
+    def __init__(self, queryset, label_fields=('name',), label_format=None, **kwargs):
+        self.label_fields = tuple(label_fields)
+        self.label_format = label_format or " ".join("{}" for _ in self.label_fields)
+        super().__init__(queryset, **kwargs)
+
+
+class SharedChoicesFormSetMixin:
+    """Formset mixin reading the options of ``shared_choice_fields`` once for all its forms."""
+    shared_choice_fields = ()
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        shared = self.__dict__.setdefault('_shared_choices', {})
+        for name in self.shared_choice_fields:
+            if name not in shared:
+                shared[name] = [choice for choice in form.fields[name].choices]
+            form.fields[name].choices = shared[name]
+
+
+class ZoneSelect2Widget(ModelSelect2Widget):
+    """Zones searched by name or contract, served by the login protected ``select2_choices`` view."""
+    model = Zone
+    queryset = Zone.objects.order_by('contract_id', 'name')
+    search_fields = ['name__icontains', 'contract__name__icontains', 'contract__contract_number__icontains']
+    data_view = 'select2_choices'
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('data_view', self.data_view)
+        super().__init__(*args, **kwargs)
@@ -1,8 +1,9 @@
 from django import forms
 from django.contrib.auth.models import User
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
 from django_select2.forms import Select2Widget
-from .models import Contract, ContractItem, Zone, Warehouse, DeviceCategory, Device, DeviceProperty, MaintenanceCard, CoordinationRequest, Task
+from .fields import LabelledModelChoiceField, SharedChoicesFormSetMixin, ZoneSelect2Widget
+from .models import Contract, ContractItem, Zone, Warehouse, DeviceCategory, Device, MaintenanceCard, CoordinationRequest, Task
 
 class ProfileUpdateForm(forms.ModelForm):
     class Meta:
@@ -49,6 +50,10 @@ class DeviceCategoryForm(forms.ModelForm):
 
 
 class ContractItemForm(forms.ModelForm):
+    category = LabelledModelChoiceField(
+        DeviceCategory.objects.order_by('name'), widget=Select2Widget(attrs={'class': 'form-select select2'}),
+    )
+
     class Meta:
         model = ContractItem
         fields = ['category', 'quantity', 'notes']
@@ -79,7 +84,13 @@ class WarehouseForm(forms.ModelForm):
         }
 
 
-ContractItemFormSet = inlineformset_factory(Contract, ContractItem, form=ContractItemForm, extra=1, can_delete=True)
+class BaseContractItemFormSet(SharedChoicesFormSetMixin, BaseInlineFormSet):
+    shared_choice_fields = ('category',)
+
+
+ContractItemFormSet = inlineformset_factory(
+    Contract, ContractItem, form=ContractItemForm, formset=BaseContractItemFormSet, extra=1, can_delete=True,
+)
 ZoneFormSet = inlineformset_factory(Contract, Zone, form=ZoneForm, extra=1, can_delete=True)
 
 
@@ -88,6 +99,7 @@ class TaskForm(forms.ModelForm):
         model = Task
         fields = ['name', 'zone', 'deadline', 'actual_delivery_date', 'status', 'notes']
         widgets = {
+            'zone': ZoneSelect2Widget(),
             'deadline': forms.DateInput(attrs={'type': 'date'}),
             'actual_delivery_date': forms.DateInput(attrs={'type': 'date'}),
             'notes': forms.Textarea(attrs={'rows': 3}),
@@ -100,6 +112,9 @@ class TaskForm(forms.ModelForm):
 
 
 class DeviceForm(forms.ModelForm):
+    device_category = LabelledModelChoiceField(DeviceCategory.objects.order_by('name'))
+    zone = LabelledModelChoiceField(Zone.objects.none(), required=False)
+
     class Meta:
         model = Device
         fields = [
@@ -121,17 +136,68 @@ class DeviceForm(forms.ModelForm):
             field.widget.attrs['class'] = 'form-control'
 
 
-class DevicePropertyForm(forms.ModelForm):
-    class Meta:
-        model = DeviceProperty
-        fields = ['key', 'value', 'is_required']
-        widgets = {
-            'key': forms.TextInput(attrs={'class': 'form-control'}),
-            'value': forms.TextInput(attrs={'class': 'form-control'}),
+class DevicePropertyForm(forms.Form):
+    key = forms.CharField(max_length=100, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    # Only required properties must have a value, see BaseDevicePropertyFormSet.clean()
+    value = forms.CharField(max_length=255, required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    is_required = forms.BooleanField(required=False, widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}))
+
+
+class BaseDevicePropertyFormSet(forms.BaseFormSet):
+    """One row per key of ``Device.properties``, built like an inline formset from ``instance``."""
+
+    def __init__(self, data=None, files=None, instance=None, prefix=None, **kwargs):
+        self.instance = instance
+        properties = instance.properties if instance is not None else {}
+        required = set(instance.required_properties) if instance is not None else set()
+        kwargs.setdefault('initial', [
+            {'key': key, 'value': value, 'is_required': key in required} for key, value in properties.items()
+        ])
+        super().__init__(data, files, prefix=prefix, **kwargs)
+
+    def clean(self):
+        kept = self.kept_forms()
+        keys = [form.cleaned_data['key'] for form in kept]
+        if len(keys) != len(set(keys)):
+            raise forms.ValidationError("Each property can only be given once.")
+
+        errors = [
+            f"The required property '{form.cleaned_data['key']}' needs a value."
+            for form in kept if form.cleaned_data.get('is_required') and not form.cleaned_data.get('value')
+        ]
+        # A required property is removed only once it is no longer marked required
+        released = {
+            form.cleaned_data.get('key') for form in self.forms
+            if form not in kept and not form.cleaned_data.get('is_required')
         }
+        required = self.instance.required_properties if self.instance is not None else []
+        errors.extend(
+            f"The required property '{key}' cannot be removed."
+            for key in required if key not in keys and key not in released
+        )
+        if errors:
+            raise forms.ValidationError(errors)
+
+    def kept_forms(self):
+        return [
+            form for form in self.forms
+            if form.cleaned_data.get('key') and not (self.can_delete and self._should_delete_form(form))
+        ]
+
+    @property
+    def properties(self):
+        """The properties left once the formset is valid, in row order."""
+        return {form.cleaned_data['key']: form.cleaned_data['value'] for form in self.kept_forms()}
+
+    @property
+    def required_properties(self):
+        """The keys of ``properties`` marked required, in row order."""
+        return [form.cleaned_data['key'] for form in self.kept_forms() if form.cleaned_data.get('is_required')]
 
 
-DevicePropertyFormSet = inlineformset_factory(Device, DeviceProperty, form=DevicePropertyForm, extra=1, can_delete=True)
+DevicePropertyFormSet = forms.formset_factory(
+    DevicePropertyForm, formset=BaseDevicePropertyFormSet, extra=1, can_delete=True,
+)
 
 
 class MaintenanceCardForm(forms.ModelForm):
@@ -152,6 +218,7 @@ class CoordinationRequestForm(forms.ModelForm):
         model = CoordinationRequest
         fields = '__all__'
         widgets = {
+            'zone': ZoneSelect2Widget(),
             'request_date': forms.DateInput(attrs={'type': 'date'}),
             'expected_execution_date': forms.DateInput(attrs={'type': 'date'}),
             'email_sent_date': forms.DateInput(attrs={'type': 'date'}),
@@ -0,0 +1,47 @@
+from zipfile import BadZipFile
+
+import pandas as pd
+from django.db import transaction
+from openpyxl.utils.exceptions import InvalidFileException
+
+from .models import ImportSession
+from .services.import_sessions import submit_import_session
+from .services.import_validation import ImportValidator
+from .services.importer import IMPORT_CHUNK_SIZE, detect_format, read_chunks
+
+
+# Device imports behind DeviceImportView (contracts.views). pandas and openpyxl are
+# only needed here, so the view imports this module when a file is posted rather
+# than every worker loading them at startup.
+
+# What reading a file that is not a valid spreadsheet raises
+UNREADABLE_FILE_ERRORS = (
+    InvalidFileException, BadZipFile, KeyError, UnicodeDecodeError, pd.errors.ParserError, pd.errors.EmptyDataError,
+)
+
+
+class UnreadableFile(ValueError):
+    pass
+
+
+def dry_run(upload, file_format):
+    """The validation report of ``upload``, nothing is saved."""
+    try:
+        return ImportValidator().validate(read_chunks(upload, file_format))
+    except UNREADABLE_FILE_ERRORS as exc:
+        raise UnreadableFile(upload.name) from exc
+
+
+def start_session(user, upload, file_format):
+    """Save ``upload`` as an ImportSession, imported in the background once committed."""
+    # الاستيراد يعمل في الخلفية على دفعات، ويُستأنف من آخر دفعة محفوظة
+    with transaction.atomic():
+        session = ImportSession.objects.create(
+            user=user,
+            file=upload,
+            original_name=upload.name,
+            file_format=file_format,
+            chunk_size=IMPORT_CHUNK_SIZE,
+        )
+        submit_import_session(session)
+    return session
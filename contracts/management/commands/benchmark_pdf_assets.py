@@ -0,0 +1,35 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from reportlab.pdfbase.ttfonts import TTFont
+from svglib.svglib import svg2rlg
+
+from contracts.services import pdf_assets
+
+
+class Command(BaseCommand):
+    help = "Compare per-export PDF asset loading with and without the process-wide cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Number of simulated exports.")
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        font_path = pdf_assets.static_path(pdf_assets.FONT_PATH)
+        logo_path = pdf_assets.static_path(pdf_assets.LOGO_PATH)
+
+        def uncached():
+            TTFont(pdf_assets.FONT_NAME, font_path)
+            svg2rlg(logo_path)
+
+        def cached():
+            pdf_assets.register_fonts()
+            pdf_assets.logo()
+
+        pdf_assets.clear_cache()
+        before = timeit.timeit(uncached, number=repeat) / repeat
+        after = timeit.timeit(cached, number=repeat) / repeat
+
+        self.stdout.write(f"uncached: {before * 1000:.2f} ms per export")
+        self.stdout.write(f"cached:   {after * 1000:.2f} ms per export")
+        self.stdout.write(self.style.SUCCESS(f"speedup:  {before / after:.0f}x over {repeat} exports"))
@@ -0,0 +1,61 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from contracts.services import startup
+
+
+class Command(BaseCommand):
+    help = (
+        "Time django.setup() and the URLconf import of fresh worker processes and report their "
+        "RSS, write the results as JSON and compare them with a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Cold starts to measure.")
+        parser.add_argument('--settings-module', help="Settings of the measured processes (default: the current ones).")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="Compare with the results stored in this JSON file.")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed growth over the baseline (0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        baseline = self.load(options['baseline']) if options['baseline'] else None
+        try:
+            result = startup.measure(options['repeat'], options['settings_module'])
+        except startup.StartupError as exc:
+            raise CommandError(f"A worker failed to start: {exc}")
+
+        self.stdout.write(f"django.setup()  {result['setup_ms']:>8.1f} ms")
+        self.stdout.write(f"URLconf         {result['urls_ms']:>8.1f} ms")
+        self.stdout.write(f"total           {result['total_ms']:>8.1f} ms")
+        self.stdout.write(f"RSS             {result['rss_mb']:>8.1f} MB")
+        self.stdout.write(f"heavy modules   {', '.join(result['modules']) or 'none'}")
+
+        report = {'created_at': timezone.now().isoformat(), 'repeat': options['repeat'], 'result': result}
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2), encoding='utf-8')
+            self.stdout.write(f"Results written to {options['output']}")
+        if baseline is not None:
+            self.compare(result, baseline['result'], options['tolerance'])
+
+    def load(self, path):
+        try:
+            return json.loads(Path(path).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read baseline {path}: {exc}")
+
+    def compare(self, result, before, tolerance):
+        self.stdout.write("\nAgainst the baseline:")
+        regressions = []
+        for metric in ('total_ms', 'rss_mb'):
+            ratio = result[metric] / before[metric] if before[metric] else float('inf')
+            line = f"{metric:<10} {before[metric]:>8.1f} -> {result[metric]:>8.1f}  x{ratio:.2f}"
+            regressed = ratio > 1 + tolerance
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+            if regressed:
+                regressions.append(metric)
+        if regressions:
+            raise CommandError(f"Worse than the baseline: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("No regressions."))
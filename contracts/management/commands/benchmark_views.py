@@ -0,0 +1,108 @@
+import json
+import re
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from contracts.models import Device
+from contracts.services import benchmark
+from contracts.services.synthetic import SyntheticData
+
+# Synthetic devices per generated contract when growing the data to a scale
+DEVICES_PER_CONTRACT = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every page of contracts/urls.py and each export format, write the results as JSON "
+        "and compare them with a baseline. With --scales (and --generate) the data is grown with "
+        "synthetic devices to each scale in turn, e.g. --scales 10000 100000 1000000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', help="Device counts to benchmark at, smallest first.")
+        parser.add_argument('--generate', action='store_true',
+                            help="Add synthetic devices up to each scale. This writes to the configured database.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed requests per page.")
+        parser.add_argument('--format', action='append', dest='formats', choices=benchmark.EXPORT_FORMATS,
+                            help="Export formats to time (default: all, can be repeated).")
+        parser.add_argument('--only', help="Only time pages whose name matches this regular expression.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="Compare with the results stored in this JSON file.")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown over the baseline (0.2 = 20%%).")
+        parser.add_argument('--username', default="benchmark", help="User the pages are requested as, created if missing.")
+
+    def handle(self, *args, **options):
+        baseline = self.load(options['baseline']) if options['baseline'] else None
+        user = User.objects.get_or_create(username=options['username'])[0]
+        client = benchmark.client_for(user)
+
+        runs = {}
+        for scale in sorted(options['scales'] or [None], key=lambda scale: scale or 0):
+            devices = Device.objects.count()
+            if scale is not None and devices < scale:
+                if not options['generate']:
+                    raise CommandError(f"Only {devices} devices for scale {scale}, add --generate to create the rest.")
+                missing = scale - devices
+                self.stdout.write(f"Generating {missing} devices...")
+                SyntheticData(prefix=f"BENCH{scale}", seed=scale).generate(
+                    contracts=max(1, missing // DEVICES_PER_CONTRACT), zones=8, devices=missing,
+                )
+                devices = scale
+            runs[str(scale or devices)] = {'devices': devices, 'results': self.run(client, user, options)}
+
+        report = {'created_at': timezone.now().isoformat(), 'repeat': options['repeat'], 'runs': runs}
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2), encoding='utf-8')
+            self.stdout.write(f"Results written to {options['output']}")
+        if baseline is not None:
+            self.compare(runs, baseline['runs'], options['tolerance'])
+
+    def load(self, path):
+        try:
+            return json.loads(Path(path).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read baseline {path}: {exc}")
+
+    def run(self, client, user, options):
+        found, skipped = benchmark.targets(user, options['formats'] or benchmark.EXPORT_FORMATS)
+        only = re.compile(options['only']) if options['only'] else None
+
+        self.stdout.write(f"\n{Device.objects.count()} devices")
+        results = {}
+        for target in found:
+            if only is not None and not only.search(target.name):
+                continue
+            try:
+                result = results[target.name] = benchmark.measure(client, target, options['repeat'])
+            except Exception as exc:
+                results[target.name] = {'url': target.url, 'error': repr(exc)}
+                self.stdout.write(self.style.ERROR(f"{target.name:<32} failed: {exc!r}"))
+                continue
+            self.stdout.write(
+                f"{target.name:<32} {result['median_ms']:>10.1f} ms {result['queries'] or 0:>5} queries "
+                f"{result['bytes']:>10} bytes  [{result['status']}]"
+            )
+        if skipped:
+            self.stdout.write(f"Skipped (no object to request): {', '.join(skipped)}")
+        return results
+
+    def compare(self, runs, baseline_runs, tolerance):
+        regressions = []
+        for scale, run in runs.items():
+            if scale not in baseline_runs:
+                self.stdout.write(f"\nNo baseline at {scale} devices.")
+                continue
+            self.stdout.write(f"\nAgainst the baseline at {scale} devices:")
+            for name, before, after, ratio, regressed in benchmark.compare(
+                run['results'], baseline_runs[scale]['results'], tolerance,
+            ):
+                line = f"{name:<32} {before:>10.1f} -> {after:>10.1f} ms  x{ratio:.2f}"
+                self.stdout.write(self.style.ERROR(line) if regressed else line)
+                if regressed:
+                    regressions.append(f"{name} at {scale}")
+        if regressions:
+            raise CommandError(f"Slower than the baseline: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("No regressions."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from contracts.models import Contract
+from contracts.services.synthetic import BATCH_SIZE, SyntheticData
+
+
+class Command(BaseCommand):
+    help = (
+        "Add synthetic contracts, zones, devices, maintenance cards, tasks and coordination "
+        "requests for benchmarks. Existing data is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contracts', type=int, default=10)
+        parser.add_argument('--zones', type=int, default=8, help="Zones per contract.")
+        parser.add_argument('--devices', type=int, default=10000, help="Devices over all contracts.")
+        parser.add_argument('--tasks-per-zone', type=int, default=5)
+        parser.add_argument('--coordination-per-zone', type=int, default=3)
+        parser.add_argument('--prefix', default="SYN", help="Prefix of the generated contract numbers and serials.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if options['contracts'] < 1:
+            raise CommandError("--contracts must be at least 1.")
+        if Contract.objects.filter(contract_number__startswith=f"{prefix}-").exists():
+            raise CommandError(f"Contracts prefixed {prefix}- already exist, pick another --prefix.")
+
+        created = SyntheticData(prefix, seed=options['seed'], batch_size=options['batch_size']).generate(
+            options['contracts'], options['zones'], options['devices'],
+            tasks_per_zone=options['tasks_per_zone'], coordination_per_zone=options['coordination_per_zone'],
+        )
+        for name, count in sorted(created.items()):
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Generated {created['device']} devices."))
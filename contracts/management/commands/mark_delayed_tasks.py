@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contracts.services.sla import mark_delayed
+
+
+class Command(BaseCommand):
+    help = (
+        "Set the open tasks past their deadline to delayed, with one UPDATE. "
+        "Run it daily, e.g. from cron shortly after midnight."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Reference date (YYYY-MM-DD), today by default.")
+
+    def handle(self, *args, **options):
+        try:
+            on = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError(f"Invalid date: {options['date']}")
+        changed = mark_delayed(on)
+        self.stdout.write(self.style.SUCCESS(f"Marked {changed} tasks as delayed."))
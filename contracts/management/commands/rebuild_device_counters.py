@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from contracts.services.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DeviceCounter table from the Device table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouse', type=int, action='append', dest='warehouses',
+                            help="Only rebuild this warehouse id (can be repeated).")
+
+    def handle(self, *args, **options):
+        rows = rebuild_counters(options['warehouses'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} device counter rows."))
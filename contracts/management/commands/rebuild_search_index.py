@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from contracts.models import Device
+from contracts.services.search import index_devices
+
+
+class Command(BaseCommand):
+    help = "Rebuild the device search documents (and through them the full-text index)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouse', type=int, action='append', dest='warehouses',
+                            help="Only reindex devices of this warehouse id (can be repeated).")
+
+    def handle(self, *args, **options):
+        devices = Device.objects.all()
+        if options['warehouses']:
+            devices = devices.filter(warehouse_id__in=options['warehouses'])
+        count = index_devices(devices)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} devices."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from contracts.services.jobs import resume_export_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run again the export jobs a stopped process left pending or running. Jobs run in the "
+        "threads of the web process, so run this when it starts, before it serves requests."
+    )
+
+    def handle(self, *args, **options):
+        count = resume_export_jobs()
+        self.stdout.write(self.style.SUCCESS(f"Resumed {count} export jobs."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from contracts.services.import_sessions import resume_import_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Finish device import sessions that were pending or interrupted, starting after their last "
+        "committed chunk. Run it when the workers start, while none of them is importing."
+    )
+
+    def handle(self, *args, **options):
+        count = resume_import_sessions()
+        self.stdout.write(self.style.SUCCESS(f"Resumed {count} import sessions."))
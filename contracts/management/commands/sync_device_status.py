@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from contracts.models import Device
+from contracts.services.maintenance import sync_device_status
+
+
+class Command(BaseCommand):
+    help = "Set the status of the devices from their open maintenance cards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouse', type=int, action='append', dest='warehouses',
+                            help="Only sync the devices of this warehouse id (can be repeated).")
+
+    def handle(self, *args, **options):
+        devices = Device.objects.all()
+        if options['warehouses']:
+            devices = devices.filter(warehouse_id__in=options['warehouses'])
+        changed = sync_device_status(devices)
+        self.stdout.write(self.style.SUCCESS(f"Updated the status of {changed} devices."))
@@ -0,0 +1,110 @@
+import logging
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# Metrics a budget may cap, compared with ``>``; a metric missing from a budget is not checked
+BUDGET_METRICS = ('queries', 'db_ms', 'template_ms', 'total_ms', 'response_bytes')
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass
+class RequestMetrics:
+    url_name: Optional[str] = None
+    queries: int = 0
+    db_ms: float = 0.0
+    # Includes the queries run lazily by the template, only measured for TemplateResponse views
+    template_ms: float = 0.0
+    total_ms: float = 0.0
+    # None for streaming responses
+    response_bytes: Optional[int] = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper() for the duration of the request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - start) * 1000
+
+    def violations(self, budget):
+        """``(metric, value, limit)`` for every metric of ``budget`` this request went over."""
+        return [
+            (metric, getattr(self, metric), budget[metric])
+            for metric in BUDGET_METRICS
+            if budget.get(metric) is not None and getattr(self, metric) is not None
+            and getattr(self, metric) > budget[metric]
+        ]
+
+    def describe(self, violations):
+        return ", ".join(f"{metric} {value:g} > {limit:g}" for metric, value, limit in violations)
+
+
+def get_budget(url_name):
+    """The ``PERFORMANCE_BUDGETS`` entry of ``url_name`` laid over the ``default`` one."""
+    budgets = getattr(settings, 'PERFORMANCE_BUDGETS', {})
+    return {**budgets.get('default', {}), **budgets.get(url_name, {})}
+
+
+class PerformanceBudgetMiddleware:
+    """
+    Measure every request against its view's budget (``PERFORMANCE_BUDGETS``).
+
+    Breaches are logged; with ``PERFORMANCE_BUDGETS_STRICT`` (set by the test runner)
+    they raise ``BudgetExceeded`` instead. The metrics are left on ``response.metrics``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = request.metrics = RequestMetrics()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(metrics))
+            response = self.get_response(request)
+        metrics.total_ms = (time.perf_counter() - start) * 1000
+
+        if request.resolver_match is not None:
+            metrics.url_name = request.resolver_match.url_name
+        if not response.streaming:
+            metrics.response_bytes = len(response.content)
+        response.metrics = metrics
+
+        self.check(metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before the response renders, the callback right after
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.metrics.template_ms = (time.perf_counter() - start) * 1000
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def check(self, metrics):
+        if metrics.url_name is None:
+            return
+        violations = metrics.violations(get_budget(metrics.url_name))
+        if not violations:
+            logger.debug("%s: %s", metrics.url_name, metrics)
+            return
+
+        message = f"{metrics.url_name} over budget: {metrics.describe(violations)}"
+        if getattr(settings, 'PERFORMANCE_BUDGETS_STRICT', False):
+            raise BudgetExceeded(message)
+        logger.warning(message)
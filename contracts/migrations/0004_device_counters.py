@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_counters(apps, schema_editor):
+    Device = apps.get_model('contracts', 'Device')
+    DeviceCounter = apps.get_model('contracts', 'DeviceCounter')
+    Q, Count = models.Q, models.Count
+
+    rows = Device.objects.order_by().values('warehouse_id', 'zone_id', 'device_category_id').annotate(
+        total=Count('id'),
+        installed=Count('id', filter=Q(status='installed')),
+        available=Count('id', filter=Q(status='available')),
+        damaged=Count('id', filter=Q(status='damaged')),
+        in_warehouse=Count('id', filter=Q(current_location='warehouse')),
+        in_zones=Count('id', filter=Q(current_location='zone')),
+    )
+    DeviceCounter.objects.bulk_create((DeviceCounter(**row) for row in rows), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0003_alter_task_deadline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0)),
+                ('installed', models.IntegerField(default=0)),
+                ('available', models.IntegerField(default=0)),
+                ('damaged', models.IntegerField(default=0)),
+                ('in_warehouse', models.IntegerField(default=0)),
+                ('in_zones', models.IntegerField(default=0)),
+                ('device_category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to='contracts.devicecategory')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to='contracts.warehouse')),
+                ('zone', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='device_counters', to='contracts.zone')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='devicecounter',
+            constraint=models.UniqueConstraint(fields=('warehouse', 'zone', 'device_category'), name='unique_device_counter'),
+        ),
+        migrations.AddConstraint(
+            model_name='devicecounter',
+            constraint=models.UniqueConstraint(condition=models.Q(('zone__isnull', True)), fields=('warehouse', 'device_category'), name='unique_device_counter_no_zone'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
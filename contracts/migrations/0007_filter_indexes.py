@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0006_import_sessions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coordinationrequest',
+            index=models.Index(fields=['zone', '-request_date', '-id'], name='coord_zone_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['warehouse', 'status'], name='device_warehouse_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['warehouse', 'current_location'], name='device_warehouse_loc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['zone', 'status'], name='device_zone_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancecard',
+            index=models.Index(fields=['-report_date', '-id'], name='maint_report_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancecard',
+            index=models.Index(condition=models.Q(('repair_date__isnull', True)), fields=['device'], name='maint_pending_device_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['zone', 'status', 'deadline'], name='task_zone_status_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['zone', 'deadline'], name='task_zone_deadline_idx'),
+        ),
+    ]
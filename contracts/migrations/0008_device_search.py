@@ -0,0 +1,99 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:41
+
+import sqlite3
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FTS_TABLE = 'contracts_device_fts'
+DOCUMENT_TABLE = 'contracts_devicesearchdocument'
+
+SQLITE_INDEX = [
+    # External content table: FTS5 stores only the index, the text stays in DOCUMENT_TABLE
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"text, content='{DOCUMENT_TABLE}', content_rowid='device_id', tokenize='trigram')",
+    f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.device_id, new.text); END",
+    f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.device_id, old.text); END",
+    f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.device_id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.device_id, new.text); END",
+]
+SQLITE_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX {DOCUMENT_TABLE}_tsv ON {DOCUMENT_TABLE} "
+    f"USING gin (to_tsvector('simple'::regconfig, COALESCE((text)::text, '')))",
+    f"CREATE INDEX {DOCUMENT_TABLE}_trgm ON {DOCUMENT_TABLE} USING gin (text gin_trgm_ops)",
+]
+POSTGRES_DROP = [
+    f"DROP INDEX IF EXISTS {DOCUMENT_TABLE}_tsv",
+    f"DROP INDEX IF EXISTS {DOCUMENT_TABLE}_trgm",
+]
+
+
+def _statements(schema_editor, create):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 34, 0):
+        return SQLITE_INDEX if create else SQLITE_DROP
+    if vendor == 'postgresql':
+        return POSTGRES_INDEX if create else POSTGRES_DROP
+    return []
+
+
+def create_search_index(apps, schema_editor):
+    for statement in _statements(schema_editor, create=True):
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    for statement in _statements(schema_editor, create=False):
+        schema_editor.execute(statement)
+
+
+def populate_documents(apps, schema_editor):
+    Device = apps.get_model('contracts', 'Device')
+    DeviceProperty = apps.get_model('contracts', 'DeviceProperty')
+    DeviceSearchDocument = apps.get_model('contracts', 'DeviceSearchDocument')
+
+    properties = defaultdict(list)
+    for device_id, key, value in DeviceProperty.objects.values_list('device_id', 'key', 'value').iterator():
+        properties[device_id].append(f"{key} {value}")
+
+    fields = ('serial_number', 'name', 'ip_address', 'invoice_number', 'responsible_person')
+    documents = (
+        DeviceSearchDocument(
+            device_id=row[0],
+            text=" ".join([str(value) for value in row[1:] if value] + properties[row[0]]),
+        )
+        for row in Device.objects.values_list('pk', *fields).iterator()
+    )
+    DeviceSearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0007_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceSearchDocument',
+            fields=[
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='contracts.device')),
+                ('text', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_documents, migrations.RunPython.noop),
+    ]
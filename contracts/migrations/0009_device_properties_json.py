@@ -0,0 +1,84 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:06
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import contracts.models
+
+
+def move_properties(apps, schema_editor):
+    Device = apps.get_model('contracts', 'Device')
+    DeviceProperty = apps.get_model('contracts', 'DeviceProperty')
+
+    properties = defaultdict(dict)
+    required = defaultdict(list)
+    rows = DeviceProperty.objects.order_by('device_id', 'pk').values_list('device_id', 'key', 'value', 'is_required')
+    for device_id, key, value, is_required in rows.iterator():
+        properties[device_id][key] = value
+        if is_required:
+            required[device_id].append(key)
+
+    devices = [
+        Device(pk=device_id, properties=values, required_properties=required[device_id])
+        for device_id, values in properties.items()
+    ]
+    Device.objects.bulk_update(devices, ['properties', 'required_properties'], batch_size=500)
+
+
+def restore_properties(apps, schema_editor):
+    Device = apps.get_model('contracts', 'Device')
+    DeviceProperty = apps.get_model('contracts', 'DeviceProperty')
+
+    devices = Device.objects.exclude(properties={}).values_list('pk', 'properties', 'required_properties')
+    rows = (
+        DeviceProperty(device_id=device_id, key=key, value=str(value), is_required=key in required)
+        for device_id, values, required in devices.iterator()
+        for key, value in values.items()
+    )
+    DeviceProperty.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0008_device_search'),
+    ]
+
+    operations = [
+        # Frees the Device.properties name for the JSON field while the rows are copied
+        migrations.AlterField(
+            model_name='deviceproperty',
+            name='device',
+            field=models.ForeignKey(on_delete=models.deletion.CASCADE, related_name='+', to='contracts.device'),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='properties',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='required_properties',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(move_properties, restore_properties),
+        migrations.AlterUniqueTogether(
+            name='deviceproperty',
+            unique_together=None,
+        ),
+        migrations.RemoveField(
+            model_name='deviceproperty',
+            name='device',
+        ),
+        migrations.DeleteModel(
+            name='DeviceProperty',
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(contracts.models.PropertyValue('mac_address'), name='device_prop_mac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(contracts.models.PropertyValue('firmware'), name='device_prop_firmware_idx'),
+        ),
+    ]
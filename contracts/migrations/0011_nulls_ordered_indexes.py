@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:35
+
+import contracts.models
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0010_sync_timestamps'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='coordinationrequest',
+            name='coord_zone_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='maintenancecard',
+            name='maint_report_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_zone_status_deadline_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_zone_deadline_idx',
+        ),
+        migrations.AddIndex(
+            model_name='coordinationrequest',
+            index=contracts.models.NullsOrderedIndex(django.db.models.expressions.F('zone'), django.db.models.expressions.OrderBy(django.db.models.expressions.F('request_date'), descending=True, nulls_last=True), django.db.models.expressions.OrderBy(django.db.models.expressions.F('id'), descending=True), name='coord_zone_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancecard',
+            index=contracts.models.NullsOrderedIndex(django.db.models.expressions.OrderBy(django.db.models.expressions.F('report_date'), descending=True, nulls_last=True), django.db.models.expressions.OrderBy(django.db.models.expressions.F('id'), descending=True), name='maint_report_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['zone', 'status', 'deadline', 'id'], name='task_zone_status_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['zone', 'deadline', 'id'], name='task_zone_deadline_idx'),
+        ),
+    ]
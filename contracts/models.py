@@ -1,10 +1,48 @@
+import re
+import uuid
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
+from django.utils.functional import cached_property
 from datetime import date
-from django.db.models import Count
+from django.db.models import Count, F
+
+
+# Rows served by the delta-sync feed (contracts.services.sync). QuerySet.update() and
+# bulk_update() do not touch updated_at: code using them must set it themselves.
+class TimestampedModel(models.Model):
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class NullsOrderedIndex(models.Index):
+    """
+    Index over ``F(name).desc(nulls_last=True)`` / ``.asc(nulls_first=True)`` columns,
+    matching the ORDER BY services.keyset writes for nullable keys. SQLite refuses
+    NULLS FIRST/LAST in an index but already sorts NULL lowest, so the modifiers are
+    left out of its CREATE INDEX.
+    """
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'sqlite':
+            return super().create_sql(model, schema_editor, using=using, **kwargs)
+        index = self.clone()
+        index.expressions = tuple(map(_without_nulls_modifier, self.expressions))
+        return models.Index.create_sql(index, model, schema_editor, using=using, **kwargs)
+
+
+def _without_nulls_modifier(expression):
+    if isinstance(expression, models.OrderBy):
+        expression = expression.copy()
+        expression.nulls_first = expression.nulls_last = False
+    return expression
+
 
 # 1. Contracts Table
-class Contract(models.Model):
+class Contract(TimestampedModel):
     contract_number = models.CharField(max_length=50, primary_key=True)
     name = models.CharField(max_length=255)
     start_date = models.DateField(blank=True, null=True)
@@ -32,60 +70,80 @@ class Contract(models.Model):
 
     class Meta:
         ordering = ['-start_date']
+        indexes = [
+            # The sync feed pages every model on (updated_at, pk)
+            models.Index(fields=['updated_at', 'contract_number'], name='contract_sync_idx'),
+        ]
 
 
 # 2. Devices Category Table
-class DeviceCategory(models.Model):
+class DeviceCategory(TimestampedModel):
     name = models.CharField(max_length=50, unique=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['updated_at', 'id'], name='category_sync_idx')]
+
     def __str__(self):
         return self.name
 
 
 # 3. Contracts Items Table
-class ContractItem(models.Model):
+class ContractItem(TimestampedModel):
     contract = models.ForeignKey('Contract', to_field='contract_number', on_delete=models.CASCADE, related_name='items')
     category = models.ForeignKey('DeviceCategory', on_delete=models.PROTECT, related_name='contract_items')
     quantity = models.PositiveIntegerField()
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['updated_at', 'id'], name='contract_item_sync_idx')]
+
     def __str__(self):
         return f"{self.contract.name} - {self.category} ({self.quantity})"
 
 
 # 4. Warehouses Table
-class Warehouse(models.Model):
+class Warehouse(TimestampedModel):
     name = models.CharField(max_length=255)
     location = models.CharField(max_length=255)
     contract = models.OneToOneField('Contract', to_field='contract_number', on_delete=models.CASCADE, related_name='warehouse')
+
+    class Meta:
+        indexes = [models.Index(fields=['updated_at', 'id'], name='warehouse_sync_idx')]
    
     @property
     def count_zones(self):
         return self.contract.zones.count()
 
+    @cached_property
+    def device_stats(self):
+        # يقرأ من جدول العدادات بدلاً من عدّ الأجهزة في كل مرة
+        from .services.counters import warehouse_stats
+        from .services.dashboard import DeviceStats
+        return warehouse_stats([self.pk]).get(self.pk, DeviceStats())
+
     @property
     def count_devices(self):
-        return self.devices.count()
+        return self.device_stats.total
 
     @property
     def count_damaged(self):
-        return self.devices.filter(status='damaged').count()
+        return self.device_stats.damaged
 
     @property
     def count_installed(self):
-        return self.devices.filter(status='installed').count()
+        return self.device_stats.installed
 
     @property
     def count_available(self):
-        return self.devices.filter(status='available').count()
+        return self.device_stats.available
 
     @property
     def count_in_warehouse(self):
-        return self.devices.filter(current_location='warehouse').count()
+        return self.device_stats.in_warehouse
  
     @property
     def count_in_zones(self):
-        return self.devices.filter(current_location='zone').count()
+        return self.device_stats.in_zones
 
     @property
     def count_by_status(self):
@@ -97,30 +155,43 @@ class Warehouse(models.Model):
 
 
 # 5. Zones Table
-class Zone(models.Model):
+class Zone(TimestampedModel):
     name = models.CharField(max_length=255)
     contract = models.ForeignKey('Contract', to_field='contract_number', on_delete=models.CASCADE, related_name='zones')
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['updated_at', 'id'], name='zone_sync_idx')]
+
     def __str__(self):
-        return f"{self.contract.pk} | {self.name}"
+        # contract_id is the contract number, no query needed
+        return f"{self.contract_id} | {self.name}"
 
 
 # 6. Devices Table
-class DeviceProperty(models.Model):
-    device = models.ForeignKey('Device', on_delete=models.CASCADE, related_name='properties')
-    key = models.CharField(max_length=100)  # مثل "mac_address", "serial_number", "firmware"
-    value = models.CharField(max_length=255)  # قيمة الخاصية
-    is_required = models.BooleanField(default=False)  # إذا أردت التحكم في هل هي مطلوبة أم لا
+class PropertyValue(models.Func):
+    """
+    Text of one key of ``Device.properties``. The key is written into the SQL rather than
+    passed as a parameter, so filters on it match the expression indexes of Device.Meta.
+    """
+    output_field = models.CharField()
 
-    class Meta:
-        unique_together = ('device', 'key')
+    def __init__(self, key, field='properties'):
+        if not re.fullmatch(r'\w+', key):
+            raise ValueError(f"Invalid property name: {key!r}")
+        self.key = key
+        super().__init__(F(field))
 
-    def __str__(self):
-        return f"{self.device.serial_number} - {self.key}: {self.value}"
+    def as_sql(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        return f"JSON_EXTRACT({column}, '$.{self.key}')", params
 
+    def as_postgresql(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        return f"({column} ->> '{self.key}')", params
 
-class Device(models.Model):
+
+class Device(TimestampedModel):
     DEVICE_STATUS_CHOICES = [
         ('installed', 'Installed'),
         ('available', 'Available'),
@@ -145,6 +216,22 @@ class Device(models.Model):
     transfer_date = models.DateField(blank=True, null=True)
     installation_date = models.DateField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
+    # Free key/value properties, e.g. {"mac_address": "...", "firmware": "..."}
+    properties = models.JSONField(default=dict, blank=True)
+    # Keys of ``properties`` that must keep a value (the device form enforces it)
+    required_properties = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        # Match the filters of WarehouseDetailView.get_filtered_devices and the maintenance list
+        indexes = [
+            models.Index(fields=['warehouse', 'status'], name='device_warehouse_status_idx'),
+            models.Index(fields=['warehouse', 'current_location'], name='device_warehouse_loc_idx'),
+            models.Index(fields=['zone', 'status'], name='device_zone_status_idx'),
+            # Common properties, filtered through PropertyValue (services.devices.filter_devices)
+            models.Index(PropertyValue('mac_address'), name='device_prop_mac_idx'),
+            models.Index(PropertyValue('firmware'), name='device_prop_firmware_idx'),
+            models.Index(fields=['updated_at', 'id'], name='device_sync_idx'),
+        ]
 
     @property
     def count_maintenance_cards(self):
@@ -160,7 +247,7 @@ class Device(models.Model):
 
 
 # 7. Maintenance Cards Table
-class MaintenanceCard(models.Model):
+class MaintenanceCard(TimestampedModel):
     device = models.ForeignKey('Device', on_delete=models.CASCADE, related_name='maintenance_cards', verbose_name='الجهاز')
     report_date = models.DateField(blank=True, null=True, verbose_name='تاريخ البلاغ')
     issue_type = models.TextField(verbose_name='نوع المشكلة')
@@ -171,22 +258,29 @@ class MaintenanceCard(models.Model):
     class Meta:
         verbose_name = 'بطاقة صيانة'
         verbose_name_plural = 'بطاقات الصيانة'
+        indexes = [
+            # Keyset ordering of the maintenance list
+            NullsOrderedIndex(F('report_date').desc(nulls_last=True), F('id').desc(), name='maint_report_date_idx'),
+            # Only open cards are looked up by device (pending repairs)
+            models.Index(fields=['device'], condition=models.Q(repair_date__isnull=True), name='maint_pending_device_idx'),
+            models.Index(fields=['updated_at', 'id'], name='maint_sync_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if self.repair_date:
-            self.device.status = 'installed'
-        else:
-            self.device.status = 'damaged'
-        self.device.save()
+        from .services.maintenance import device_status
 
         super().save(*args, **kwargs)
+        status = device_status(self.device)
+        if status != self.device.status:
+            self.device.status = status
+            self.device.save(update_fields=['status', 'updated_at'])
 
     def __str__(self):
         return f"الصيانة للجهاز {self.device.serial_number}"
 
 
 # 8. Tasks (Timeline) Table
-class Task(models.Model):
+class Task(TimestampedModel):
     TASK_STATUS_CHOICES = [
         ('not_started', 'Not Started'),
         ('ongoing', 'Ongoing'),
@@ -200,6 +294,14 @@ class Task(models.Model):
     actual_delivery_date = models.DateField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=TASK_STATUS_CHOICES)
     notes = models.TextField(blank=True, null=True)
+
+    class Meta:
+        # TaskListView filters by zone and status and pages on (deadline, id)
+        indexes = [
+            models.Index(fields=['zone', 'status', 'deadline', 'id'], name='task_zone_status_deadline_idx'),
+            models.Index(fields=['zone', 'deadline', 'id'], name='task_zone_deadline_idx'),
+            models.Index(fields=['updated_at', 'id'], name='task_sync_idx'),
+        ]
     
     @property
     def remaining_days(self):
@@ -221,7 +323,7 @@ class Task(models.Model):
 
 
 # 9. Coordination Requests Table
-class CoordinationRequest(models.Model):
+class CoordinationRequest(TimestampedModel):
     zone = models.ForeignKey('Zone', on_delete=models.CASCADE, related_name='coordination_requests', verbose_name='المنطقة')
     request_date = models.DateField(blank=True, null=True, verbose_name='تاريخ الطلب')
     target_department = models.CharField(max_length=255, verbose_name='الجهة المستهدفة')
@@ -237,6 +339,151 @@ class CoordinationRequest(models.Model):
     class Meta:
         verbose_name = 'طلب تنسيق'
         verbose_name_plural = 'طلبات التنسيق'
+        indexes = [
+            NullsOrderedIndex(
+                F('zone'), F('request_date').desc(nulls_last=True), F('id').desc(), name='coord_zone_date_idx',
+            ),
+            models.Index(fields=['updated_at', 'id'], name='coord_sync_idx'),
+        ]
 
     def __str__(self):
         return f"Coordination for {self.zone.name} - {self.work_type}"
+
+
+# 10. Device Counters Table (denormalized, kept in sync by contracts.signals)
+class DeviceCounter(models.Model):
+    warehouse = models.ForeignKey('Warehouse', on_delete=models.CASCADE, related_name='counters')
+    zone = models.ForeignKey('Zone', on_delete=models.CASCADE, null=True, blank=True, related_name='device_counters')
+    device_category = models.ForeignKey('DeviceCategory', on_delete=models.CASCADE, related_name='counters')
+    total = models.IntegerField(default=0)
+    installed = models.IntegerField(default=0)
+    available = models.IntegerField(default=0)
+    damaged = models.IntegerField(default=0)
+    in_warehouse = models.IntegerField(default=0)
+    in_zones = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['warehouse', 'zone', 'device_category'], name='unique_device_counter'),
+            models.UniqueConstraint(fields=['warehouse', 'device_category'], condition=models.Q(zone__isnull=True),
+                                    name='unique_device_counter_no_zone'),
+        ]
+
+    def __str__(self):
+        return f"{self.warehouse_id} / {self.zone_id or '-'} / {self.device_category_id}: {self.total}"
+
+
+# 11. Export Jobs Table
+class ExportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('excel', 'Excel'),
+        ('pdf', 'PDF'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='export_jobs')
+    view_name = models.CharField(max_length=100)  # اسم الـ URL الذي يُعاد بناء الاستعلام منه
+    view_kwargs = models.JSONField(default=dict, blank=True)
+    query_string = models.TextField(blank=True)
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    rows_total = models.PositiveIntegerField(default=0)
+    rows_done = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to='exports/%Y/%m/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(self.rows_done * 100 / self.rows_total))
+
+    def __str__(self):
+        return f"{self.view_name} ({self.export_format}) - {self.status}"
+
+
+# 12. Import Sessions Table
+class ImportSession(models.Model):
+    STATUS_CHOICES = ExportJob.STATUS_CHOICES
+
+    FORMAT_CHOICES = [
+        ('xlsx', 'Excel'),
+        ('csv', 'CSV'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='import_sessions')
+    file = models.FileField(upload_to='imports/%Y/%m/', max_length=255)
+    original_name = models.CharField(max_length=255, blank=True)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    chunk_size = models.PositiveIntegerField(default=1000)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    rows_total = models.PositiveIntegerField(default=0)
+    rows_done = models.PositiveIntegerField(default=0)
+    chunks_done = models.PositiveIntegerField(default=0)  # آخر دفعة تم حفظها، الاستئناف يبدأ بعدها
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    invalid_rows = models.PositiveIntegerField(default=0)
+    report = models.FileField(upload_to='imports/reports/%Y/%m/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(self.rows_done * 100 / self.rows_total))
+
+    @property
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.rows_done / elapsed, 1) if elapsed > 0 else 0
+
+    def __str__(self):
+        return f"{self.original_name or self.file.name} - {self.status}"
+
+
+# 13. Device Search Documents (one searchable text per device, see contracts.services.search)
+class DeviceSearchDocument(models.Model):
+    device = models.OneToOneField('Device', on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    text = models.TextField()
+
+    def __str__(self):
+        return f"{self.device_id}: {self.text[:50]}"
+
+
+# 14. Tombstones: one row per deleted TimestampedModel row (cascades included), for the sync feed
+class Tombstone(models.Model):
+    model = models.CharField(max_length=50)  # model_name of the deleted row
+    object_pk = models.CharField(max_length=50)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['deleted_at', 'id'], name='tombstone_sync_idx')]
+
+    def __str__(self):
+        return f"{self.model} {self.object_pk} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,143 @@
+import statistics
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db.models import Count
+from django.test import Client
+from django.urls import URLPattern, reverse
+
+from ..models import Contract, Device, ExportJob, ImportSession, Warehouse
+
+
+# Times the pages of contracts/urls.py (and the exports of the ExportMixin views)
+# through the full middleware stack, reading the query counts PerformanceBudgetMiddleware
+# leaves on each response.
+
+# GETs that change data or only make sense as a POST, like every "*_delete"
+UNSAFE_URLS = {'logout', 'task_change_status', 'update_device_status', 'bulk_update_devices'}
+
+EXPORT_FORMATS = ('excel', 'pdf')
+
+# Models of URL parameters other than a view's own ``pk``
+PARAMETER_MODELS = {'warehouse_id': Warehouse, 'device_id': Device}
+
+# ``pk`` of the function views, by URL name prefix
+FUNCTION_VIEW_MODELS = {'export_job': ExportJob, 'import_session': ImportSession}
+
+# A page is only a regression when it is this much slower in absolute terms too
+MIN_REGRESSION_MS = 5.0
+
+
+@dataclass
+class Target:
+    name: str
+    url: str
+    params: dict = field(default_factory=dict)
+
+
+def sample_object(model, user):
+    """The object a detail page is timed with: the biggest contract or warehouse, the first of the rest."""
+    if model is Warehouse:
+        return Warehouse.objects.annotate(size=Count('devices')).order_by('-size', 'pk').first()
+    if model is Contract:
+        return Contract.objects.annotate(size=Count('warehouse__devices')).order_by('-size', 'pk').first()
+    queryset = model.objects.order_by('pk')
+    if any(f.name == 'user' for f in model._meta.fields):
+        # Jobs and import sessions are only visible to their owner
+        queryset = queryset.filter(user=user)
+    return queryset.first()
+
+
+def _parameter_model(pattern, parameter):
+    if parameter in PARAMETER_MODELS:
+        return PARAMETER_MODELS[parameter]
+    if parameter != 'pk':
+        return None
+    view_class = getattr(pattern.callback, 'view_class', None)
+    if view_class is not None:
+        return getattr(view_class, 'model', None)
+    return next((model for prefix, model in FUNCTION_VIEW_MODELS.items() if pattern.name.startswith(prefix)), None)
+
+
+def targets(user, formats=EXPORT_FORMATS):
+    """``(targets, skipped)``: what can be timed with the current data, and the URL names that cannot."""
+    from .. import urls
+    from ..views import ExportMixin
+
+    found, skipped = [], []
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern) or pattern.name in UNSAFE_URLS or pattern.name.endswith('_delete'):
+            continue
+        kwargs = {}
+        for parameter in pattern.pattern.converters:
+            model = _parameter_model(pattern, parameter)
+            obj = sample_object(model, user) if model is not None else None
+            if obj is None:
+                break
+            kwargs[parameter] = obj.pk
+        else:
+            url = reverse(pattern.name, kwargs=kwargs)
+            found.append(Target(pattern.name, url))
+            view_class = getattr(pattern.callback, 'view_class', None)
+            if view_class is not None and issubclass(view_class, ExportMixin):
+                found.extend(Target(f"{pattern.name}:{fmt}", url, {'export': 1, 'format': fmt}) for fmt in formats)
+            continue
+        skipped.append(pattern.name)
+    return found, skipped
+
+
+def client_for(user):
+    host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+    client = Client(SERVER_NAME=host)
+    client.force_login(user)
+    return client
+
+
+def _fetch(client, target):
+    start = time.perf_counter()
+    response = client.get(target.url, target.params)
+    size = len(b''.join(response.streaming_content)) if response.streaming else len(response.content)
+    elapsed = (time.perf_counter() - start) * 1000
+    response.close()
+    return response, elapsed, size
+
+
+def measure(client, target, repeat=5):
+    """Timings of ``repeat`` requests to ``target`` after one warm-up request."""
+    _fetch(client, target)
+    timings, db_timings = [], []
+    for _ in range(repeat):
+        response, elapsed, size = _fetch(client, target)
+        timings.append(elapsed)
+        metrics = getattr(response, 'metrics', None)
+        if metrics is not None:
+            db_timings.append(metrics.db_ms)
+    return {
+        'url': target.url + (f"?export=1&format={target.params['format']}" if target.params else ""),
+        'status': response.status_code,
+        'median_ms': round(statistics.median(timings), 2),
+        'min_ms': round(min(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'db_ms': round(statistics.median(db_timings), 2) if db_timings else None,
+        'queries': metrics.queries if metrics is not None else None,
+        'bytes': size,
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    ``(name, baseline_ms, median_ms, ratio, regressed)`` for every page of ``results``
+    also in ``baseline``. A page regressed when it got slower than ``tolerance`` allows
+    (and by at least MIN_REGRESSION_MS) or runs more queries.
+    """
+    rows = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or 'error' in before or 'error' in result:
+            continue
+        ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else float('inf')
+        slower = ratio > 1 + tolerance and result['median_ms'] - before['median_ms'] >= MIN_REGRESSION_MS
+        more_queries = None not in (result['queries'], before['queries']) and result['queries'] > before['queries']
+        rows.append((name, before['median_ms'], result['median_ms'], ratio, slower or more_queries))
+    return rows
@@ -0,0 +1,141 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from ..models import Device, DeviceCounter
+from .dashboard import DeviceStats, DEVICE_COUNTER_FIELDS
+
+
+# A device is counted in exactly one DeviceCounter row, keyed by (warehouse, zone, category).
+# Single saves/deletes apply +1/-1 deltas (see contracts.signals). Bulk paths work out
+# where the devices they change were counted and where they go, and send the summed
+# deltas with devices_bulk_changed. Only the rebuild_device_counters command, which
+# repairs drifted rows, recomputes whole warehouses with one GROUP BY.
+
+# A device's counter key, as the columns device_key() reads
+KEY_FIELDS = ('warehouse_id', 'zone_id', 'device_category_id', 'status', 'current_location')
+
+
+def device_key(device):
+    return (device.warehouse_id, device.zone_id, device.device_category_id, device.status, device.current_location)
+
+
+def key_counts(devices):
+    """``{counter key: devices}`` for the rows of the ``devices`` queryset, one GROUP BY over them only."""
+    rows = devices.order_by().values(*KEY_FIELDS).annotate(devices=Count('id', distinct=True)).values_list(*KEY_FIELDS, 'devices')
+    return {tuple(row[:-1]): row[-1] for row in rows}
+
+
+def move_deltas(moves):
+    """
+    Summed counter deltas of ``moves``, ``(old key, new key, devices)`` triples; the old
+    key is None for new devices.
+    """
+    deltas = Counter()
+    for old_key, new_key, count in moves:
+        if old_key == new_key:
+            continue
+        if old_key is not None:
+            deltas[old_key] -= count
+        deltas[new_key] += count
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def _counter_values(status, location, delta):
+    values = {'total': delta}
+    if status in ('installed', 'available', 'damaged'):
+        values[status] = delta
+    if location == 'warehouse':
+        values['in_warehouse'] = delta
+    elif location == 'zone':
+        values['in_zones'] = delta
+    return values
+
+
+def apply_delta(key, delta):
+    warehouse_id, zone_id, category_id, status, location = key
+    if warehouse_id is None or category_id is None:
+        return
+
+    lookup = {'warehouse_id': warehouse_id, 'zone_id': zone_id, 'device_category_id': category_id}
+    values = _counter_values(status, location, delta)
+    changes = {field: F(field) + value for field, value in values.items()}
+
+    if DeviceCounter.objects.filter(**lookup).update(**changes) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            DeviceCounter.objects.create(**lookup, **values)
+    except IntegrityError:
+        # Another request created the row first
+        DeviceCounter.objects.filter(**lookup).update(**changes)
+
+
+def apply_deltas(deltas):
+    for key, delta in deltas.items():
+        apply_delta(key, delta)
+
+
+def move_device(old_key, new_key):
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        apply_delta(old_key, -1)
+    if new_key is not None:
+        apply_delta(new_key, 1)
+
+
+def rebuild_counters(warehouse_ids=None):
+    """Recompute the counters of ``warehouse_ids`` (all by default) from their devices."""
+    devices = Device.objects.order_by()
+    counters = DeviceCounter.objects.all()
+    if warehouse_ids is not None:
+        warehouse_ids = list(warehouse_ids)
+        devices = devices.filter(warehouse_id__in=warehouse_ids)
+        counters = counters.filter(warehouse_id__in=warehouse_ids)
+
+    rows = devices.values('warehouse_id', 'zone_id', 'device_category_id').annotate(
+        total=Count('id'),
+        installed=Count('id', filter=Q(status='installed')),
+        available=Count('id', filter=Q(status='available')),
+        damaged=Count('id', filter=Q(status='damaged')),
+        in_warehouse=Count('id', filter=Q(current_location='warehouse')),
+        in_zones=Count('id', filter=Q(current_location='zone')),
+    )
+
+    with transaction.atomic():
+        counters.delete()
+        created = DeviceCounter.objects.bulk_create((DeviceCounter(**row) for row in rows), batch_size=1000)
+    return len(created)
+
+
+def _grouped_stats(group_field, ids):
+    rows = (
+        DeviceCounter.objects.filter(**{f"{group_field}__in": list(ids)})
+        .order_by()
+        .values(group_field)
+        .annotate(**{field: Sum(field) for field in DEVICE_COUNTER_FIELDS})
+    )
+    return {row.pop(group_field): DeviceStats(**row) for row in rows}
+
+
+def warehouse_stats(warehouse_ids):
+    """DeviceStats per warehouse id, one query for any number of warehouses."""
+    return _grouped_stats('warehouse_id', warehouse_ids)
+
+
+def zone_stats(zone_ids):
+    """DeviceStats per zone id, one query for any number of zones."""
+    return _grouped_stats('zone_id', zone_ids)
+
+
+def zone_category_totals(contract_id):
+    """Devices installed in the contract's zones per category id, one query."""
+    rows = (
+        DeviceCounter.objects.filter(zone__contract_id=contract_id)
+        .order_by()
+        .values('device_category_id')
+        .annotate(devices=Sum('total'))
+    )
+    return {row['device_category_id']: row['devices'] for row in rows}
@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce
+
+from ..models import Contract, Zone, DeviceCounter, Task, MaintenanceCard, CoordinationRequest
+from . import sla
+
+
+# Every *_stats() helper runs exactly one aggregate query, whatever the table size.
+# They accept an optional queryset so the same KPIs can be scoped (e.g. to a contract).
+
+@dataclass(frozen=True)
+class DeviceStats:
+    total: int = 0
+    installed: int = 0
+    available: int = 0
+    damaged: int = 0
+    in_warehouse: int = 0
+    in_zones: int = 0
+
+
+DEVICE_COUNTER_FIELDS = ('total', 'installed', 'available', 'damaged', 'in_warehouse', 'in_zones')
+
+
+@dataclass(frozen=True)
+class TaskStats:
+    total: int = 0
+    completed: int = 0
+    not_started: int = 0
+    ongoing: int = 0
+    delayed: int = 0
+
+
+@dataclass(frozen=True)
+class MaintenanceStats:
+    total: int = 0
+    repaired: int = 0
+    pending: int = 0
+
+
+@dataclass(frozen=True)
+class CoordinationStats:
+    total: int = 0
+    last_date: Optional[date] = None
+
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    total_contracts: int
+    total_zones: int
+    devices: DeviceStats
+    tasks: TaskStats
+    maintenance: MaintenanceStats
+    coordination: CoordinationStats
+
+
+def _aggregate(queryset, **aggregates):
+    # order_by() drops Meta.ordering, which is useless (and costly) inside an aggregate
+    return queryset.order_by().aggregate(**aggregates)
+
+
+def device_stats(queryset=None):
+    if queryset is None:
+        # Unscoped totals come from the denormalized counters, not from a Device scan
+        return DeviceStats(**_aggregate(
+            DeviceCounter.objects.all(),
+            **{field: Coalesce(Sum(field), 0) for field in DEVICE_COUNTER_FIELDS}
+        ))
+    return DeviceStats(**_aggregate(
+        queryset,
+        total=Count('id'),
+        installed=Count('id', filter=Q(status='installed')),
+        available=Count('id', filter=Q(status='available')),
+        damaged=Count('id', filter=Q(status='damaged')),
+        in_warehouse=Count('id', filter=Q(current_location='warehouse')),
+        in_zones=Count('id', filter=Q(current_location='zone')),
+    ))
+
+
+def task_stats(queryset=None):
+    # Overdue open tasks count as delayed before mark_delayed_tasks stores it
+    queryset = Task.objects.all() if queryset is None else queryset
+    on = sla.today()
+    return TaskStats(**_aggregate(
+        queryset,
+        total=Count('id'),
+        completed=Count('id', filter=sla.status_filter('completed', on)),
+        not_started=Count('id', filter=sla.status_filter('not_started', on)),
+        ongoing=Count('id', filter=sla.status_filter('ongoing', on)),
+        delayed=Count('id', filter=sla.status_filter('delayed', on)),
+    ))
+
+
+def maintenance_stats(queryset=None):
+    queryset = MaintenanceCard.objects.all() if queryset is None else queryset
+    return MaintenanceStats(**_aggregate(
+        queryset,
+        total=Count('id'),
+        repaired=Count('id', filter=Q(repair_date__isnull=False)),
+        pending=Count('id', filter=Q(repair_date__isnull=True)),
+    ))
+
+
+def coordination_stats(queryset=None):
+    queryset = CoordinationRequest.objects.all() if queryset is None else queryset
+    return CoordinationStats(**_aggregate(
+        queryset,
+        total=Count('id'),
+        last_date=Max('request_date'),
+    ))
+
+
+def dashboard_snapshot():
+    return DashboardSnapshot(
+        total_contracts=Contract.objects.count(),
+        total_zones=Zone.objects.count(),
+        devices=device_stats(),
+        tasks=task_stats(),
+        maintenance=maintenance_stats(),
+        coordination=coordination_stats(),
+    )
@@ -0,0 +1,174 @@
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Optional
+
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from ..models import Device, PropertyValue, Zone
+from . import counters
+from .search import search_devices
+from .sync import batches, bounded_atomic
+
+
+# Bulk status / zone / transfer-date changes: the devices are checked row by row in
+# Python, then the valid ones are written with one UPDATE. Device.save() is bypassed,
+# so its current_location rule is applied in SQL and devices_bulk_changed is sent for
+# the counters and cached fragments.
+
+# Most devices one operation may touch
+MAX_BULK_DEVICES = 5000
+
+# Marks a zone left as it is, None moves the devices back to their warehouse
+UNCHANGED = object()
+
+STATUSES = dict(Device.DEVICE_STATUS_CHOICES)
+
+
+class BulkUpdateError(ValueError):
+    pass
+
+
+def filter_devices(devices, status=None, zone=None, query=None, category=None, properties=None):
+    """
+    ``devices`` filtered like the warehouse detail page: ``zone`` is a zone id or
+    "warehouse", ``properties`` a dict of exact property values.
+    """
+    for key, value in (properties or {}).items():
+        devices = devices.alias(**{f'property_{key}': PropertyValue(key)}).filter(**{f'property_{key}': value})
+    if status:
+        devices = devices.filter(status=status)
+    if category:
+        devices = devices.filter(device_category_id=category)
+    if zone == 'warehouse':
+        devices = devices.filter(current_location='warehouse')
+    elif zone:
+        devices = devices.filter(zone_id=zone)
+    if query:
+        devices = search_devices(devices, query)
+    return devices
+
+
+@dataclass
+class DeviceResult:
+    id: int
+    serial_number: Optional[str] = None
+    updated: bool = False
+    error: str = ""
+
+
+@dataclass
+class BulkUpdate:
+    status: Optional[str] = None
+    zone: object = UNCHANGED
+    transfer_date: Optional[date] = None
+    results: list = field(default_factory=list)
+
+    def __post_init__(self):
+        if self.status is not None and self.status not in STATUSES:
+            raise BulkUpdateError(f"Unknown status: {self.status}.")
+        if self.status is None and self.zone is UNCHANGED and self.transfer_date is None:
+            raise BulkUpdateError("Nothing to change.")
+        if self.status == 'available' and self.zone not in (UNCHANGED, None):
+            raise BulkUpdateError("Available devices go back to their warehouse, they cannot be moved to a zone.")
+        if isinstance(self.zone, Zone) or self.zone in (UNCHANGED, None):
+            return
+        try:
+            self.zone = Zone.objects.get(pk=self.zone)
+        except (Zone.DoesNotExist, ValueError, TypeError):
+            raise BulkUpdateError(f"Zone {self.zone} does not exist.")
+
+    @property
+    def target_zone(self):
+        # Available devices leave their zone, as update_device_status does
+        return None if self.status == 'available' else self.zone
+
+    @property
+    def updated(self):
+        return [result.id for result in self.results if result.updated]
+
+    def check(self, zone_id, status, contract_id):
+        zone = self.target_zone
+        if zone is not None and zone is not UNCHANGED and zone.contract_id != contract_id:
+            return "The zone belongs to another contract."
+        final_zone = zone_id if zone is UNCHANGED else zone
+        if (self.status or status) == 'installed' and final_zone is None:
+            return "Installed devices need a zone."
+        return ""
+
+    def counter_key(self, key):
+        """Where a device counted under ``key`` is counted once the changes are written."""
+        warehouse_id, zone_id, category_id, status, _ = key
+        zone = self.target_zone
+        if zone is not UNCHANGED:
+            zone_id = zone.pk if zone else None
+        return (warehouse_id, zone_id, category_id, self.status or status, 'zone' if zone_id else 'warehouse')
+
+    def changes(self):
+        changes = {'updated_at': timezone.now()}
+        if self.status is not None:
+            changes['status'] = self.status
+        if self.transfer_date is not None:
+            changes['transfer_date'] = self.transfer_date
+        zone = self.target_zone
+        if zone is UNCHANGED:
+            # Same rule as Device.save(), for whatever zone each device keeps
+            changes['current_location'] = Case(
+                When(zone__isnull=True, then=Value('warehouse')), default=Value('zone'),
+            )
+        else:
+            changes['zone'] = zone
+            changes['current_location'] = 'zone' if zone else 'warehouse'
+        return changes
+
+    def apply(self, devices=None, device_ids=None):
+        """
+        Change the devices of the ``devices`` queryset, or those listed in ``device_ids``
+        (reported one by one, missing ones included), committing each batch of
+        SYNC_BATCH_SIZE devices on its own. Returns the per-device results.
+        """
+        if (devices is None) == (device_ids is None):
+            raise BulkUpdateError("Give either devices or device ids.")
+        if device_ids is not None:
+            device_ids = list(dict.fromkeys(device_ids))
+            if len(device_ids) > MAX_BULK_DEVICES:
+                raise BulkUpdateError(f"At most {MAX_BULK_DEVICES} devices can be changed at once.")
+            devices = Device.objects.filter(pk__in=device_ids)
+        elif devices.order_by()[:MAX_BULK_DEVICES + 1].count() > MAX_BULK_DEVICES:
+            raise BulkUpdateError(f"At most {MAX_BULK_DEVICES} devices can be changed at once.")
+
+        found = {}
+        for batch in batches(devices):
+            with bounded_atomic():
+                found.update(self.apply_batch(batch))
+
+        ordered = device_ids if device_ids is not None else list(found)
+        self.results = [found.get(pk) or DeviceResult(pk, error="Device not found.") for pk in ordered]
+        return self.results
+
+    def apply_batch(self, devices):
+        """Lock, check and change one batch of devices; returns their results by pk."""
+        from ..signals import devices_bulk_changed
+
+        # Lock the devices only, not the warehouses joined for the contract
+        rows = devices.select_for_update(of=('self',)).order_by('pk').values_list(
+            'pk', 'serial_number', 'warehouse__contract_id', *counters.KEY_FIELDS,
+        )
+        found = {}
+        warehouse_ids = set()
+        moves = []
+        for pk, serial_number, contract_id, *key in rows:
+            warehouse_id, zone_id, _, status, _ = key
+            error = self.check(zone_id, status, contract_id)
+            found[pk] = DeviceResult(pk, serial_number, updated=not error, error=error)
+            if not error:
+                warehouse_ids.add(warehouse_id)
+                moves.append((tuple(key), self.counter_key(key), 1))
+
+        updated = [pk for pk, result in found.items() if result.updated]
+        if updated:
+            Device.objects.filter(pk__in=updated).update(**self.changes())
+            devices_bulk_changed.send(
+                sender=Device, warehouse_ids=warehouse_ids, counter_deltas=counters.move_deltas(moves),
+            )
+        return found
@@ -0,0 +1,75 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection, transaction
+
+
+# Cached template fragments ({% cachefragment %}) are keyed by the current version of
+# the contracts and warehouses they show. Saving a device, task, maintenance card, ...
+# gives its contract and warehouse a new version, so the next render misses the cache
+# and the old entries simply expire. Versions are random rather than counters so an
+# evicted version key never brings back fragments cached under an older one.
+#
+# Any backend works. With local-memory each process keeps its own fragments and
+# versions, so a save in one worker is not seen by the others; use the file (or a
+# shared) backend when the site runs more than one process.
+
+SCOPES = ('contract', 'warehouse')
+
+# Fragments declaring no scope (the dashboard) depend on everything
+SITE_SCOPE = ('site', 'all')
+
+VERSION_PREFIX = 'fragments.version'
+
+
+def get_cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')]
+
+
+def version_key(scope, pk):
+    return f"{VERSION_PREFIX}.{scope}.{pk}"
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def versions(scopes, known=None):
+    """
+    Current version of every ``(scope, pk)`` in ``scopes``. ``known`` caches the
+    versions already read during this render.
+    """
+    known = {} if known is None else known
+    keys = [version_key(scope, pk) for scope, pk in scopes]
+    missing = [key for key in keys if key not in known]
+    if missing:
+        cache = get_cache()
+        found = cache.get_many(missing)
+        created = {key: _new_version() for key in missing if key not in found}
+        if created:
+            cache.set_many(created, timeout=None)
+        known.update(found)
+        known.update(created)
+    return [known[key] for key in keys]
+
+
+def fragment_key(name, scopes, vary_on=(), known=None):
+    return make_template_fragment_key(name, [*versions(scopes, known), *vary_on])
+
+
+def invalidate(contracts=(), warehouses=()):
+    """New versions for these contracts and warehouses (and the site-wide scope)."""
+    keys = [version_key(*SITE_SCOPE)]
+    keys.extend(version_key('contract', pk) for pk in set(contracts) if pk is not None)
+    keys.extend(version_key('warehouse', pk) for pk in set(warehouses) if pk is not None)
+    get_cache().set_many({key: _new_version() for key in keys}, timeout=None)
+
+
+def schedule_invalidate(contracts=(), warehouses=()):
+    """Invalidate now, and again on commit: a page rendered meanwhile may have cached the old rows."""
+    contracts, warehouses = list(contracts), list(warehouses)
+    invalidate(contracts, warehouses)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: invalidate(contracts, warehouses))
@@ -0,0 +1,93 @@
+import logging
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import ImportSession
+from .import_validation import ImportValidator
+from .importer import DeviceImporter, count_rows, read_chunks
+from .jobs import close_worker_connection, submit_on_commit
+from .sync import bounded_atomic
+
+
+logger = logging.getLogger(__name__)
+
+IMPORT_THREAD_PREFIX = "import-job"
+
+# Sessions resume_imports picks up again. Nothing does it on its own after a restart:
+# run the command when the workers start, while none of them is importing.
+RESUMABLE_STATUSES = ('pending', 'running')
+
+
+def submit_import_session(session):
+    """Queue ``session`` once the surrounding transaction commits."""
+    submit_on_commit(run_import_session, session.pk, IMPORT_THREAD_PREFIX, settings.IMPORT_JOB_WORKERS)
+
+
+def _execute(session):
+    if session.started_at is None:
+        with session.file.open('rb') as file:
+            session.rows_total = count_rows(file, session.file_format)
+        session.started_at = timezone.now()
+        session.save(update_fields=['rows_total', 'started_at'])
+
+    validator = ImportValidator()
+    importer = DeviceImporter(chunk_size=session.chunk_size, validator=validator)
+    with session.file.open('rb') as file:
+        for number, chunk in enumerate(read_chunks(file, session.file_format, session.chunk_size)):
+            if number < session.chunks_done:
+                # Already committed: only replay validation so duplicate serials
+                # and the error report still cover the whole file.
+                validator.validate_chunk(chunk)
+                continue
+
+            # The chunk and the session's progress commit together, a restart
+            # resumes right after the last chunk that made it to the database.
+            with bounded_atomic():
+                result = importer.run([chunk])
+                ImportSession.objects.filter(pk=session.pk).update(
+                    chunks_done=number + 1,
+                    rows_done=F('rows_done') + result.rows,
+                    created_count=F('created_count') + result.created,
+                    updated_count=F('updated_count') + result.updated,
+                    skipped_count=F('skipped_count') + result.skipped,
+                )
+
+    report = validator.report
+    session.refresh_from_db()
+    session.invalid_rows = report.invalid_rows
+    if not report.is_valid:
+        session.report.save(f"{session.pk}.xlsx", File(report.to_xlsx()), save=False)
+    session.status = 'done'
+    session.finished_at = timezone.now()
+    session.save(update_fields=['invalid_rows', 'report', 'status', 'finished_at'])
+
+
+def claim_import_session(session_id, statuses=('pending',)):
+    """Mark the session running if it is in one of ``statuses``, False when another worker got it first."""
+    return ImportSession.objects.filter(pk=session_id, status__in=statuses).update(status='running') == 1
+
+
+def run_import_session(session_id, statuses=('pending',)):
+    if not claim_import_session(session_id, statuses):
+        return
+    session = ImportSession.objects.get(pk=session_id)
+    try:
+        _execute(session)
+    except Exception as exc:
+        logger.exception("Import session %s failed", session_id)
+        ImportSession.objects.filter(pk=session_id).update(status='failed', error=str(exc), finished_at=timezone.now())
+    finally:
+        close_worker_connection(IMPORT_THREAD_PREFIX)
+
+
+def resume_import_sessions():
+    """Run every pending or interrupted session to completion, returns how many were picked up."""
+    session_ids = list(
+        ImportSession.objects.filter(status__in=RESUMABLE_STATUSES).order_by('created_at').values_list('pk', flat=True)
+    )
+    for session_id in session_ids:
+        run_import_session(session_id, statuses=RESUMABLE_STATUSES)
+    return len(session_ids)
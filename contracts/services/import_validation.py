@@ -0,0 +1,133 @@
+import ipaddress
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import pandas as pd
+
+from ..models import Device
+from .excel import write_xlsx
+from .importer import DATE_COLUMNS, normalize_chunk
+
+
+ERROR_COLUMNS = ['row', 'column', 'value', 'error']
+
+# Sheet row of the first data row (row 1 is the header)
+FIRST_DATA_ROW = 2
+
+VALID_STATUSES = [value for value, _ in Device.DEVICE_STATUS_CHOICES]
+VALID_LOCATIONS = [value for value, _ in Device.DEVICE_LOCATION_CHOICES]
+
+
+def _is_ip(value):
+    try:
+        ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _empty_errors():
+    return pd.DataFrame(columns=ERROR_COLUMNS)
+
+
+@dataclass
+class ValidationReport:
+    rows: int = 0
+    frames: list = field(default_factory=list)
+
+    def add(self, rows, errors):
+        self.rows += rows
+        if not errors.empty:
+            self.frames.append(errors)
+
+    @cached_property
+    def errors(self):
+        if not self.frames:
+            return _empty_errors()
+        return pd.concat(self.frames, ignore_index=True).sort_values(['row', 'column'], kind='stable', ignore_index=True)
+
+    @property
+    def is_valid(self):
+        return not self.frames
+
+    @property
+    def invalid_rows(self):
+        return self.errors['row'].nunique()
+
+    @property
+    def valid_rows(self):
+        return self.rows - self.invalid_rows
+
+    def to_xlsx(self):
+        """The error ledger as an xlsx file, one line per failed check."""
+        return write_xlsx(
+            "Import errors", ["Row", "Column", "Value", "Error"],
+            self.errors.itertuples(index=False), widths=[10, 20, 30, 60],
+        )
+
+
+class ImportValidator:
+    """
+    Check device import chunks without touching the database.
+
+    Every rule is a vectorized mask over the chunk, so checking a large file
+    costs a few pandas operations per chunk. Duplicate serials are tracked
+    across chunks, and every checked chunk is recorded in ``report``.
+    """
+
+    def __init__(self):
+        self.seen_serials = set()
+        self.report = ValidationReport()
+
+    def validate(self, chunks):
+        for chunk in chunks:
+            self.validate_chunk(chunk)
+        return self.report
+
+    def invalid_index(self, errors):
+        """Index labels of the chunk rows that failed at least one check."""
+        return pd.Index(errors['row'].unique()) - FIRST_DATA_ROW
+
+    def validate_chunk(self, df):
+        """Check ``df`` and return its errors (columns ``ERROR_COLUMNS``)."""
+        clean = normalize_chunk(df)
+        errors = []
+
+        def flag(mask, column, message, values=None):
+            if mask.any():
+                values = clean[column] if values is None else values
+                errors.append(pd.DataFrame({
+                    'row': clean.index[mask.to_numpy()] + FIRST_DATA_ROW,
+                    'column': column,
+                    'value': values[mask].astype(object).where(values[mask].notna(), "").astype(str).to_numpy(),
+                    'error': message,
+                }))
+
+        for column in ('serial_number', 'device_category', 'warehouse_name'):
+            flag(clean[column] == "", column, "Required value is missing.")
+
+        flag(~clean['status'].isin(VALID_STATUSES), 'status',
+             f"Status must be one of: {', '.join(VALID_STATUSES)}.")
+        flag((clean['current_location'] != "") & ~clean['current_location'].isin(VALID_LOCATIONS), 'current_location',
+             f"Location must be one of: {', '.join(VALID_LOCATIONS)}.")
+        flag((clean['status'] == 'installed') & (clean['zone_name'] == ""), 'zone_name',
+             "Installed devices must have a zone.")
+
+        ips = clean['ip_address']
+        invalid_ips = [value for value in ips.dropna().unique() if not _is_ip(value)]
+        flag(ips.isin(invalid_ips), 'ip_address', "Not a valid IPv4/IPv6 address.")
+
+        for column in DATE_COLUMNS:
+            if column in df:
+                raw = df[column]
+                present = raw.notna() & (raw.astype(object).astype(str).str.strip() != "")
+                flag(present & clean[column].isna(), column, "Not a valid date.", values=raw)
+
+        serials = clean['serial_number']
+        duplicated = (serials != "") & (serials.duplicated(keep='first') | serials.isin(self.seen_serials))
+        flag(duplicated, 'serial_number', "Serial number appears more than once in the file.")
+        self.seen_serials.update(serials[serials != ""])
+
+        errors = pd.concat(errors, ignore_index=True) if errors else _empty_errors()
+        self.report.add(len(df), errors)
+        return errors
@@ -0,0 +1,313 @@
+from dataclasses import dataclass
+from itertools import islice
+
+import openpyxl
+import pandas as pd
+from django.utils import timezone
+
+from ..models import Contract, ContractItem, Device, DeviceCategory, Warehouse, Zone
+from ..signals import devices_bulk_changed
+from . import counters
+from .sync import bounded_atomic
+
+
+# Rows resolved and written per transaction, kept small like the batches of the
+# other sync writers (SYNC_BATCH_SIZE) so each chunk commits within seconds
+IMPORT_CHUNK_SIZE = 500
+
+TEXT_COLUMNS = [
+    'serial_number', 'name', 'invoice_number', 'device_category', 'warehouse_name', 'zone_name',
+    'status', 'current_location', 'responsible_person', 'notes',
+]
+DATE_COLUMNS = ['transfer_date', 'installation_date']
+
+# Encoding of CSV uploads, Excel writes a BOM when saving "CSV UTF-8"
+CSV_ENCODING = 'utf-8-sig'
+
+DEVICE_UPDATE_FIELDS = [
+    'name', 'invoice_number', 'device_category', 'warehouse', 'zone', 'status', 'current_location',
+    'ip_address', 'responsible_person', 'transfer_date', 'installation_date', 'notes', 'updated_at',
+]
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+    def add(self, other):
+        self.rows += other.rows
+        self.created += other.created
+        self.updated += other.updated
+        self.skipped += other.skipped
+        return self
+
+
+def read_xlsx_chunks(file, chunk_size=IMPORT_CHUNK_SIZE):
+    """Yield the first sheet as DataFrames of ``chunk_size`` rows, indexed by sheet row order."""
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+        width = len(header)
+        start = 0
+        while True:
+            batch = [tuple(row[:width]) + (None,) * (width - len(row)) for row in islice(rows, chunk_size)]
+            if not batch:
+                break
+            yield pd.DataFrame(batch, columns=header, index=pd.RangeIndex(start, start + len(batch)), dtype=object)
+            start += len(batch)
+    finally:
+        workbook.close()
+
+
+def read_csv_chunks(file, chunk_size=IMPORT_CHUNK_SIZE):
+    """Yield a CSV file as DataFrames of ``chunk_size`` rows, indexed like ``read_xlsx_chunks``."""
+    reader = pd.read_csv(file, chunksize=chunk_size, dtype=object, encoding=CSV_ENCODING, skipinitialspace=True)
+    with reader:
+        for chunk in reader:
+            chunk.columns = [str(column).strip() for column in chunk.columns]
+            yield chunk
+
+
+CHUNK_READERS = {
+    'xlsx': read_xlsx_chunks,
+    'csv': read_csv_chunks,
+}
+
+
+def detect_format(name):
+    """``'xlsx'`` or ``'csv'`` from an upload name, None when the type is not supported."""
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return extension if extension in CHUNK_READERS else None
+
+
+def read_chunks(file, file_format, chunk_size=IMPORT_CHUNK_SIZE):
+    return CHUNK_READERS[file_format](file, chunk_size)
+
+
+def count_rows(file, file_format):
+    """Number of data rows in ``file``, estimated from the sheet dimensions for xlsx."""
+    if file_format == 'csv':
+        lines = sum(1 for _ in file)
+        return max(lines - 1, 0)
+    workbook = openpyxl.load_workbook(file, read_only=True)
+    try:
+        return max((workbook.active.max_row or 1) - 1, 0)
+    finally:
+        workbook.close()
+
+
+def normalize_chunk(df):
+    """Return a copy of ``df`` with every expected column present and cleaned."""
+    df = df.copy()
+    for column in TEXT_COLUMNS:
+        if column in df:
+            df[column] = df[column].where(df[column].notna(), "").astype(str).str.strip()
+        else:
+            df[column] = ""
+    for column in DATE_COLUMNS:
+        if column in df:
+            df[column] = pd.to_datetime(df[column], errors='coerce').dt.date
+        else:
+            df[column] = None
+        df[column] = df[column].astype(object).where(df[column].notna(), None)
+
+    ip = df['ip_address'].astype(object) if 'ip_address' in df else pd.Series(None, index=df.index, dtype=object)
+    ip = ip.where(ip.notna(), "").astype(str).str.strip()
+    df['ip_address'] = ip.astype(object).where(ip != "", None)
+    return df
+
+
+class DeviceImporter:
+    """
+    Import devices chunk by chunk.
+
+    Each chunk resolves its categories, contracts, warehouses, zones and contract
+    items with a fixed number of queries, then writes devices with bulk_create /
+    bulk_update, all inside one transaction.
+
+    With a ``validator`` (see ``services.import_validation``) every chunk is
+    checked first and the rows that fail are skipped instead of imported.
+    """
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, validator=None):
+        self.chunk_size = chunk_size
+        self.validator = validator
+
+    def import_xlsx(self, file):
+        return self.run(read_xlsx_chunks(file, self.chunk_size))
+
+    def run(self, chunks):
+        result = ImportResult()
+        for chunk in chunks:
+            invalid = 0
+            if self.validator is not None:
+                errors = self.validator.validate_chunk(chunk)
+                if not errors.empty:
+                    index = self.validator.invalid_index(errors)
+                    invalid = len(index)
+                    chunk = chunk.drop(index=index)
+            result.add(self.import_chunk(chunk))
+            result.rows += invalid
+            result.skipped += invalid
+        return result
+
+    def import_chunk(self, df):
+        rows = len(df)
+        df = normalize_chunk(df)
+        df = df[(df['device_category'] != "") & (df['warehouse_name'] != "") & (df['serial_number'] != "")]
+        # Several rows for one serial: the last one wins, as with sequential update_or_create
+        df = df[~df['serial_number'].duplicated(keep='last')]
+        result = ImportResult(rows=rows, skipped=rows - len(df))
+        if df.empty:
+            return result
+
+        with bounded_atomic():
+            categories = self._categories(df['device_category'].unique())
+            warehouses = self._warehouses(df)
+            zones = self._zones(df, warehouses)
+            self._contract_items(df, categories, warehouses)
+            created, updated, warehouse_ids, counter_deltas = self._devices(df, categories, warehouses, zones)
+            devices_bulk_changed.send(
+                sender=Device, warehouse_ids=warehouse_ids, serial_numbers=list(df['serial_number']),
+                counter_deltas=counter_deltas,
+            )
+
+        result.created, result.updated = created, updated
+        return result
+
+    def _categories(self, names):
+        names = list(names)
+        existing = {c.name: c for c in DeviceCategory.objects.filter(name__in=names)}
+        missing = [DeviceCategory(name=name) for name in names if name not in existing]
+        if missing:
+            DeviceCategory.objects.bulk_create(missing, ignore_conflicts=True)
+            existing = {c.name: c for c in DeviceCategory.objects.filter(name__in=names)}
+        return existing
+
+    def _load_warehouses(self, names):
+        # Warehouse names are not unique, the oldest one wins
+        warehouses = {}
+        for warehouse in Warehouse.objects.filter(name__in=names).select_related('contract').order_by('-pk'):
+            warehouses[warehouse.name] = warehouse
+        return warehouses
+
+    def _warehouses(self, df):
+        first_rows = df.drop_duplicates('warehouse_name')
+        names = list(first_rows['warehouse_name'])
+        warehouses = self._load_warehouses(names)
+        missing = first_rows[~first_rows['warehouse_name'].isin(list(warehouses))]
+        if missing.empty:
+            return warehouses
+
+        contract_names = {name: f"AutoContract-{name}" for name in missing['warehouse_name']}
+        contracts = {c.name: c for c in Contract.objects.filter(name__in=list(contract_names.values()))}
+        today = timezone.now().date()
+        Contract.objects.bulk_create([
+            Contract(
+                contract_number=f"CN-{name[:5]}-{index}",
+                name=contract_names[name],
+                start_date=today,
+                notes="Auto-generated contract for import",
+            )
+            for index, name in missing['warehouse_name'].items()
+            if contract_names[name] not in contracts
+        ])
+        contracts = {c.name: c for c in Contract.objects.filter(name__in=list(contract_names.values()))}
+
+        Warehouse.objects.bulk_create([
+            Warehouse(name=name, location="Auto-Imported", contract=contracts[contract_names[name]])
+            for name in missing['warehouse_name']
+        ])
+        return self._load_warehouses(names)
+
+    def _zones(self, df, warehouses):
+        keys = {
+            (zone_name, warehouses[warehouse_name].contract_id)
+            for zone_name, warehouse_name in df.loc[df['zone_name'] != "", ['zone_name', 'warehouse_name']].itertuples(index=False)
+        }
+        if not keys:
+            return {}
+
+        def load():
+            zones = Zone.objects.filter(
+                name__in={name for name, _ in keys},
+                contract_id__in={contract_id for _, contract_id in keys},
+            ).order_by('-pk')
+            return {(zone.name, zone.contract_id): zone for zone in zones}
+
+        zones = load()
+        missing = [
+            Zone(name=name, contract_id=contract_id, notes="Auto-created via import")
+            for name, contract_id in keys if (name, contract_id) not in zones
+        ]
+        if missing:
+            Zone.objects.bulk_create(missing)
+            zones = load()
+        return zones
+
+    def _contract_items(self, df, categories, warehouses):
+        pairs = {
+            (warehouses[warehouse_name].contract_id, categories[category_name].pk)
+            for warehouse_name, category_name in df[['warehouse_name', 'device_category']].itertuples(index=False)
+        }
+        existing = set(
+            ContractItem.objects.filter(
+                contract_id__in={contract_id for contract_id, _ in pairs},
+                category_id__in={category_id for _, category_id in pairs},
+            ).values_list('contract_id', 'category_id')
+        )
+        ContractItem.objects.bulk_create([
+            ContractItem(contract_id=contract_id, category_id=category_id, quantity=1, notes="Auto-added on import")
+            for contract_id, category_id in pairs - existing
+        ])
+
+    def _devices(self, df, categories, warehouses, zones):
+        existing = {
+            serial: (pk, tuple(key))
+            for serial, pk, *key in Device.objects.filter(
+                serial_number__in=list(df['serial_number'])
+            ).values_list('serial_number', 'pk', *counters.KEY_FIELDS)
+        }
+
+        to_create, to_update = [], []
+        warehouse_ids = set()
+        moves = []
+        # bulk_update() writes updated_at as given, it is not set automatically
+        now = timezone.now()
+        for row in df.itertuples(index=False):
+            warehouse = warehouses[row.warehouse_name]
+            zone = zones.get((row.zone_name, warehouse.contract_id)) if row.zone_name else None
+            device = Device(
+                serial_number=row.serial_number,
+                name=row.name,
+                invoice_number=row.invoice_number,
+                device_category=categories[row.device_category],
+                warehouse=warehouse,
+                zone=zone,
+                status=row.status,
+                # Same invariant as Device.save()
+                current_location='zone' if zone else 'warehouse',
+                ip_address=row.ip_address,
+                responsible_person=row.responsible_person,
+                transfer_date=row.transfer_date,
+                installation_date=row.installation_date,
+                notes=row.notes,
+                updated_at=now,
+            )
+            warehouse_ids.add(warehouse.pk)
+            if row.serial_number in existing:
+                device.pk, old_key = existing[row.serial_number]
+                warehouse_ids.add(old_key[0])
+                to_update.append(device)
+            else:
+                old_key = None
+                to_create.append(device)
+            moves.append((old_key, counters.device_key(device), 1))
+
+        Device.objects.bulk_create(to_create, batch_size=500)
+        Device.objects.bulk_update(to_update, DEVICE_UPDATE_FIELDS, batch_size=500)
+        return len(to_create), len(to_update), warehouse_ids, counters.move_deltas(moves)
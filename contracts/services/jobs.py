@@ -0,0 +1,140 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from ..models import ExportJob
+
+
+logger = logging.getLogger(__name__)
+
+# Progress is written back to the job row at most once per this many rows
+PROGRESS_EVERY = 2000
+
+EXPORT_THREAD_PREFIX = "export-job"
+
+# Jobs a restarted process runs again: their thread died with the old process, and
+# an export is written in one go at the end, so it simply starts over
+RESUMABLE_STATUSES = ('pending', 'running')
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def get_executor(prefix=EXPORT_THREAD_PREFIX, max_workers=None):
+    """One thread pool per kind of background job, named after ``prefix``."""
+    with _executor_lock:
+        if prefix not in _executors:
+            _executors[prefix] = ThreadPoolExecutor(
+                max_workers=max_workers or settings.EXPORT_JOB_WORKERS,
+                thread_name_prefix=prefix,
+            )
+    return _executors[prefix]
+
+
+def submit_on_commit(func, pk, prefix, workers):
+    """Run ``func(pk)`` in the ``prefix`` pool once the surrounding transaction commits, inline when ``workers`` is 0."""
+    def submit():
+        if workers:
+            get_executor(prefix, workers).submit(func, pk)
+        else:
+            func(pk)
+
+    transaction.on_commit(submit)
+
+
+def close_worker_connection(prefix):
+    if threading.current_thread().name.startswith(prefix):
+        # Worker threads own their connection, don't leave it open between jobs
+        connection.close()
+
+
+def submit_export_job(job):
+    """Queue ``job`` once the surrounding transaction commits."""
+    submit_on_commit(run_export_job, job.pk, EXPORT_THREAD_PREFIX, settings.EXPORT_JOB_WORKERS)
+
+
+def track_progress(rows, callback, every=PROGRESS_EVERY):
+    """Yield ``rows`` unchanged, reporting the running count to ``callback``."""
+    count = 0
+    for count, row in enumerate(rows, 1):
+        if count % every == 0:
+            callback(count)
+        yield row
+    callback(count)
+
+
+def _build_view(job):
+    # Rebuild the exporting view with the original filters so the job runs
+    # exactly the queryset the user was looking at.
+    match = resolve(reverse(job.view_name, kwargs=job.view_kwargs or None))
+    request = HttpRequest()
+    request.method = "GET"
+    request.GET = QueryDict(job.query_string)
+    request.user = job.user
+    request.resolver_match = match
+
+    view = match.func.view_class(**match.func.view_initkwargs)
+    view.setup(request, *match.args, **match.kwargs)
+    return view
+
+
+def _execute(job):
+    view = _build_view(job)
+    queryset = view.get_export_queryset()
+    ExportJob.objects.filter(pk=job.pk).update(rows_total=queryset.count())
+
+    def report(count):
+        ExportJob.objects.filter(pk=job.pk).update(rows_done=count)
+
+    view.export_progress = report
+    if job.export_format == 'pdf':
+        response, extension = view.export_to_pdf(queryset), 'pdf'
+    else:
+        response, extension = view.export_to_excel(queryset), 'xlsx'
+
+    if response.streaming:
+        content = File(response.file_to_stream)
+    else:
+        content = ContentFile(response.content)
+    try:
+        job.file.save(f"{job.view_name}_{job.pk}.{extension}", content, save=False)
+    finally:
+        response.close()
+
+    ExportJob.objects.filter(pk=job.pk).update(status='done', file=job.file.name, finished_at=timezone.now())
+
+
+def claim_export_job(job_id, statuses=('pending',)):
+    """Mark the job running if it is in one of ``statuses``, False when another worker got it first."""
+    return ExportJob.objects.filter(pk=job_id, status__in=statuses).update(status='running', rows_done=0) == 1
+
+
+def run_export_job(job_id, statuses=('pending',)):
+    if not claim_export_job(job_id, statuses):
+        return
+    job = ExportJob.objects.select_related('user').get(pk=job_id)
+    try:
+        _execute(job)
+    except Exception as exc:
+        logger.exception("Export job %s failed", job_id)
+        ExportJob.objects.filter(pk=job_id).update(status='failed', error=str(exc), finished_at=timezone.now())
+    finally:
+        close_worker_connection(EXPORT_THREAD_PREFIX)
+
+
+def resume_export_jobs():
+    """Run again every job left pending or running by a stopped process, returns how many were picked up."""
+    job_ids = list(
+        ExportJob.objects.filter(status__in=RESUMABLE_STATUSES).order_by('created_at').values_list('pk', flat=True)
+    )
+    for job_id in job_ids:
+        run_export_job(job_id, statuses=RESUMABLE_STATUSES)
+    return len(job_ids)
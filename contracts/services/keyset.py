@@ -0,0 +1,203 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+
+# Keyset (seek) pagination: a page is "the next N rows after this key" instead of
+# "N rows at OFFSET x", so page 10 000 costs the same index seek as page 1.
+#
+# An ordering is a tuple of field names, optionally prefixed with "-", whose last
+# field is unique (usually "pk"). Nullable fields sort NULL as their lowest value:
+# first ascending, last descending, on every backend.
+
+NEXT, PREVIOUS = 'n', 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    has_next: bool
+    has_previous: bool
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _parse(ordering):
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def _reverse(ordering):
+    return tuple(name[1:] if name.startswith('-') else f"-{name}" for name in ordering)
+
+
+def order_by(queryset, ordering):
+    """``queryset`` ordered by ``ordering`` with NULLs placed like the seek conditions expect."""
+    expressions = []
+    for name, descending in _parse(ordering):
+        if not _nullable(queryset.model, name):
+            # A plain column order, which a btree index can serve on every backend
+            expressions.append(F(name).desc() if descending else F(name).asc())
+        elif descending:
+            expressions.append(F(name).desc(nulls_last=True))
+        else:
+            expressions.append(F(name).asc(nulls_first=True))
+    return queryset.order_by(*expressions)
+
+
+def _nullable(model, name):
+    if name == 'pk':
+        return False
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # Annotations (e.g. services.sla) are expected never to be NULL
+        return False
+    return field.null
+
+
+def _after(model, ordering, values):
+    """Q matching the rows that come strictly after ``values`` in ``ordering``."""
+    condition = None
+    for (name, descending), value in reversed(list(zip(_parse(ordering), values))):
+        nullable = _nullable(model, name)
+        if value is None:
+            if descending:
+                # NULLs are last: only NULLs with a greater tail follow
+                after = Q(**{f"{name}__isnull": True}) & condition if condition is not None else Q(pk__in=[])
+            else:
+                after = Q(**{f"{name}__isnull": False})
+                if condition is not None:
+                    after |= Q(**{f"{name}__isnull": True}) & condition
+        else:
+            after = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+            if descending and nullable:
+                after |= Q(**{f"{name}__isnull": True})
+            if condition is not None:
+                after |= Q(**{name: value}) & condition
+        condition = after
+    return condition
+
+
+def key_values(obj, ordering):
+    if isinstance(obj, dict):
+        return [obj[name] for name, _ in _parse(ordering)]
+    return [getattr(obj, name) for name, _ in _parse(ordering)]
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, values], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering, queryset=None):
+    """
+    ``(direction, values)`` of ``cursor``. With ``queryset``, the values are converted
+    to the types of its ordering fields (see typed_values()).
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor(cursor)
+    if queryset is not None:
+        values = typed_values(queryset, ordering, values)
+    return direction, values
+
+
+def _field(queryset, name):
+    model = queryset.model
+    if name == 'pk':
+        return model._meta.pk
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        annotation = queryset.query.annotations.get(name)
+        return annotation.output_field if annotation is not None else None
+
+
+def typed_values(queryset, ordering, values):
+    """
+    ``values`` converted to the types of the ``ordering`` fields of ``queryset``, so a
+    tampered cursor (a string for a date or a pk) fails here rather than in the query.
+    """
+    typed = []
+    for (name, _), value in zip(_parse(ordering), values):
+        if value is None:
+            if not _nullable(queryset.model, name):
+                raise InvalidCursor(values)
+        elif isinstance(value, (list, dict)):
+            raise InvalidCursor(values)
+        else:
+            field = _field(queryset, name)
+            if field is not None:
+                try:
+                    value = field.to_python(value)
+                except (ValidationError, TypeError, ValueError):
+                    raise InvalidCursor(values)
+        typed.append(value)
+    return typed
+
+
+def seek(queryset, ordering, values=None):
+    """``queryset`` ordered by ``ordering``, starting right after the key ``values``."""
+    if values is not None:
+        queryset = queryset.filter(_after(queryset.model, ordering, values))
+    return order_by(queryset, ordering)
+
+
+def paginate(queryset, ordering, cursor=None, page_size=25):
+    """One page of ``queryset`` after (or before) ``cursor``, with the cursors of its neighbours."""
+    direction, values = decode_cursor(cursor, ordering, queryset) if cursor else (NEXT, None)
+
+    if direction == NEXT:
+        rows = list(seek(queryset, ordering, values)[:page_size + 1])
+        has_next, has_previous = len(rows) > page_size, values is not None
+        rows = rows[:page_size]
+    else:
+        rows = list(seek(queryset, _reverse(ordering), values)[:page_size + 1])
+        has_next, has_previous = True, len(rows) > page_size
+        rows = rows[:page_size][::-1]
+
+    page = KeysetPage(rows, has_next=has_next, has_previous=has_previous)
+    if rows and has_next:
+        page.next_cursor = encode_cursor(NEXT, key_values(rows[-1], ordering))
+    if rows and has_previous:
+        page.previous_cursor = encode_cursor(PREVIOUS, key_values(rows[0], ordering))
+    return page
+
+
+def iterate(queryset, ordering, chunk_size=2000):
+    """
+    Yield every row of ``queryset`` in ``ordering``, one seek query per chunk.
+
+    ``queryset`` may be a model, ``values()`` or ``values_list(named=True)`` queryset,
+    as long as its rows hold the ordering fields.
+    """
+    values = None
+    while True:
+        rows = list(seek(queryset, ordering, values)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        values = key_values(rows[-1], ordering)
@@ -0,0 +1,103 @@
+from django.db.models import Case, Exists, OuterRef, Value, When
+from django.utils import timezone
+
+from ..models import Device, MaintenanceCard
+from . import counters
+from .sync import batches, bounded_atomic
+
+
+# A device is damaged while it has an open maintenance card (no repair date). Once
+# every card is repaired it goes back to service: installed when it sits in a zone,
+# available otherwise. Devices without open cards that are not damaged (available,
+# installed) keep their status, and so do damaged devices that never had a card.
+
+# Cards created or closed per transaction, with the status of their devices
+CARD_BATCH_SIZE = 500
+
+
+def open_cards():
+    return MaintenanceCard.objects.filter(device=OuterRef('pk'), repair_date__isnull=True)
+
+
+def repaired_status():
+    return Case(When(zone__isnull=True, then=Value('available')), default=Value('installed'))
+
+
+def device_status(device):
+    """The status ``device`` should have after one of its cards was saved."""
+    if device.maintenance_cards.filter(repair_date__isnull=True).exists():
+        return 'damaged'
+    if device.status == 'damaged':
+        return 'installed' if device.zone_id else 'available'
+    return device.status
+
+
+def _set_status(devices, status, new_status):
+    """
+    Set ``devices`` to ``status`` (a value or an expression) in one transaction;
+    ``new_status(counter key)`` is the status it gives the devices counted under that key.
+    """
+    from ..signals import devices_bulk_changed
+
+    with bounded_atomic():
+        # Counted before the UPDATE, the status each group moves to is known
+        counted = counters.key_counts(devices)
+        if not counted:
+            return 0
+        moves = [(key, (*key[:3], new_status(key), key[4]), count) for key, count in counted.items()]
+        # The joins of the filters cannot be updated, only the pks they select
+        changed = Device.objects.filter(pk__in=devices.values('pk')).update(status=status, updated_at=timezone.now())
+        devices_bulk_changed.send(
+            sender=Device, warehouse_ids={key[0] for key in counted}, counter_deltas=counters.move_deltas(moves),
+        )
+    return changed
+
+
+def sync_device_status(devices=None):
+    """
+    Set the status of ``devices`` (a Device queryset, all devices by default) from their
+    maintenance cards with set-based UPDATEs, one per batch of devices to change.
+    Returns the number of devices changed.
+    """
+    devices = Device.objects.all() if devices is None else devices
+    to_damage = devices.filter(Exists(open_cards())).exclude(status='damaged')
+    to_repair = devices.filter(~Exists(open_cards()), status='damaged', maintenance_cards__isnull=False)
+
+    changed = 0
+    for batch in batches(to_damage):
+        changed += _set_status(batch, 'damaged', lambda key: 'damaged')
+    for batch in batches(to_repair):
+        changed += _set_status(batch, repaired_status(), lambda key: 'installed' if key[1] else 'available')
+    return changed
+
+
+def _cards_changed(device_ids):
+    from ..signals import devices_bulk_changed
+
+    devices = Device.objects.filter(pk__in=list(device_ids))
+    if not sync_device_status(devices):
+        # No status changed, the cached pages listing the cards still have to go
+        warehouse_ids = set(devices.order_by().values_list('warehouse_id', flat=True).distinct())
+        devices_bulk_changed.send(sender=Device, warehouse_ids=warehouse_ids)
+
+
+def create_cards(cards, batch_size=CARD_BATCH_SIZE):
+    """``bulk_create`` the unsaved ``cards``, then update the status of their devices, one transaction per batch."""
+    cards = list(cards)
+    for start in range(0, len(cards), batch_size):
+        batch = cards[start:start + batch_size]
+        with bounded_atomic():
+            MaintenanceCard.objects.bulk_create(batch)
+            _cards_changed({card.device_id for card in batch})
+    return cards
+
+
+def close_cards(cards, repair_date, batch_size=CARD_BATCH_SIZE):
+    """Give the open cards of the ``cards`` queryset a repair date, then update their devices, one transaction per batch."""
+    closed = 0
+    for batch in batches(cards.filter(repair_date__isnull=True), batch_size):
+        with bounded_atomic():
+            device_ids = list(batch.order_by().values_list('device_id', flat=True).distinct())
+            closed += batch.update(repair_date=repair_date, updated_at=timezone.now())
+            _cards_changed(device_ids)
+    return closed
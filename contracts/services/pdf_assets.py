@@ -0,0 +1,47 @@
+import os
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from svglib.svglib import svg2rlg
+
+
+# Fonts and the logo are loaded once per process and shared by every PDF export.
+FONT_NAME = "Janna"
+FONT_PATH = "contracts/fonts/Janna LT Bold/Janna LT Bold.ttf"
+LOGO_PATH = "contracts/img/logo-1.svg"
+
+_font_lock = threading.Lock()
+
+
+def static_path(path):
+    # STATIC_ROOT is only filled by collectstatic, fall back to the source directories
+    return finders.find(path) or os.path.join(settings.STATIC_ROOT, path)
+
+
+def register_fonts():
+    """Register the report font with reportlab (once) and return its name."""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        with _font_lock:
+            if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(TTFont(FONT_NAME, static_path(FONT_PATH)))
+    return FONT_NAME
+
+
+@lru_cache(maxsize=None)
+def _logo_drawing():
+    return svg2rlg(static_path(LOGO_PATH))
+
+
+def logo():
+    """A fresh, cheap copy of the parsed logo that callers may position or scale."""
+    drawing = _logo_drawing().copy()
+    drawing.hAlign = "LEFT"
+    return drawing
+
+
+def clear_cache():
+    _logo_drawing.cache_clear()
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from ..models import Contract, DeviceCategory, Zone
+
+
+# Contracts, zones and categories fill the filter dropdowns of every list page but
+# rarely change, so they are read from the cache. Entries expire after
+# REFERENCE_CACHE_TIMEOUT and are evicted by the signals in contracts.signals on
+# every save or delete. Values are plain model lists, which every backend can store.
+
+CONTRACTS_KEY = 'reference.contracts'
+CATEGORIES_KEY = 'reference.categories'
+
+
+def zones_key(contract_id):
+    return f"reference.zones.{contract_id}"
+
+
+def get_cache():
+    return caches[getattr(settings, 'REFERENCE_CACHE_ALIAS', 'default')]
+
+
+def _cached(key, load):
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        value = load()
+        cache.set(key, value, getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 300))
+    return value
+
+
+def contracts():
+    """Every contract, newest first (the Contract ordering, made total)."""
+    return _cached(CONTRACTS_KEY, lambda: list(Contract.objects.order_by('-start_date', 'pk')))
+
+
+def get_contract(contract_number):
+    contract_number = str(contract_number)
+    return next((contract for contract in contracts() if contract.pk == contract_number), None)
+
+
+def last_contract():
+    """The cached equivalent of ``Contract.objects.last()``."""
+    items = contracts()
+    return items[-1] if items else None
+
+
+def zones(contract_id):
+    """Zones of the contract ``contract_id``, empty for a contract that does not exist."""
+    contract = get_contract(contract_id) if contract_id else None
+    if contract is None:
+        return []
+    return _cached(zones_key(contract.pk), lambda: list(Zone.objects.filter(contract=contract).order_by('pk')))
+
+
+def categories():
+    return _cached(CATEGORIES_KEY, lambda: list(DeviceCategory.objects.order_by('pk')))
+
+
+def evict(*keys):
+    """Drop ``keys`` now and again on commit, so a request reading the old rows meanwhile does not keep them."""
+    cache = get_cache()
+    cache.delete_many(keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys))
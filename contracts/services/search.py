@@ -0,0 +1,163 @@
+import json
+import sqlite3
+
+from django.db import connection, transaction
+from django.db.models import Q, TextField
+from django.db.models.expressions import RawSQL
+
+from ..models import Device, DeviceSearchDocument
+
+
+# Every device has one DeviceSearchDocument holding the text operators search on.
+# The database indexes that text (FTS5 trigram on SQLite, tsvector + pg_trgm on
+# PostgreSQL, see migration 0008) and a backend turns a query into a filter on the
+# devices. Every match is kept, so counts, exports and bulk updates see all of them;
+# ranking is left to the rows being displayed (rank_devices).
+
+DOCUMENT_FIELDS = ('serial_number', 'name', 'ip_address', 'invoice_number', 'responsible_person')
+
+# Documents rebuilt per query when (re)indexing
+INDEX_CHUNK_SIZE = 500
+
+FTS_TABLE = 'contracts_device_fts'
+
+# The trigram tokenizer needs SQLite 3.34 and at least three characters to match
+SQLITE_TRIGRAM_VERSION = (3, 34, 0)
+MIN_TRIGRAM_LENGTH = 3
+
+
+def document_text(values, properties=None):
+    parts = [str(value) for value in values if value]
+    parts.extend(f"{key} {value}" for key, value in (properties or {}).items())
+    return " ".join(parts)
+
+
+def _index_chunk(device_ids):
+    documents = [
+        DeviceSearchDocument(device_id=row[0], text=document_text(row[1:-1], row[-1]))
+        for row in Device.objects.filter(pk__in=device_ids).values_list('pk', *DOCUMENT_FIELDS, 'properties')
+    ]
+    with transaction.atomic():
+        DeviceSearchDocument.objects.filter(device_id__in=device_ids).delete()
+        DeviceSearchDocument.objects.bulk_create(documents)
+
+
+def index_devices(devices=None):
+    """Rebuild the search documents of ``devices`` (a Device queryset, all devices by default)."""
+    devices = Device.objects.all() if devices is None else devices
+    device_ids = list(devices.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(device_ids), INDEX_CHUNK_SIZE):
+        _index_chunk(device_ids[start:start + INDEX_CHUNK_SIZE])
+    return len(device_ids)
+
+
+def schedule_index(devices):
+    """Reindex ``devices`` once the surrounding transaction commits (the queryset is evaluated then)."""
+    transaction.on_commit(lambda: index_devices(devices))
+
+
+class SearchBackend:
+    """Substring match on the document text, works on every database."""
+
+    def search(self, queryset, query):
+        return queryset.filter(search_document__text__icontains=query).order_by('pk')
+
+    def rank(self, devices, query):
+        return devices
+
+
+def _phrase(query):
+    # Quoted as one FTS5 string, the trigram tokenizer then matches it anywhere in the text
+    return '"' + query.replace('"', '""') + '"'
+
+
+class SQLiteSearchBackend(SearchBackend):
+    def search(self, queryset, query):
+        if len(query) < MIN_TRIGRAM_LENGTH:
+            return super().search(queryset, query)
+        matches = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_phrase(query)])
+        return queryset.filter(pk__in=matches).order_by('pk')
+
+    def rank(self, devices, query):
+        if len(query) < MIN_TRIGRAM_LENGTH:
+            return devices
+        # The ids travel as one JSON parameter, whatever the number of rows shown
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"AND rowid IN (SELECT value FROM json_each(%s)) ORDER BY rank",
+                [_phrase(query), json.dumps([device.pk for device in devices])],
+            )
+            position = {row[0]: i for i, row in enumerate(cursor.fetchall())}
+        return sorted(devices, key=lambda device: position.get(device.pk, len(position)))
+
+
+class PostgresSearchBackend(SearchBackend):
+    def __init__(self):
+        from django.contrib.postgres.lookups import TrigramSimilar
+
+        # Registered by django.contrib.postgres when it is installed, which this project does not need
+        TextField.register_lookup(TrigramSimilar)
+
+    def _vector(self, query):
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+
+        # Same expressions as the GIN indexes of migration 0008
+        return SearchVector('search_document__text', config='simple'), SearchQuery(query, config='simple')
+
+    def search(self, queryset, query):
+        vector, search_query = self._vector(query)
+        return (
+            queryset.annotate(search_vector=vector)
+            .filter(Q(search_vector=search_query) | Q(search_document__text__trigram_similar=query))
+            .order_by('pk')
+        )
+
+    def rank(self, devices, query):
+        from django.contrib.postgres.search import SearchRank, TrigramSimilarity
+
+        # Like SQLite: only the rows shown are ranked, never every match
+        vector, search_query = self._vector(query)
+        ranked = (
+            Device.objects.filter(pk__in=[device.pk for device in devices])
+            .annotate(
+                search_rank=SearchRank(vector, search_query),
+                search_similarity=TrigramSimilarity('search_document__text', query),
+            )
+            .order_by('-search_rank', '-search_similarity', 'pk')
+            .values_list('pk', flat=True)
+        )
+        position = {pk: i for i, pk in enumerate(ranked)}
+        return sorted(devices, key=lambda device: position.get(device.pk, len(position)))
+
+
+_backends = {}
+
+
+def get_backend():
+    vendor = connection.vendor
+    if vendor not in _backends:
+        if vendor == 'sqlite' and sqlite3.sqlite_version_info >= SQLITE_TRIGRAM_VERSION:
+            _backends[vendor] = SQLiteSearchBackend()
+        elif vendor == 'postgresql':
+            _backends[vendor] = PostgresSearchBackend()
+        else:
+            _backends[vendor] = SearchBackend()
+    return _backends[vendor]
+
+
+def search_devices(queryset, query):
+    """Devices of ``queryset`` matching ``query``, every one of them."""
+    query = (query or "").strip()
+    if not query:
+        return queryset
+    return get_backend().search(queryset, query)
+
+
+def rank_devices(devices, query):
+    """The devices about to be displayed, as a list with the best matches of ``query`` first."""
+    devices = list(devices)
+    query = (query or "").strip()
+    if not query or not devices:
+        return devices
+    return get_backend().rank(devices, query)
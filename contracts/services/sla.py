@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.db.models import Case, CharField, F, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from ..models import Task
+from . import fragments
+from .sync import batches, bounded_atomic
+
+
+# Task deadlines computed by the database, so the task list can filter and sort on
+# lateness and the counts agree with the rows. A task is overdue when it is still open
+# (not started or ongoing, nothing delivered) after its deadline: it counts as delayed
+# from that day on, and mark_delayed() (the mark_delayed_tasks command, run daily)
+# stores the status.
+
+OPEN_STATUSES = ('not_started', 'ongoing')
+
+
+class DaysBetween(Func):
+    """Whole days from the ``start`` date to the ``end`` date, negative when ``end`` comes first."""
+    arity = 2
+    output_field = IntegerField()
+
+    def _compile(self, compiler):
+        start, end = (compiler.compile(expression) for expression in self.source_expressions)
+        return start, end
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (start, start_params), (end, end_params) = self._compile(compiler)
+        return f"CAST(julianday({end}) - julianday({start}) AS INTEGER)", [*end_params, *start_params]
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        (start, start_params), (end, end_params) = self._compile(compiler)
+        return f"(({end})::date - ({start})::date)", [*end_params, *start_params]
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        (start, start_params), (end, end_params) = self._compile(compiler)
+        return f"DATEDIFF({end}, {start})", [*end_params, *start_params]
+
+
+def today():
+    # Same reference date as Task.remaining_days
+    return timezone.now().date()
+
+
+def overdue(on=None):
+    """Q of the open tasks past their deadline on ``on`` (today by default)."""
+    return Q(status__in=OPEN_STATUSES, actual_delivery_date__isnull=True, deadline__lt=on or today())
+
+
+def status_filter(status, on=None):
+    """Q of the tasks whose effective status is ``status``: overdue open tasks are delayed."""
+    if status == 'delayed':
+        return Q(status='delayed') | overdue(on)
+    if status in OPEN_STATUSES:
+        return Q(status=status) & ~overdue(on)
+    return Q(status=status)
+
+
+def late_filter(min_days, on=None):
+    """
+    Q of the tasks at least ``min_days`` past their deadline, on a queryset from annotate().
+    Undelivered tasks are matched on the deadline alone, which the deadline indexes serve.
+    """
+    on = on or today()
+    return (
+        Q(actual_delivery_date__isnull=True, deadline__lte=on - timedelta(days=min_days))
+        | Q(actual_delivery_date__isnull=False, sla_late_days__gte=min_days)
+    )
+
+
+def annotate(tasks, on=None):
+    """
+    ``tasks`` with the SLA columns: ``sla_remaining_days`` and ``sla_delay_days`` (as
+    Task.remaining_days and Task.delay_days), ``sla_late_days`` (days past the deadline,
+    delivered or not, 0 when on time) and ``sla_status`` (the effective status).
+    """
+    on = on or today()
+    reference = Coalesce('actual_delivery_date', Value(on))
+    return tasks.annotate(
+        sla_remaining_days=DaysBetween(reference, 'deadline'),
+        sla_delay_days=Case(
+            When(actual_delivery_date__gt=F('deadline'), then=DaysBetween('deadline', 'actual_delivery_date')),
+            default=Value(0),
+        ),
+        sla_late_days=Greatest(DaysBetween('deadline', reference), Value(0)),
+        sla_status=Case(When(overdue(on), then=Value('delayed')), default=F('status'), output_field=CharField()),
+    )
+
+
+def mark_delayed(on=None):
+    """Set the overdue open tasks to ``delayed``, one UPDATE per batch; returns how many changed."""
+    changed = 0
+    for tasks in batches(Task.objects.filter(overdue(on))):
+        with bounded_atomic():
+            contract_ids = set(tasks.order_by().values_list('zone__contract_id', flat=True).distinct())
+            # QuerySet.update() skips the Task signals that expire the cached fragments
+            changed += tasks.update(status='delayed', updated_at=timezone.now())
+            fragments.schedule_invalidate(contracts=contract_ids)
+    return changed
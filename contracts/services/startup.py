@@ -0,0 +1,70 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+
+
+# Cold start of a worker: a fresh interpreter runs django.setup() and loads the URLconf,
+# which imports every view module, as a gunicorn worker does before its first request.
+# Each sample is a new process, so nothing is shared with the process measuring.
+
+# Libraries only the imports and exports need, expected to stay out of a fresh worker
+HEAVY_MODULES = ('pandas', 'openpyxl', 'reportlab', 'svglib', 'arabic_reshaper', 'bidi')
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.urls import get_resolver, resolve
+get_resolver().url_patterns
+resolve('/')
+end = time.perf_counter()
+try:
+    with open('/proc/self/status') as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmRSS:'))
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1)
+print(json.dumps({
+    'setup_ms': (setup - start) * 1000,
+    'urls_ms': (end - setup) * 1000,
+    'rss_kb': rss_kb,
+    'modules': sorted(name for name in %r if name in sys.modules),
+}))
+"""
+
+
+class StartupError(RuntimeError):
+    pass
+
+
+def sample(settings_module=None):
+    """One cold start in a new interpreter: its timings, RSS and the heavy modules it loaded."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module or settings.SETTINGS_MODULE)
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE % (HEAVY_MODULES,)],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise StartupError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat=5, settings_module=None):
+    """Medians of ``repeat`` cold starts."""
+    samples = [sample(settings_module) for _ in range(repeat)]
+    setup = [s['setup_ms'] for s in samples]
+    urls = [s['urls_ms'] for s in samples]
+    total = [s['setup_ms'] + s['urls_ms'] for s in samples]
+    return {
+        'setup_ms': round(statistics.median(setup), 1),
+        'urls_ms': round(statistics.median(urls), 1),
+        'total_ms': round(statistics.median(total), 1),
+        'rss_mb': round(statistics.median(s['rss_kb'] for s in samples) / 1024, 1),
+        'modules': samples[-1]['modules'],
+    }
@@ -0,0 +1,159 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import (
+    Contract, ContractItem, CoordinationRequest, Device, DeviceCategory, MaintenanceCard, Task, Tombstone,
+    Warehouse, Zone,
+)
+from . import keyset
+
+
+# Delta sync for offline clients: every synced model has created_at / updated_at and
+# every delete leaves a Tombstone (contracts.signals). Each model is paged on
+# (updated_at, pk) with the keyset helpers, so a poll reads the rows changed since
+# the client's cursor, whatever the size of the tables.
+#
+# A cursor holds one position per model and one for the tombstones. Rows changed
+# during the last SYNC_SETTLE_SECONDS are held back for a later poll: a transaction
+# still open when the feed is read may commit rows stamped before the positions
+# already handed out. That only holds while no transaction stays open longer than
+# the delay, so the bulk writers split their work with batches() and commit each
+# batch of at most SYNC_BATCH_SIZE rows in its own bounded_atomic(). A tombstone
+# older than the row's updated_at is stale (the contract number was used again) and
+# must not delete it.
+
+SYNC_MODELS = {
+    model._meta.model_name: model
+    for model in (
+        Contract, DeviceCategory, ContractItem, Warehouse, Zone, Device, MaintenanceCard, Task, CoordinationRequest,
+    )
+}
+
+ORDERING = ('updated_at', 'pk')
+TOMBSTONE_ORDERING = ('deleted_at', 'pk')
+TOMBSTONES = 'deleted'
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+def settle_delay():
+    return timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 30))
+
+
+def batch_size():
+    return getattr(settings, 'SYNC_BATCH_SIZE', 500)
+
+
+def batches(queryset, size=None):
+    """
+    ``queryset`` split by pk range into querysets of at most ``size`` rows (SYNC_BATCH_SIZE
+    by default), one query per batch. Each range is read once the previous batch is
+    written, so batches whose rows leave ``queryset`` once updated still move on.
+    """
+    size = size or batch_size()
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        batch = list((pks if last is None else pks.filter(pk__gt=last))[:size])
+        if not batch:
+            return
+        yield queryset.filter(pk__range=(batch[0], batch[-1]))
+        if len(batch) < size:
+            return
+        last = batch[-1]
+
+
+@contextmanager
+def bounded_atomic(using=None):
+    """
+    ``transaction.atomic()`` for one batch of synced rows. The caller keeps the batch
+    small (batches()); on PostgreSQL a statement running longer than
+    SYNC_MAX_TRANSACTION_SECONDS is also cancelled, before it holds the commit back.
+    """
+    with transaction.atomic(using=using):
+        connection = transaction.get_connection(using)
+        if connection.vendor == 'postgresql':
+            limit = getattr(settings, 'SYNC_MAX_TRANSACTION_SECONDS', 20)
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", [int(limit * 1000)])
+        yield
+
+
+@dataclass
+class ChangeSet:
+    changes: dict = field(default_factory=dict)
+    deleted: list = field(default_factory=list)
+    cursor: str = ""
+    # Some feed stopped at the limit: ask again with the new cursor right away
+    more: bool = False
+
+
+def _feeds():
+    return [*SYNC_MODELS, TOMBSTONES]
+
+
+def encode_cursor(positions):
+    values = []
+    for name in _feeds():
+        moment, pk = positions.get(name, (None, None))
+        # ISO strings keep the microseconds DjangoJSONEncoder would cut from datetimes
+        values.append([moment.isoformat(), pk] if moment else None)
+    return keyset.encode_cursor(keyset.NEXT, values)
+
+
+def decode_cursor(cursor):
+    """``{feed: (updated_at, pk)}`` of ``cursor``, empty for none (a full sync)."""
+    if not cursor:
+        return {}
+    _, values = keyset.decode_cursor(cursor, _feeds())
+    positions = {}
+    for name, value in zip(_feeds(), values):
+        if value is None:
+            continue
+        if not isinstance(value, list) or len(value) != 2 or not isinstance(value[0], str):
+            raise keyset.InvalidCursor(cursor)
+        moment = parse_datetime(value[0])
+        if moment is None:
+            raise keyset.InvalidCursor(cursor)
+        model = Tombstone if name == TOMBSTONES else SYNC_MODELS[name]
+        pk, = keyset.typed_values(model.objects.all(), ('pk',), value[1:])
+        positions[name] = (moment, pk)
+    return positions
+
+
+def _page(queryset, ordering, position, limit):
+    rows = list(keyset.seek(queryset, ordering, list(position) if position else None)[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def changes(cursor=None, limit=DEFAULT_LIMIT, now=None):
+    """The rows changed and deleted after ``cursor``, at most ``limit`` per model."""
+    positions = decode_cursor(cursor)
+    until = (now or timezone.now()) - settle_delay()
+    result = ChangeSet()
+
+    for name, model in SYNC_MODELS.items():
+        columns = [f.attname for f in model._meta.concrete_fields]
+        queryset = model.objects.filter(updated_at__lte=until).values('pk', *columns)
+        rows, more = _page(queryset, ORDERING, positions.get(name), limit)
+        result.changes[name] = rows
+        result.more |= more
+        if rows:
+            positions[name] = (rows[-1]['updated_at'], rows[-1]['pk'])
+
+    queryset = Tombstone.objects.filter(deleted_at__lte=until).values('pk', 'model', 'object_pk', 'deleted_at')
+    rows, more = _page(queryset, TOMBSTONE_ORDERING, positions.get(TOMBSTONES), limit)
+    result.deleted = [{'model': row['model'], 'pk': row['object_pk'], 'deleted_at': row['deleted_at']} for row in rows]
+    result.more |= more
+    if rows:
+        positions[TOMBSTONES] = (rows[-1]['deleted_at'], rows[-1]['pk'])
+
+    result.cursor = encode_cursor(positions)
+    return result
@@ -0,0 +1,204 @@
+import random
+from collections import Counter
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from ..models import (
+    Contract, ContractItem, CoordinationRequest, Device, DeviceCategory, MaintenanceCard, Task, Warehouse, Zone
+)
+from . import counters, search
+
+
+# Synthetic data at production scale for benchmarks. Everything goes through
+# bulk_create in batches, so a million devices never sit in memory at once.
+
+CATEGORY_NAMES = (
+    'Camera - Dome', 'Camera - Bullet', 'Camera - PTZ', 'Camera - LPR', 'Camera - Panoramic',
+    'NVR', 'Switch', 'Cables', 'Rack', 'Monitor', 'Work Station', 'Video Wall', 'Fire Alarm',
+)
+
+# Cameras make up most of a contract, racks and video walls are rare
+CATEGORY_WEIGHTS = (30, 20, 8, 5, 4, 6, 8, 6, 3, 4, 3, 1, 2)
+
+DEVICE_STATUS_WEIGHTS = {'installed': 70, 'available': 20, 'damaged': 10}
+
+# Share of the devices of each status that have a maintenance history
+MAINTENANCE_RATES = {'installed': 0.08, 'available': 0.02, 'damaged': 0.8}
+
+ISSUE_TYPES = ('No video signal', 'Power failure', 'Network down', 'Lens damaged', 'Firmware error')
+DEPARTMENTS = ('Municipality', 'Police', 'Electricity company', 'Telecom operator', 'Roads authority')
+WORK_TYPES = ('Excavation', 'Pole installation', 'Cabling', 'Power connection')
+TECHNICIANS = tuple(f"Technician {i}" for i in range(1, 21))
+
+BATCH_SIZE = 5000
+
+
+class SyntheticData:
+    def __init__(self, prefix="SYN", seed=0, batch_size=BATCH_SIZE, today=None):
+        self.prefix = prefix
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.today = today or date.today()
+        self.created = Counter()
+
+    def days_ago(self, low, high):
+        return self.today - timedelta(days=self.random.randint(low, high))
+
+    def categories(self):
+        existing = dict(DeviceCategory.objects.filter(name__in=CATEGORY_NAMES).values_list('name', 'pk'))
+        missing = [DeviceCategory(name=name) for name in CATEGORY_NAMES if name not in existing]
+        DeviceCategory.objects.bulk_create(missing)
+        self.created['devicecategory'] += len(missing)
+        by_name = {category.name: category for category in DeviceCategory.objects.filter(name__in=CATEGORY_NAMES)}
+        return [by_name[name] for name in CATEGORY_NAMES]
+
+    def split(self, total, parts):
+        """``total`` spread over ``parts`` with a long tail: a few big contracts, many small ones."""
+        weights = [self.random.lognormvariate(0, 0.75) for _ in range(parts)]
+        shares = [int(total * weight / sum(weights)) for weight in weights]
+        shares[0] += total - sum(shares)
+        return shares
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.created[model._meta.model_name] += len(objects)
+
+    def contract(self, number, zones):
+        start = self.days_ago(30, 3 * 365)
+        contract = Contract.objects.create(
+            contract_number=f"{self.prefix}-{number:05d}",
+            name=f"Synthetic contract {number}",
+            start_date=start,
+            end_date=start + timedelta(days=self.random.choice((365, 730, 1095))),
+        )
+        warehouse = Warehouse.objects.create(name=f"Warehouse {contract.pk}", location=f"Site {number}", contract=contract)
+        self.bulk_create(Zone, [Zone(name=f"Zone {contract.pk}-{i + 1}", contract=contract) for i in range(zones)])
+        self.created['contract'] += 1
+        self.created['warehouse'] += 1
+        return contract, warehouse, list(contract.zones.order_by('pk'))
+
+    def devices(self, warehouse, zones, categories, count, first_serial):
+        statuses = list(DEVICE_STATUS_WEIGHTS)
+        per_category = Counter()
+        batch = []
+        for n in range(first_serial, first_serial + count):
+            status = self.random.choices(statuses, weights=DEVICE_STATUS_WEIGHTS.values())[0]
+            category = self.random.choices(categories, weights=CATEGORY_WEIGHTS)[0]
+            per_category[category.pk] += 1
+            # Installed devices are in a zone, damaged ones half the time
+            zone = None
+            if zones and (status == 'installed' or (status == 'damaged' and self.random.random() < 0.5)):
+                zone = self.random.choice(zones)
+            transfer_date = self.days_ago(1, 700)
+            batch.append(Device(
+                serial_number=f"{self.prefix}-{n:08d}",
+                name=f"{category.name} {n}",
+                invoice_number=f"INV-{self.prefix}-{n // 250:05d}",
+                device_category=category,
+                warehouse=warehouse,
+                zone=zone,
+                current_location='zone' if zone else 'warehouse',
+                status=status,
+                ip_address=f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}" if status == 'installed' else None,
+                responsible_person=self.random.choice(TECHNICIANS),
+                transfer_date=transfer_date,
+                installation_date=transfer_date + timedelta(days=self.random.randint(0, 30)) if zone else None,
+            ))
+            if len(batch) == self.batch_size:
+                self.bulk_create(Device, batch)
+                batch = []
+        self.bulk_create(Device, batch)
+
+        self.bulk_create(ContractItem, [
+            ContractItem(contract_id=warehouse.contract_id, category_id=category_id, quantity=quantity)
+            for category_id, quantity in per_category.items()
+        ])
+
+    def maintenance_cards(self, warehouse):
+        batch = []
+        devices = Device.objects.filter(warehouse=warehouse).values_list('pk', 'status').order_by('pk')
+        for device_id, status in devices.iterator(chunk_size=self.batch_size):
+            if self.random.random() >= MAINTENANCE_RATES[status]:
+                continue
+            report_date = self.days_ago(0, 365)
+            # Only damaged devices have an open card, as contracts.services.maintenance keeps it
+            pending = status == 'damaged'
+            batch.append(MaintenanceCard(
+                device_id=device_id,
+                report_date=report_date,
+                issue_type=self.random.choice(ISSUE_TYPES),
+                repair_date=None if pending else min(self.today, report_date + timedelta(days=self.random.randint(0, 14))),
+                technician=self.random.choice(TECHNICIANS),
+            ))
+            if len(batch) == self.batch_size:
+                self.bulk_create(MaintenanceCard, batch)
+                batch = []
+        self.bulk_create(MaintenanceCard, batch)
+
+    def tasks(self, zones, per_zone):
+        tasks = []
+        for zone in zones:
+            for i in range(per_zone):
+                deadline = self.today + timedelta(days=self.random.randint(-120, 90))
+                if deadline < self.today:
+                    status = self.random.choices(['completed', 'delayed', 'ongoing'], weights=(70, 20, 10))[0]
+                else:
+                    status = self.random.choices(['not_started', 'ongoing', 'completed'], weights=(40, 50, 10))[0]
+                delivered = deadline + timedelta(days=self.random.randint(-10, 10)) if status == 'completed' else None
+                tasks.append(Task(
+                    name=f"{zone.name} task {i + 1}",
+                    zone=zone,
+                    deadline=deadline,
+                    actual_delivery_date=min(delivered, self.today) if delivered else None,
+                    status=status,
+                ))
+        self.bulk_create(Task, tasks)
+
+    def coordination_requests(self, zones, per_zone):
+        requests = []
+        for zone in zones:
+            for _ in range(per_zone):
+                request_date = self.days_ago(0, 365)
+                requests.append(CoordinationRequest(
+                    zone=zone,
+                    request_date=request_date,
+                    target_department=self.random.choice(DEPARTMENTS),
+                    work_type=self.random.choice(WORK_TYPES),
+                    location=zone.name,
+                    work_details="Synthetic coordination request",
+                    expected_execution_date=request_date + timedelta(days=self.random.randint(3, 30)),
+                    responsible_person=self.random.choice(TECHNICIANS),
+                    phone_number=f"05{self.random.randint(0, 99999999):08d}",
+                ))
+        self.bulk_create(CoordinationRequest, requests)
+
+    def generate(self, contracts, zones, devices, tasks_per_zone=5, coordination_per_zone=3):
+        """Create ``contracts`` contracts of ``zones`` zones sharing ``devices`` devices; returns the counts created."""
+        from ..signals import devices_bulk_changed
+
+        # One transaction for the whole data set, far longer than the batches of the
+        # sync writers (sync.batches): generate into a database no sync client reads yet
+        with transaction.atomic():
+            categories = self.categories()
+            warehouse_ids = []
+            serial = 0
+            for number, count in enumerate(self.split(devices, contracts), start=1):
+                contract, warehouse, zone_objs = self.contract(number, zones)
+                self.devices(warehouse, zone_objs, categories, count, serial)
+                self.maintenance_cards(warehouse)
+                self.tasks(zone_objs, tasks_per_zone)
+                self.coordination_requests(zone_objs, coordination_per_zone)
+                warehouse_ids.append(warehouse.pk)
+                serial += count
+
+            # bulk_create skips the model signals: the new warehouses' devices are counted in
+            # one GROUP BY, and the search documents indexed here rather than from a million
+            # serial numbers
+            new_devices = counters.key_counts(Device.objects.filter(warehouse_id__in=warehouse_ids))
+            devices_bulk_changed.send(
+                sender=Device, warehouse_ids=warehouse_ids,
+                counter_deltas=counters.move_deltas((None, key, count) for key, count in new_devices.items()),
+            )
+            search.index_devices(Device.objects.filter(warehouse_id__in=warehouse_ids))
+        return self.created
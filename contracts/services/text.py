@@ -0,0 +1,54 @@
+import re
+from functools import lru_cache
+
+import arabic_reshaper
+from bidi.algorithm import get_display
+
+
+# Report values (zones, statuses, categories, technicians...) repeat a lot,
+# so shaped strings are memoized in a bounded LRU cache.
+SHAPE_CACHE_SIZE = 8192
+
+ARABIC_RE = re.compile("[\u0600-\u06FF]")
+
+
+def has_arabic(text):
+    return ARABIC_RE.search(text) is not None
+
+
+@lru_cache(maxsize=SHAPE_CACHE_SIZE)
+def _shape(text):
+    return get_display(arabic_reshaper.reshape(text))
+
+
+def shape(value):
+    """Return ``value`` as a string ready for reportlab (reshaped + bidi when Arabic)."""
+    text = value if isinstance(value, str) else str(value)
+    if not has_arabic(text):
+        return text
+    return _shape(text)
+
+
+def shape_row(values):
+    return [shape(value) for value in values]
+
+
+def shape_column(values):
+    """Shape a column of values, working on each distinct value only once."""
+    shaped = {}
+    result = []
+    for value in values:
+        if value not in shaped:
+            shaped[value] = shape(value)
+        result.append(shaped[value])
+    return result
+
+
+def shape_rows(rows):
+    """Shape a table column by column and return it as a list of rows."""
+    columns = [shape_column(column) for column in zip(*rows)]
+    return [list(row) for row in zip(*columns)]
+
+
+def cache_info():
+    return _shape.cache_info()
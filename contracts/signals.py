@@ -0,0 +1,207 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .models import (
+    Contract, ContractItem, CoordinationRequest, Device, DeviceCategory, MaintenanceCard, Task, Tombstone,
+    Warehouse, Zone,
+)
+from .services import counters, fragments, reference, search
+
+
+# QuerySet.update() and bulk_create() skip the model signals below, so code paths
+# that use them must send this with the ids of the warehouses they touched, the
+# ``counter_deltas`` of the devices they created or moved (counters.move_deltas),
+# plus the ``serial_numbers`` of the devices whenever searchable fields were written.
+devices_bulk_changed = Signal()
+
+
+@receiver(pre_save, sender=Device)
+def remember_device_counter_key(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._old_counter_key = None
+        return
+    instance._old_counter_key = (
+        Device.objects.filter(pk=instance.pk)
+        .values_list('warehouse_id', 'zone_id', 'device_category_id', 'status', 'current_location')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Device)
+def invalidate_device_fragments(sender, instance, raw=False, **kwargs):
+    # Connected before update_device_counters, which forgets the previous key
+    if raw:
+        return
+    old_key = getattr(instance, '_old_counter_key', None) or (None, None)
+    fragments.schedule_invalidate(
+        contracts=zone_contracts([old_key[1], instance.zone_id]),
+        warehouses=[old_key[0], instance.warehouse_id],
+    )
+
+
+@receiver(post_save, sender=Device)
+def update_device_counters(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    counters.move_device(getattr(instance, '_old_counter_key', None), counters.device_key(instance))
+    instance._old_counter_key = None
+
+
+@receiver(post_delete, sender=Device)
+def release_device_counter(sender, instance, **kwargs):
+    counters.apply_delta(counters.device_key(instance), -1)
+
+
+@receiver(pre_delete, sender=Zone)
+def remember_zone_warehouses(sender, instance, **kwargs):
+    # Zone deletion sets Device.zone to NULL with a bulk UPDATE, no Device signals fire
+    instance._counter_keys = counters.key_counts(Device.objects.filter(zone=instance))
+    instance._counter_warehouse_ids = list({key[0] for key in instance._counter_keys})
+
+
+@receiver(post_delete, sender=Zone)
+def move_zone_counters(sender, instance, **kwargs):
+    # The zone's own counter rows went with it (CASCADE), its devices now count without a zone
+    keys = getattr(instance, '_counter_keys', None) or {}
+    counters.apply_deltas(counters.move_deltas(
+        (key, (key[0], None, *key[2:]), count) for key, count in keys.items()
+    ))
+
+
+@receiver(devices_bulk_changed)
+def update_bulk_counters(sender, counter_deltas=None, **kwargs):
+    if counter_deltas:
+        counters.apply_deltas(counter_deltas)
+
+
+@receiver(post_save, sender=Device)
+def index_device(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.schedule_index(Device.objects.filter(pk=instance.pk))
+
+
+@receiver(devices_bulk_changed)
+def index_bulk_devices(sender, serial_numbers=None, **kwargs):
+    if serial_numbers:
+        search.schedule_index(Device.objects.filter(serial_number__in=list(serial_numbers)))
+
+
+# Template fragment versions (contracts.services.fragments), per contract and warehouse
+
+def zone_contracts(zone_ids):
+    zone_ids = [pk for pk in zone_ids if pk is not None]
+    if not zone_ids:
+        return []
+    return list(Zone.objects.filter(pk__in=zone_ids).values_list('contract_id', flat=True))
+
+
+@receiver(post_delete, sender=Device)
+def invalidate_deleted_device_fragments(sender, instance, **kwargs):
+    fragments.schedule_invalidate(contracts=zone_contracts([instance.zone_id]), warehouses=[instance.warehouse_id])
+
+
+@receiver(post_save, sender=MaintenanceCard)
+@receiver(post_delete, sender=MaintenanceCard)
+def invalidate_maintenance_fragments(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    device = Device.objects.filter(pk=instance.device_id).values_list('warehouse_id', 'zone__contract_id').first()
+    if device:
+        fragments.schedule_invalidate(contracts=[device[1]], warehouses=[device[0]])
+
+
+@receiver(pre_save, sender=Task)
+@receiver(pre_save, sender=CoordinationRequest)
+def remember_fragment_zone(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._old_zone_id = None
+    else:
+        instance._old_zone_id = sender.objects.filter(pk=instance.pk).values_list('zone_id', flat=True).first()
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(post_save, sender=CoordinationRequest)
+@receiver(post_delete, sender=CoordinationRequest)
+def invalidate_zone_record_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        zone_ids = [getattr(instance, '_old_zone_id', None), instance.zone_id]
+        fragments.schedule_invalidate(contracts=zone_contracts(zone_ids))
+
+
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+def invalidate_contract_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.schedule_invalidate(contracts=[instance.pk])
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def invalidate_warehouse_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.schedule_invalidate(contracts=[instance.contract_id], warehouses=[instance.pk])
+
+
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+@receiver(post_save, sender=ContractItem)
+@receiver(post_delete, sender=ContractItem)
+def invalidate_contract_part_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # A deleted zone moved its devices back to their warehouses (remember_zone_warehouses)
+        warehouse_ids = getattr(instance, '_counter_warehouse_ids', None) or []
+        fragments.schedule_invalidate(contracts=[instance.contract_id], warehouses=warehouse_ids)
+
+
+@receiver(devices_bulk_changed)
+def invalidate_bulk_fragments(sender, warehouse_ids=None, **kwargs):
+    warehouses = Warehouse.objects.all()
+    if warehouse_ids is not None:
+        warehouses = warehouses.filter(pk__in=list(warehouse_ids))
+    rows = list(warehouses.values_list('pk', 'contract_id'))
+    fragments.schedule_invalidate(contracts=[row[1] for row in rows], warehouses=[row[0] for row in rows])
+
+
+# Cached reference data (contracts.services.reference)
+
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+def evict_reference_contracts(sender, instance, **kwargs):
+    reference.evict(reference.CONTRACTS_KEY, reference.zones_key(instance.pk))
+
+
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+def evict_reference_zones(sender, instance, **kwargs):
+    reference.evict(reference.zones_key(instance.contract_id))
+
+
+@receiver(post_save, sender=DeviceCategory)
+@receiver(post_delete, sender=DeviceCategory)
+def evict_reference_categories(sender, instance, **kwargs):
+    reference.evict(reference.CATEGORIES_KEY)
+
+
+# Delta sync (contracts.services.sync). Receivers are connected per model: one
+# without a sender would stop Django from fast-deleting the counters and search rows.
+
+@receiver(post_delete, sender=Contract)
+@receiver(post_delete, sender=DeviceCategory)
+@receiver(post_delete, sender=ContractItem)
+@receiver(post_delete, sender=Warehouse)
+@receiver(post_delete, sender=Zone)
+@receiver(post_delete, sender=Device)
+@receiver(post_delete, sender=MaintenanceCard)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=CoordinationRequest)
+def record_tombstone(sender, instance, **kwargs):
+    # Cascaded rows are deleted one by one with their signals, so they get theirs too
+    Tombstone.objects.create(model=sender._meta.model_name, object_pk=str(instance.pk))
+
+
+@receiver(pre_delete, sender=Zone)
+def touch_zone_devices(sender, instance, **kwargs):
+    # The bulk UPDATE setting Device.zone to NULL leaves updated_at as it was
+    Device.objects.filter(zone=instance).update(updated_at=timezone.now())
@@ -0,0 +1,65 @@
+from django import template
+from django.conf import settings
+from django.template.base import token_kwargs
+
+from ..services import fragments
+
+
+register = template.Library()
+
+# Versions read so far in this render, shared by the fragments of a page
+KNOWN_VERSIONS = 'fragments.known_versions'
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, nodelist, name, scopes, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.scopes = scopes
+        self.vary_on = vary_on
+
+    def render(self, context):
+        scopes = [(scope, value.resolve(context)) for scope, value in self.scopes.items()]
+        scopes = [(scope, pk) for scope, pk in scopes if pk is not None] or [fragments.SITE_SCOPE]
+        known = context.render_context.setdefault(KNOWN_VERSIONS, {})
+        key = fragments.fragment_key(
+            self.name.resolve(context), scopes, [value.resolve(context) for value in self.vary_on], known,
+        )
+
+        cache = fragments.get_cache()
+        content = cache.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 600))
+        return content
+
+
+@register.tag('cachefragment')
+def do_cachefragment(parser, token):
+    """
+    Cache the enclosed template until one of its scopes changes::
+
+        {% cachefragment "contract_summaries" contract=contract.pk warehouse=warehouse.pk %}
+            ...
+        {% endcachefragment %}
+
+    Scopes are ``contract`` and ``warehouse`` (see contracts.services.fragments); a
+    fragment without any is invalidated by every change. Extra positional arguments
+    vary the key like those of ``{% cache %}``. Keep forms (CSRF tokens) and
+    per-user content out of cached fragments.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+    name = parser.compile_filter(bits[1])
+
+    remaining = bits[2:]
+    scopes = token_kwargs(remaining, parser)
+    unknown = set(scopes) - set(fragments.SCOPES)
+    if unknown:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' got unknown scopes: {', '.join(sorted(unknown))}.")
+    vary_on = [parser.compile_filter(bit) for bit in remaining]
+
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return CacheFragmentNode(nodelist, name, scopes, vary_on)
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+from .middleware import get_budget
+
+
+class BudgetTestRunner(DiscoverRunner):
+    """Fail any test whose request goes over its ``PERFORMANCE_BUDGETS`` entry."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._strict = getattr(settings, 'PERFORMANCE_BUDGETS_STRICT', False)
+        settings.PERFORMANCE_BUDGETS_STRICT = True
+
+    def teardown_test_environment(self, **kwargs):
+        settings.PERFORMANCE_BUDGETS_STRICT = self._strict
+        super().teardown_test_environment(**kwargs)
+
+
+class PerformanceAssertionsMixin:
+    """TestCase helpers reading the metrics PerformanceBudgetMiddleware leaves on responses."""
+
+    def assertWithinBudget(self, response, **limits):
+        """
+        Assert ``response`` stayed within ``limits`` (e.g. ``queries=5``), by default
+        within the settings budget of its view.
+        """
+        metrics = response.metrics
+        budget = limits or get_budget(metrics.url_name)
+        violations = metrics.violations(budget)
+        if violations:
+            self.fail(f"{metrics.url_name} over budget: {metrics.describe(violations)}")
+        return metrics
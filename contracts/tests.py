@@ -1,3 +1,1746 @@
-from django.test import TestCase
+import re
+import tempfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import arabic_reshaper
+import openpyxl
+from bidi.algorithm import get_display
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files import File
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.template import Template, TemplateSyntaxError
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import (
+    Contract, ContractItem, DeviceCategory, Warehouse, Zone, Device, DeviceCounter,
+    DeviceSearchDocument, MaintenanceCard, Task, CoordinationRequest, ExportJob, ImportSession, Tombstone
+)
+from .services import benchmark, fragments, keyset, pdf_assets, reference, sla, startup, sync, text
+from .services.counters import key_counts, move_deltas, warehouse_stats, zone_stats
+from .services.dashboard import DeviceStats, TaskStats, device_stats, dashboard_snapshot, task_stats
+from .services.devices import UNCHANGED, BulkUpdate, BulkUpdateError, filter_devices
+from .services.import_validation import ImportValidator
+from .services.maintenance import close_cards, create_cards, sync_device_status
+from .services.import_sessions import claim_import_session, run_import_session
+from .services.importer import DeviceImporter, read_xlsx_chunks
+from .services.jobs import run_export_job
+from .services.search import index_devices, rank_devices, search_devices
+from .services.synthetic import SyntheticData
+from .fields import LabelledModelChoiceField
+from .middleware import BudgetExceeded
+from .signals import devices_bulk_changed
+from .testing import PerformanceAssertionsMixin
+from .views import CoordinationListView, MaintenanceListView, TaskListView, WarehouseDetailView
+
+
+def make_contract(number="C-1", zones=2):
+    contract = Contract.objects.create(contract_number=number, name=f"Contract {number}", start_date=date.today())
+    warehouse = Warehouse.objects.create(name=f"Warehouse {number}", location="Site", contract=contract)
+    zone_objs = [Zone.objects.create(name=f"Zone {number}-{i}", contract=contract) for i in range(zones)]
+    return contract, warehouse, zone_objs
+
+
+def make_devices(warehouse, zones, count, category=None, prefix="D"):
+    category = category or DeviceCategory.objects.get_or_create(name="Camera")[0]
+    statuses = ['installed', 'available', 'damaged']
+    devices = []
+    for i in range(count):
+        zone = zones[i % len(zones)] if zones and i % 3 else None
+        devices.append(Device.objects.create(
+            serial_number=f"{prefix}-{warehouse.pk}-{i}",
+            name=f"Device {i}",
+            invoice_number=f"INV-{i}",
+            device_category=category,
+            warehouse=warehouse,
+            zone=zone,
+            status=statuses[i % 3],
+            responsible_person="Tech",
+        ))
+    return devices
+
+
+class LoggedInTestCase(TestCase):
+    def setUp(self):
+        # Cached fragments and reference data would outlive the rolled back rows of earlier tests
+        fragments.get_cache().clear()
+        reference.get_cache().clear()
+        self.user = User.objects.create_user(username="tester", password="secret")
+        self.client.force_login(self.user)
+
+
+class DashboardStatsTests(LoggedInTestCase):
+    def populate(self, number, devices):
+        contract, warehouse, zones = make_contract(number)
+        created = make_devices(warehouse, zones, devices, prefix=number)
+        for i, zone in enumerate(zones):
+            Task.objects.create(name=f"Task {i}", zone=zone, status='delayed' if i else 'completed')
+            CoordinationRequest.objects.create(
+                zone=zone, request_date=date.today() - timedelta(days=i), target_department="Dept",
+                work_type="Work", location="Loc", work_details="Details", responsible_person="P", phone_number="1",
+            )
+        MaintenanceCard.objects.create(device=created[0], issue_type="Broken", technician="T")
+        MaintenanceCard.objects.create(device=created[1], issue_type="Broken", technician="T", repair_date=date.today())
+
+    def test_snapshot_values(self):
+        self.populate("C-1", 9)
+        stats = dashboard_snapshot()
+
+        self.assertEqual(stats.total_contracts, 1)
+        self.assertEqual(stats.total_zones, 2)
+        self.assertEqual(stats.devices.total, 9)
+        self.assertEqual(stats.devices.in_warehouse, Device.objects.filter(current_location='warehouse').count())
+        self.assertEqual(stats.devices.damaged, Device.objects.filter(status='damaged').count())
+        self.assertEqual((stats.tasks.total, stats.tasks.completed, stats.tasks.delayed), (2, 1, 1))
+        self.assertEqual((stats.maintenance.total, stats.maintenance.repaired, stats.maintenance.pending), (2, 1, 1))
+        self.assertEqual(stats.coordination.total, 2)
+        self.assertEqual(stats.coordination.last_date, date.today())
+
+    def test_empty_snapshot(self):
+        stats = dashboard_snapshot()
+        self.assertEqual(stats.devices.total, 0)
+        self.assertIsNone(stats.coordination.last_date)
+
+    def test_query_count_is_constant(self):
+        self.populate("C-1", 3)
+        with self.assertNumQueries(6):
+            dashboard_snapshot()
+
+        for n in range(2, 5):
+            self.populate(f"C-{n}", 30)
+        with self.assertNumQueries(6):
+            dashboard_snapshot()
+
+    def test_dashboard_view(self):
+        self.populate("C-1", 6)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['stats'].devices.total, 6)
+
+
+class DeviceCounterTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        self.devices = make_devices(self.warehouse, self.zones, 9)
+
+    def assertCountersMatch(self):
+        live = device_stats(Device.objects.filter(warehouse=self.warehouse))
+        self.assertEqual(warehouse_stats([self.warehouse.pk]).get(self.warehouse.pk, DeviceStats()), live)
+        for zone in self.zones:
+            live = device_stats(Device.objects.filter(zone=zone))
+            self.assertEqual(zone_stats([zone.pk]).get(zone.pk, DeviceStats()), live)
+
+    def test_create_update_delete_keep_counters_in_sync(self):
+        self.assertCountersMatch()
+
+        device = self.devices[0]
+        device.zone = self.zones[1]
+        device.status = 'installed'
+        device.save()
+        self.assertCountersMatch()
+
+        device.zone = None
+        device.save()
+        self.assertCountersMatch()
+
+        self.devices[1].delete()
+        Device.objects.filter(pk=self.devices[2].pk).delete()
+        self.assertCountersMatch()
+
+    def test_maintenance_card_updates_counters(self):
+        MaintenanceCard.objects.create(device=self.devices[0], issue_type="Broken", technician="T")
+        self.assertCountersMatch()
+
+    def test_zone_delete_moves_counters(self):
+        self.zones[1].delete()
+        self.zones = self.zones[:1]
+        self.assertCountersMatch()
+
+    def test_bulk_update_with_signal(self):
+        devices = Device.objects.filter(warehouse=self.warehouse)
+        moves = [(key, (*key[:3], 'damaged', key[4]), count) for key, count in key_counts(devices).items()]
+        devices.update(status='damaged')
+        devices_bulk_changed.send(sender=Device, warehouse_ids=[self.warehouse.pk], counter_deltas=move_deltas(moves))
+        self.assertEqual(self.warehouse.count_damaged, 9)
+        self.assertCountersMatch()
+
+    def test_bulk_update_does_not_rebuild_the_warehouse(self):
+        with mock.patch('contracts.services.counters.rebuild_counters') as rebuild:
+            BulkUpdate(status='damaged').apply(devices=Device.objects.filter(zone=self.zones[0]))
+        rebuild.assert_not_called()
+        self.assertCountersMatch()
+
+    def test_rebuild_command(self):
+        DeviceCounter.objects.all().delete()
+        call_command('rebuild_device_counters', stdout=StringIO())
+        self.assertCountersMatch()
+
+    def test_warehouse_properties_read_counters(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.warehouse.count_devices, 9)
+            self.assertEqual(self.warehouse.count_installed, 3)
+            self.assertEqual(self.warehouse.count_in_warehouse, 3)
+
+    def test_warehouse_list_query_count(self):
+        for n in range(2, 6):
+            _, warehouse, zones = make_contract(f"C-{n}")
+            make_devices(warehouse, zones, 3, prefix=f"C-{n}")
+
+        # session, user, warehouses, counters
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('warehouse_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Warehouse C-5")
+
+
+class BulkDeviceUpdateTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        self.devices = make_devices(self.warehouse, self.zones, 9)
+        self.url = reverse('bulk_update_devices')
+
+    def post(self, payload):
+        return self.client.post(self.url, payload, content_type='application/json')
+
+    def assertLocationsConsistent(self):
+        for device in Device.objects.all():
+            self.assertEqual(device.current_location, 'zone' if device.zone_id else 'warehouse')
+
+    def test_move_to_zone_is_one_update(self):
+        ids = [device.pk for device in self.devices]
+        operation = BulkUpdate(status='installed', zone=self.zones[0], transfer_date=date(2024, 5, 1))
+        with CaptureQueriesContext(connection) as queries:
+            operation.apply(device_ids=ids)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "contracts_device"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(len(operation.updated), 9)
+        self.assertEqual(Device.objects.filter(zone=self.zones[0], status='installed', transfer_date=date(2024, 5, 1)).count(), 9)
+        self.assertLocationsConsistent()
+        self.assertEqual(zone_stats([self.zones[0].pk])[self.zones[0].pk].installed, 9)
+
+    def test_available_leaves_the_zone(self):
+        BulkUpdate(status='available').apply(devices=Device.objects.filter(zone__isnull=False))
+        self.assertFalse(Device.objects.filter(zone__isnull=False).exists())
+        self.assertLocationsConsistent()
+        self.assertEqual(self.warehouse.count_in_warehouse, 9)
+
+    def test_unchanged_zone_keeps_location(self):
+        BulkUpdate(status='damaged').apply(devices=Device.objects.all())
+        self.assertEqual(Device.objects.filter(status='damaged').count(), 9)
+        self.assertLocationsConsistent()
+
+    def test_per_device_errors(self):
+        other, _, other_zones = make_contract("C-2")
+        in_warehouse = self.devices[0]
+        results = BulkUpdate(status='installed').apply(device_ids=[in_warehouse.pk, self.devices[1].pk, 999999])
+        self.assertEqual([r.updated for r in results], [False, True, False])
+        self.assertEqual(results[0].error, "Installed devices need a zone.")
+        self.assertEqual(results[2].error, "Device not found.")
+
+        results = BulkUpdate(zone=other_zones[0]).apply(device_ids=[self.devices[1].pk])
+        self.assertEqual(results[0].error, "The zone belongs to another contract.")
+        self.assertEqual(Device.objects.get(pk=self.devices[1].pk).zone, self.devices[1].zone)
+
+    def test_invalid_operations(self):
+        with self.assertRaises(BulkUpdateError):
+            BulkUpdate()
+        with self.assertRaises(BulkUpdateError):
+            BulkUpdate(status='lost')
+        with self.assertRaises(BulkUpdateError):
+            BulkUpdate(zone=999999)
+        with self.assertRaises(BulkUpdateError):
+            BulkUpdate(status='available', zone=self.zones[0])
+        self.assertIs(BulkUpdate(status='damaged').zone, UNCHANGED)
+
+    def test_endpoint_with_filter(self):
+        response = self.post({
+            'filter': {'warehouse': self.warehouse.pk, 'status': 'available'},
+            'zone': self.zones[1].pk,
+            'transfer_date': '2024-06-01',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['updated'], data['failed']), (3, 0))
+        moved = Device.objects.filter(pk__in=[r['id'] for r in data['results']])
+        self.assertEqual(set(moved.values_list('zone', flat=True)), {self.zones[1].pk})
+        self.assertLocationsConsistent()
+
+    def test_endpoint_with_ids_and_errors(self):
+        response = self.post({'devices': [self.devices[1].pk, self.devices[0].pk], 'status': 'installed', 'zone': None})
+        self.assertEqual([r['error'] for r in response.json()['results']], ["Installed devices need a zone."] * 2)
+
+        response = self.post({'devices': [self.devices[1].pk], 'zone': None})
+        self.assertEqual(response.json()['results'][0]['updated'], True)
+        self.assertEqual(Device.objects.get(pk=self.devices[1].pk).current_location, 'warehouse')
+
+        self.assertEqual(self.post({'devices': [1], 'status': 'lost'}).status_code, 400)
+        self.assertEqual(self.post({'status': 'damaged'}).status_code, 400)
+        self.assertEqual(self.post({'devices': [1], 'transfer_date': 'soon'}).status_code, 400)
+        for devices in (str(self.devices[1].pk), self.devices[1].pk, {'pk': 1}, ["12"], [True], None):
+            response = self.post({'devices': devices, 'status': 'damaged'})
+            self.assertEqual(response.status_code, 400, devices)
+            self.assertEqual(response.json()['error'], "devices must be a list of device ids.")
+        self.assertEqual(self.client.post(self.url, "[]", content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+class MaintenanceStatusTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        self.devices = make_devices(self.warehouse, self.zones, 9)
+
+    def statuses(self):
+        return dict(Device.objects.values_list('pk', 'status'))
+
+    def test_single_card_writes_only_the_status(self):
+        device = self.devices[1]
+        with CaptureQueriesContext(connection) as queries:
+            card = MaintenanceCard.objects.create(device=device, issue_type="Broken", technician="T")
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "contracts_device"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"serial_number"', updates[0])
+        self.assertEqual(Device.objects.get(pk=device.pk).status, 'damaged')
+
+        second = MaintenanceCard.objects.create(device=device, issue_type="Again", technician="T")
+        card.repair_date = date.today()
+        card.save()
+        self.assertEqual(Device.objects.get(pk=device.pk).status, 'damaged')
+
+        second.repair_date = date.today()
+        second.save()
+        self.assertEqual(Device.objects.get(pk=device.pk).status, 'installed')
+        self.assertEqual(self.warehouse.count_damaged, 3)
+
+    def test_repaired_device_without_zone_is_available(self):
+        device = self.devices[0]
+        card = MaintenanceCard.objects.create(device=device, issue_type="Broken", technician="T")
+        card.repair_date = date.today()
+        card.save()
+        self.assertEqual(Device.objects.get(pk=device.pk).status, 'available')
+
+    def test_create_and_close_cards_in_bulk(self):
+        cards = [MaintenanceCard(device=device, issue_type="Storm", technician="T") for device in self.devices]
+        with CaptureQueriesContext(connection) as queries:
+            create_cards(cards)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "contracts_device"')]
+        self.assertLessEqual(len(updates), 2)
+        self.assertEqual(set(self.statuses().values()), {'damaged'})
+        self.assertEqual(self.warehouse.count_damaged, 9)
+
+        self.assertEqual(close_cards(MaintenanceCard.objects.all(), date.today()), 9)
+        statuses = self.statuses()
+        for device in self.devices:
+            self.assertEqual(statuses[device.pk], 'installed' if device.zone_id else 'available')
+        self.assertEqual(Warehouse.objects.get(pk=self.warehouse.pk).count_damaged, 0)
+
+    def test_sync_fixes_inconsistent_statuses(self):
+        MaintenanceCard.objects.bulk_create([
+            MaintenanceCard(device=self.devices[1], issue_type="Open", technician="T"),
+            MaintenanceCard(device=self.devices[2], issue_type="Done", technician="T", repair_date=date.today()),
+        ])
+        untouched = self.devices[5]
+        self.assertEqual(sync_device_status(), 2)
+        statuses = self.statuses()
+        self.assertEqual(statuses[self.devices[1].pk], 'damaged')
+        self.assertEqual(statuses[self.devices[2].pk], 'installed')
+        # Damaged without any card: nothing says it was repaired
+        self.assertEqual(statuses[untouched.pk], 'damaged')
+        self.assertEqual(sync_device_status(), 0)
+
+        out = StringIO()
+        call_command('sync_device_status', warehouse=[self.warehouse.pk], stdout=out)
+        self.assertIn("Updated the status of 0 devices.", out.getvalue())
+
+
+class ContractDetailTests(LoggedInTestCase):
+    def populate(self, zones, categories, number="C-1"):
+        contract, warehouse, zone_objs = make_contract(number, zones=zones)
+        for i in range(categories):
+            category = DeviceCategory.objects.get_or_create(name=f"Category {i}")[0]
+            ContractItem.objects.create(contract=contract, category=category, quantity=4)
+            make_devices(warehouse, zone_objs, 6, category=category, prefix=f"{number}-K{i}")
+        for i, zone in enumerate(zone_objs):
+            Task.objects.create(name=f"Task {i}", zone=zone, status='ongoing')
+            CoordinationRequest.objects.create(
+                zone=zone, request_date=date(2025, 1, i + 1), target_department="Dept",
+                work_type="Work", location="Loc", work_details="Details", responsible_person="P", phone_number="1",
+            )
+        for device in Device.objects.filter(zone__contract=contract)[:3]:
+            MaintenanceCard.objects.create(device=device, issue_type="Broken", technician="T")
+        return contract
+
+    def get(self, contract):
+        response = self.client.get(reverse('contract_detail', args=[contract.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_statistics(self):
+        contract = self.populate(zones=2, categories=2)
+        context = self.get(contract).context
+
+        # make_devices puts 4 of every 6 devices in a zone
+        self.assertEqual(
+            [(stat['category_label'], stat['available'], stat['percentage']) for stat in context['category_stats']],
+            [("Category 0", 4, 100.0), ("Category 1", 4, 100.0)],
+        )
+        for stat in context['zone_stats']:
+            devices = Device.objects.filter(zone=stat['zone'])
+            self.assertEqual(stat['total'], devices.count())
+            self.assertEqual(stat['damaged'], devices.filter(status='damaged').count())
+        self.assertEqual((context['task_summary'].total, context['task_summary'].ongoing), (2, 2))
+        self.assertEqual(context['maintenance_summary'].pending, 3)
+        self.assertEqual(context['coordination_summary'].last_date, date(2025, 1, 2))
+
+    def test_query_count_is_constant(self):
+        small = self.populate(zones=2, categories=1)
+        # session, user, contract + warehouse, items, zones, category totals, zone stats,
+        # warehouse counters, task / maintenance / coordination stats, maintenance cards,
+        # coordination requests
+        with self.assertNumQueries(13):
+            self.get(small)
+
+        large = self.populate(zones=12, categories=6, number="C-2")
+        with self.assertNumQueries(13):
+            self.get(large)
+
+
+class PerformanceBudgetTests(PerformanceAssertionsMixin, LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+
+    def test_metrics(self):
+        make_devices(self.warehouse, self.zones, 3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('warehouse_detail', args=[self.warehouse.pk]))
+
+        metrics = response.metrics
+        self.assertEqual(metrics.url_name, 'warehouse_detail')
+        self.assertEqual(metrics.queries, len(queries))
+        self.assertEqual(metrics.response_bytes, len(response.content))
+        self.assertGreater(metrics.db_ms, 0)
+        self.assertGreater(metrics.template_ms, 0)
+        self.assertGreaterEqual(metrics.total_ms, metrics.template_ms)
+
+    def test_pages_within_budget(self):
+        device = make_devices(self.warehouse, self.zones, 3)[0]
+        MaintenanceCard.objects.create(device=device, issue_type="Broken", technician="T")
+        Task.objects.create(name="Task", zone=self.zones[0])
+        pages = [
+            ('dashboard', []), ('contract_list', []), ('warehouse_list', []), ('maintenance_list', []),
+            ('task_list', []), ('coordination_list', []), ('contract_detail', [self.contract.pk]),
+            ('warehouse_detail', [self.warehouse.pk]), ('device_detail', [device.pk]),
+        ]
+        for name, args in pages:
+            with self.subTest(name):
+                response = self.client.get(reverse(name, args=args))
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinBudget(response)
+
+    def test_warehouse_detail_queries_do_not_grow_with_devices(self):
+        url = reverse('warehouse_detail', args=[self.warehouse.pk])
+        for device in make_devices(self.warehouse, self.zones, 2):
+            MaintenanceCard.objects.create(device=device, issue_type="Broken", technician="T")
+        small = self.client.get(url).metrics.queries
+
+        for device in make_devices(self.warehouse, self.zones, 20, prefix="L"):
+            MaintenanceCard.objects.create(device=device, issue_type="Broken", technician="T")
+        response = self.client.get(url)
+        self.assertWithinBudget(response, queries=small)
+        self.assertContains(response, "<td>1</td>")
+
+    @override_settings(PERFORMANCE_BUDGETS={'default': {'queries': 1}}, PERFORMANCE_BUDGETS_STRICT=False)
+    def test_breach_is_logged(self):
+        with self.assertLogs('contracts.middleware', 'WARNING') as logs:
+            response = self.client.get(reverse('contract_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("contract_list over budget: queries", logs.output[0])
+
+    @override_settings(PERFORMANCE_BUDGETS={'contract_list': {'queries': 1}}, PERFORMANCE_BUDGETS_STRICT=True)
+    def test_breach_fails_in_strict_mode(self):
+        with self.assertRaisesMessage(BudgetExceeded, "contract_list over budget: queries"):
+            self.client.get(reverse('contract_list'))
+        # Views without their own entry fall back to "default", here unset
+        self.assertEqual(self.client.get(reverse('warehouse_list')).status_code, 200)
+
+
+class TaskSlaTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        self.today = sla.today()
+        zone = self.zones[0]
+        self.tasks = {
+            'upcoming': Task.objects.create(name="Upcoming", zone=zone, status='ongoing', deadline=self.today + timedelta(days=5)),
+            'due': Task.objects.create(name="Due", zone=zone, status='not_started', deadline=self.today),
+            'overdue': Task.objects.create(name="Overdue", zone=zone, status='ongoing', deadline=self.today - timedelta(days=10)),
+            'stale': Task.objects.create(name="Stale", zone=zone, status='not_started', deadline=self.today - timedelta(days=40)),
+            'late_delivery': Task.objects.create(
+                name="Late delivery", zone=zone, status='completed', deadline=self.today - timedelta(days=20),
+                actual_delivery_date=self.today - timedelta(days=12),
+            ),
+            'on_time': Task.objects.create(
+                name="On time", zone=zone, status='completed', deadline=self.today - timedelta(days=3),
+                actual_delivery_date=self.today - timedelta(days=5),
+            ),
+        }
+
+    def test_annotations_match_the_properties(self):
+        for task in sla.annotate(Task.objects.all()):
+            self.assertEqual(task.sla_remaining_days, task.remaining_days, task.name)
+            self.assertEqual(task.sla_delay_days, task.delay_days, task.name)
+            self.assertEqual(task.sla_late_days, max(-task.remaining_days, 0), task.name)
+        statuses = dict(sla.annotate(Task.objects.all()).values_list('name', 'sla_status'))
+        self.assertEqual(statuses["Overdue"], 'delayed')
+        self.assertEqual(statuses["Stale"], 'delayed')
+        self.assertEqual(statuses["Due"], 'not_started')
+
+    def test_overdue_tasks_count_as_delayed(self):
+        stats = task_stats()
+        self.assertEqual((stats.total, stats.delayed, stats.ongoing, stats.not_started, stats.completed), (6, 2, 1, 1, 2))
+
+    def test_mark_delayed_is_one_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sla.mark_delayed(), 2)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "contracts_task"')]), 1)
+        self.assertEqual(set(Task.objects.filter(status='delayed').values_list('name', flat=True)), {"Overdue", "Stale"})
+        self.assertEqual(task_stats(), TaskStats(total=6, completed=2, not_started=1, ongoing=1, delayed=2))
+
+        out = StringIO()
+        call_command('mark_delayed_tasks', date=str(self.today + timedelta(days=6)), stdout=out)
+        self.assertIn("Marked 2 tasks as delayed.", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('mark_delayed_tasks', date="tomorrow")
+
+    def names(self, response):
+        return [task.name for task in response.context['tasks']]
+
+    def test_list_filters_and_sorts_by_lateness(self):
+        url = reverse('task_list')
+        response = self.client.get(url, {'contract': self.contract.pk, 'late': 1, 'sort': 'late'})
+        self.assertEqual(self.names(response), ["Stale", "Overdue", "Late delivery"])
+        self.assertContains(response, "40 days late")
+
+        response = self.client.get(url, {'contract': self.contract.pk, 'late': 1, 'sort': 'late', 'open': 1})
+        self.assertEqual(self.names(response), ["Stale", "Overdue"])
+        self.assertContains(response, "Open only")
+
+        response = self.client.get(url, {'contract': self.contract.pk, 'late': 1})
+        self.assertEqual(self.names(response), ["Stale", "Late delivery", "Overdue"])
+
+        response = self.client.get(url, {'contract': self.contract.pk, 'late': 10})
+        self.assertEqual(self.names(response), ["Stale", "Overdue"])
+
+        response = self.client.get(url, {'contract': self.contract.pk, 'status': 'delayed'})
+        self.assertEqual(self.names(response), ["Stale", "Overdue"])
+
+        response = self.client.get(url, {'contract': self.contract.pk, 'late': "x"})
+        self.assertEqual(len(self.names(response)), 6)
+
+    def test_lateness_pages(self):
+        for i in range(12):
+            Task.objects.create(name=f"Late {i}", zone=self.zones[1], status='ongoing', deadline=self.today - timedelta(days=i % 4))
+        url = reverse('task_list')
+        for params, tasks in (
+            ({'sort': 'late'}, Task.objects.all()),
+            ({'sort': 'late', 'open': 1}, Task.objects.filter(actual_delivery_date__isnull=True)),
+        ):
+            expected = [task.name for task in sorted(sla.annotate(tasks), key=lambda task: (-task.sla_late_days, task.deadline, task.pk))]
+            names, params = [], {'contract': self.contract.pk, **params}
+            while True:
+                response = self.client.get(url, params)
+                names.extend(self.names(response))
+                page = response.context['page_obj']
+                if not page.has_next:
+                    break
+                params = QueryDict(page.next_query)
+            self.assertEqual(names, expected)
+
+
+class ChoiceRenderingTests(PerformanceAssertionsMixin, LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract(zones=3)
+        self.device = make_devices(self.warehouse, self.zones, 1)[0]
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_form_pages_run_constant_queries(self):
+        urls = [
+            reverse('task_add'), reverse('coordination_add'), reverse('device_add', args=[self.warehouse.pk]),
+            reverse('contract_edit', args=[self.contract.pk]),
+        ]
+        ContractItem.objects.create(contract=self.contract, category=self.device.device_category, quantity=1)
+        before = [self.queries(url)[1] for url in urls]
+        for n in range(2, 6):
+            contract, _, _ = make_contract(f"C-{n}", zones=10)
+        Zone.objects.bulk_create([Zone(name=f"Extra {i}", contract=self.contract) for i in range(20)])
+        for i in range(20):
+            category = DeviceCategory.objects.create(name=f"Category {i}")
+            if i < 8:
+                ContractItem.objects.create(contract=self.contract, category=category, quantity=2)
+        self.assertEqual([self.queries(url)[1] for url in urls], before)
+
+    def test_zone_choices_come_from_ajax(self):
+        task = Task.objects.create(name="Survey", zone=self.zones[1], status='ongoing')
+        response, _ = self.queries(reverse('task_edit', args=[task.pk]))
+        self.assertContains(response, f'<option value="{self.zones[1].pk}" selected>{self.zones[1]}</option>', html=True)
+        self.assertNotContains(response, self.zones[2].name)
+        self.assertContains(response, "django_select2/django_select2.js")
+
+        field_id = re.search(r'data-field_id="([^"]+)"', response.content.decode()).group(1)
+        url = reverse('select2_choices')
+        response = self.client.get(url, {'field_id': field_id, 'term': "C-1-2"})
+        self.assertEqual(response.json()['results'], [{'id': self.zones[2].pk, 'text': str(self.zones[2])}])
+
+        self.client.logout()
+        self.assertEqual(self.client.get(url, {'field_id': field_id}).status_code, 302)
+
+    def test_zone_choices_outlive_the_default_cache(self):
+        response, _ = self.queries(reverse('task_add'))
+        field_id = re.search(r'data-field_id="([^"]+)"', response.content.decode()).group(1)
+        caches['default'].clear()
+        response = self.client.get(reverse('select2_choices'), {'field_id': field_id, 'term': "C-1-0"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{'id': self.zones[0].pk, 'text': str(self.zones[0])}])
+
+    def test_labelled_field(self):
+        field = LabelledModelChoiceField(Zone.objects.order_by('pk'), label_fields=('contract__name', 'name'), label_format="{} / {}")
+        with self.assertNumQueries(1):
+            choices = [choice for choice in field.choices]
+        self.assertEqual([label for _, label in choices[1:]], [f"Contract C-1 / {zone.name}" for zone in self.zones])
+        self.assertEqual(field.clean(str(self.zones[0].pk)), self.zones[0])
+
+    def test_task_form_saves_the_zone(self):
+        response = self.client.post(reverse('task_add'), {
+            'name': "Cabling", 'zone': self.zones[0].pk, 'deadline': "2030-01-01", 'status': 'not_started',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Task.objects.get(name="Cabling").zone, self.zones[0])
+
+
+class ApiTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract(zones=2)
+        self.devices = make_devices(self.warehouse, self.zones, 6)
+
+    def test_sparse_fields_and_cursor_pages(self):
+        url = reverse('api_devices')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'warehouse': self.warehouse.pk, 'fields': 'serial_number,status', 'limit': 4})
+        data = response.json()
+        self.assertEqual(data['results'][0], {'serial_number': self.devices[0].serial_number, 'status': 'installed'})
+        self.assertEqual(len(data['results']), 4)
+        self.assertIsNone(data['previous'])
+        rows = next(q['sql'] for q in queries if 'contracts_device' in q['sql'])
+        self.assertNotIn('"name"', rows)
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([row['serial_number'] for row in data['results']], [d.serial_number for d in self.devices[4:]])
+        self.assertIsNone(data['next'])
+
+        response = self.client.get(url, {'fields': 'serial_number,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+        self.assertEqual(self.client.get(url, {'cursor': 'nope'}).status_code, 400)
+
+    def test_filters_match_the_lists(self):
+        other, _, other_zones = make_contract("C-0", zones=1)
+        Task.objects.create(name="Late", zone=self.zones[0], status='ongoing', deadline=date.today() - timedelta(days=5))
+        Task.objects.create(name="Due", zone=self.zones[1], status='ongoing', deadline=date.today() + timedelta(days=5))
+        Task.objects.create(name="Other", zone=other_zones[0], status='ongoing', deadline=date.today())
+
+        for params in ({}, {'late': 1}, {'status': 'delayed'}, {'contract': other.pk}, {'sort': 'late'}):
+            data = self.client.get(reverse('api_tasks'), {**params, 'fields': 'name,sla_status'}).json()
+            html = self.client.get(reverse('task_list'), params).context['tasks']
+            self.assertEqual([row['name'] for row in data['results']], [task.name for task in html])
+        data = self.client.get(reverse('api_tasks'), {'late': 1, 'fields': 'name,sla_status,sla_late_days'}).json()
+        self.assertEqual(data['results'], [{'name': "Late", 'sla_status': 'delayed', 'sla_late_days': 5}])
+
+        data = self.client.get(reverse('api_devices'), {'zone': 'warehouse', 'status': 'installed', 'fields': 'id'}).json()
+        self.assertEqual(data['results'], [{'id': self.devices[0].pk}, {'id': self.devices[3].pk}])
+        data = self.client.get(reverse('api_zones'), {'contract': other.pk, 'fields': 'name'}).json()
+        self.assertEqual(data['results'], [{'name': other_zones[0].name}])
+
+    def later(self, seconds):
+        return mock.patch('django.utils.timezone.now', return_value=self.start + timedelta(seconds=seconds))
+
+    def test_unchanged_poll_is_not_modified(self):
+        url = reverse('api_maintenance')
+        # Changes that may still be committing: no validators yet
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+        self.start = timezone.now()
+        with self.later(60):
+            response = self.client.get(url)
+            etag, last_modified = response['ETag'], response['Last-Modified']
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            rows = [q['sql'] for q in queries if 'contracts_' in q['sql']]
+            self.assertTrue(rows)
+            self.assertTrue(all('MAX(' in sql for sql in rows), rows)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+            self.assertEqual(self.client.get(url, {'zone': 'warehouse'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+            card = MaintenanceCard.objects.create(
+                device=self.devices[1], report_date=date.today(), issue_type="Broken", technician="Tech",
+            )
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('ETag'))
+
+        with self.later(120):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), 1)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+            etag = response['ETag']
+            card.delete()
+            # deleted_at defaults to the real timezone.now, not the patched one
+            Tombstone.objects.update(deleted_at=self.start + timedelta(seconds=120))
+
+        with self.later(180):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncFeedTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract(zones=2)
+        self.devices = make_devices(self.warehouse, self.zones, 3)
+
+    def poll(self, cursor=None, **params):
+        response = self.client.get(reverse('sync'), {'since': cursor, **params} if cursor else params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def changed(self, data):
+        return {name: [row['pk'] for row in rows] for name, rows in data['changes'].items() if rows}
+
+    def test_only_changes_since_the_cursor(self):
+        data = self.poll()
+        self.assertEqual(len(data['changes']['device']), 3)
+        self.assertEqual(data['changes']['contract'][0]['name'], self.contract.name)
+        self.assertFalse(data['more'])
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.poll(data['cursor'])
+        self.assertEqual(self.changed(data), {})
+        self.assertEqual(data['deleted'], [])
+        self.assertLessEqual(len(queries), len(sync.SYNC_MODELS) + 3)
+
+        device = self.devices[0]
+        device.notes = "Moved"
+        device.save()
+        BulkUpdate(status='damaged').apply(device_ids=[self.devices[1].pk])
+        task = Task.objects.create(name="Overdue", zone=self.zones[0], status='ongoing', deadline=date.today() - timedelta(days=1))
+        data = self.poll(data['cursor'])
+        self.assertEqual(self.changed(data), {'device': [device.pk, self.devices[1].pk], 'task': [task.pk]})
+
+        sla.mark_delayed()
+        data = self.poll(data['cursor'])
+        self.assertEqual(self.changed(data), {'task': [task.pk]})
+        self.assertEqual(data['changes']['task'][0]['status'], 'delayed')
+
+    def test_pages_follow_the_limit(self):
+        cursor, seen, more = None, [], True
+        while more:
+            data = self.poll(cursor, limit=2)
+            seen.extend(row['pk'] for row in data['changes']['device'])
+            cursor, more = data['cursor'], data['more']
+        self.assertEqual(seen, [device.pk for device in self.devices])
+
+    def test_contract_delete_leaves_tombstones(self):
+        Device.objects.all().delete()
+        item = ContractItem.objects.create(contract=self.contract, category=DeviceCategory.objects.get(), quantity=1)
+        task = Task.objects.create(name="Survey", zone=self.zones[0], status='ongoing')
+        request = CoordinationRequest.objects.create(
+            zone=self.zones[1], target_department="Roads", work_type="Digging", location="North",
+            work_details="Trench", responsible_person="Ali", phone_number="1",
+        )
+        cursor = self.poll()['cursor']
+
+        contract_number = self.contract.pk
+        self.contract.delete()
+        deleted = {(row['model'], row['pk']) for row in self.poll(cursor)['deleted']}
+        self.assertEqual(deleted, {
+            ('contract', contract_number), ('warehouse', str(self.warehouse.pk)), ('contractitem', str(item.pk)),
+            ('task', str(task.pk)), ('coordinationrequest', str(request.pk)),
+            *(('zone', str(zone.pk)) for zone in self.zones),
+        })
+
+    def test_zone_delete_reports_its_devices(self):
+        cursor = self.poll()['cursor']
+        self.zones[1].delete()
+        data = self.poll(cursor)
+        self.assertEqual(self.changed(data), {'device': [self.devices[1].pk]})
+        self.assertIsNone(data['changes']['device'][0]['zone_id'])
+        self.assertEqual(data['deleted'][0]['model'], 'zone')
+        self.assertEqual(Tombstone.objects.count(), 1)
+
+    @override_settings(SYNC_SETTLE_SECONDS=60)
+    def test_recent_changes_wait_for_the_settle_delay(self):
+        self.assertFalse(any(sync.changes().changes.values()))
+        later = sync.changes(now=timezone.now() + timedelta(minutes=2))
+        self.assertEqual(len(later.changes['device']), 3)
+
+    @override_settings(SYNC_BATCH_SIZE=2)
+    def test_bulk_writers_commit_in_batches(self):
+        make_devices(self.warehouse, self.zones, 4, prefix="B")
+        devices = Device.objects.filter(warehouse=self.warehouse)
+        self.assertEqual([batch.count() for batch in sync.batches(devices)], [2, 2, 2, 1])
+
+        with CaptureQueriesContext(connection) as queries:
+            results = BulkUpdate(status='damaged').apply(devices=devices)
+        self.assertEqual(len(results), 7)
+        self.assertEqual(devices.filter(status='damaged').count(), 7)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "contracts_device"')]), 4)
+        self.assertEqual(self.warehouse.count_damaged, 7)
+
+        # Batches whose rows leave the queryset once written still reach the end
+        cards = MaintenanceCard.objects.bulk_create(
+            MaintenanceCard(device=device, issue_type="Storm", technician="T") for device in devices
+        )
+        self.assertEqual(close_cards(MaintenanceCard.objects.all(), date.today(), batch_size=3), len(cards))
+        self.assertFalse(MaintenanceCard.objects.filter(repair_date__isnull=True).exists())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('sync'), {'since': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('sync'), {'since': keyset.encode_cursor(keyset.NEXT, [None])})
+        self.assertEqual(response.status_code, 400)
+
+
+class KeysetPaginationTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        devices = make_devices(self.warehouse, self.zones, 12)
+        # Ties and NULLs on report_date, the pk has to break them
+        for i, device in enumerate(devices * 2):
+            report_date = None if i % 5 == 0 else date(2025, 1, 1 + i % 3)
+            MaintenanceCard.objects.create(device=device, issue_type="Broken", technician="T", report_date=report_date)
+
+    def walk(self, queryset, ordering, page_size):
+        pages, cursor = [], None
+        while True:
+            page = keyset.paginate(queryset, ordering, cursor, page_size)
+            pages.append(page)
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    def test_pages_cover_ordering_in_both_directions(self):
+        queryset = MaintenanceCard.objects.all()
+        for ordering in [('-report_date', '-pk'), ('report_date', 'pk')]:
+            expected = list(keyset.order_by(queryset, ordering).values_list('pk', flat=True))
+            pages = self.walk(queryset, ordering, 5)
+            self.assertEqual([card.pk for page in pages for card in page], expected)
+            self.assertEqual(len(pages), 5)
+            self.assertFalse(pages[0].has_previous)
+
+            # Going back from the last page returns the same pages
+            page = pages[-1]
+            for previous in reversed(pages[:-1]):
+                page = keyset.paginate(queryset, ordering, page.previous_cursor, 5)
+                self.assertEqual([card.pk for card in page], [card.pk for card in previous])
+            self.assertFalse(page.has_previous)
+
+    def test_iterate_matches_ordering(self):
+        ordering = ('-report_date', '-pk')
+        queryset = MaintenanceCard.objects.all()
+        expected = list(keyset.order_by(queryset, ordering))
+        self.assertEqual(list(keyset.iterate(queryset, ordering, chunk_size=7)), expected)
+
+    def test_view_pages_without_offset(self):
+        url = reverse('maintenance_list')
+        seen = []
+        params = {'contract': 'C-1'}
+        while True:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url, params)
+            self.assertFalse(any('OFFSET' in query['sql'] for query in captured))
+            seen.extend(card.pk for card in response.context['maintenance_cards'])
+            page = response.context['page_obj']
+            if not page.has_next:
+                break
+            params = QueryDict(page.next_query)
+            self.assertEqual(params['contract'], 'C-1')
+
+        expected = MaintenanceCard.objects.filter(device__zone__contract=self.contract)
+        self.assertEqual(sorted(seen), sorted(expected.values_list('pk', flat=True)))
+
+    def test_task_list_renders_keyset_links(self):
+        zone = self.zones[0]
+        for i in range(12):
+            Task.objects.create(name=f"Task {i:02}", zone=zone, status='ongoing', deadline=date(2025, 1, 1 + i))
+        response = self.client.get(reverse('task_list'), {'contract': self.contract.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Task 00")
+        self.assertContains(response, "Task 09")
+        self.assertNotContains(response, "Task 10")
+        self.assertContains(response, ">Next</a>")
+        self.assertContains(response, QueryDict(response.context['page_obj'].next_query)['cursor'])
+        self.assertNotContains(response, "Page 1 of")
+
+        response = self.client.get(reverse('task_list'), QueryDict(response.context['page_obj'].next_query))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Task 11")
+        self.assertContains(response, ">Previous</a>")
+        self.assertNotContains(response, ">Next</a>")
+
+    def test_nulls_placed_only_for_nullable_fields(self):
+        sql = str(keyset.order_by(MaintenanceCard.objects.all(), ('-report_date', '-pk')).query)
+        order = sql[sql.index('ORDER BY'):]
+        self.assertEqual(order.count('NULL'), 1, order)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('task_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_cursor(self):
+        # Decodes fine, but holds a string where the date and the pk go
+        cursor = keyset.encode_cursor(keyset.NEXT, ['soon', 'first'])
+        response = self.client.get(reverse('task_list'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('maintenance_list'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('api_tasks'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('sync'), {'since': keyset.encode_cursor(keyset.NEXT, [['2025-01-01T00:00:00', 'x']] * 10)})
+        self.assertEqual(response.status_code, 400)
+
+        # A well-typed cursor still pages
+        cursor = keyset.encode_cursor(keyset.NEXT, ['2025-01-01', 1])
+        self.assertEqual(self.client.get(reverse('task_list'), {'cursor': cursor}).status_code, 200)
+
+
+class FragmentCacheTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        self.other, self.other_warehouse, self.other_zones = make_contract("C-2")
+        self.devices = make_devices(self.warehouse, self.zones, 6)
+        make_devices(self.other_warehouse, self.other_zones, 3, prefix="O")
+
+    def get(self, name, *args):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name, args=args))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_cached_fragments_skip_their_queries(self):
+        first, cold = self.get('contract_detail', self.contract.pk)
+        second, warm = self.get('contract_detail', self.contract.pk)
+        self.assertLess(warm, cold)
+        csrf = re.compile(rb'name="csrfmiddlewaretoken" value="\w+"')
+        self.assertEqual(csrf.sub(b'', first.content), csrf.sub(b'', second.content))
+
+    def test_changes_invalidate_only_their_contract(self):
+        total = '<span class="badge bg-primary text-white px-3 py-2 rounded-pill fw-semibold">{}</span>'
+        self.assertContains(self.get('contract_detail', self.contract.pk)[0], total.format(0), html=True)
+        self.get('contract_detail', self.other.pk)
+        _, other_warm = self.get('contract_detail', self.other.pk)
+
+        Task.objects.create(name="Survey", zone=self.zones[0], status='delayed')
+        self.assertContains(self.get('contract_detail', self.contract.pk)[0], total.format(1), html=True)
+        # The other contract's fragments are still cached
+        self.assertEqual(self.get('contract_detail', self.other.pk)[1], other_warm)
+
+    def test_device_changes_invalidate_warehouse_stats(self):
+        url = reverse('warehouse_detail', args=[self.warehouse.pk])
+        self.assertEqual(self.client.get(url).context['warehouse'].count_damaged, 2)
+
+        device = self.devices[0]
+        device.status = 'damaged'
+        device.save()
+        response = self.client.get(url)
+        self.assertContains(response, '<div class="fw-bold fs-5">3</div>', html=True)
+
+        # A device moving to the other contract's zone invalidates that contract too
+        self.get('contract_detail', self.other.pk)
+        _, warm = self.get('contract_detail', self.other.pk)
+        device.zone = self.other_zones[0]
+        device.save()
+        self.assertGreater(self.get('contract_detail', self.other.pk)[1], warm)
+
+    def test_dashboard_follows_every_change(self):
+        self.get('dashboard')
+        _, warm = self.get('dashboard')
+        MaintenanceCard.objects.create(device=self.devices[0], issue_type="Broken", technician="T")
+        response, cold = self.get('dashboard')
+        self.assertGreater(cold, warm)
+        self.assertEqual(response.context['stats'].maintenance.pending, 1)
+
+    def test_unknown_scope(self):
+        with self.assertRaisesMessage(TemplateSyntaxError, "unknown scopes: zone"):
+            Template('{% load fragments %}{% cachefragment "x" zone=1 %}{% endcachefragment %}')
+
+
+class ReferenceCacheTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        DeviceCategory.objects.create(name="Camera")
+
+    def reference_queries(self, url, params=None):
+        tables = ('"contracts_contract"', '"contracts_zone"', '"contracts_devicecategory"')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+        return [query['sql'] for query in queries if query['sql'].split(' WHERE ')[0].endswith(tables)]
+
+    def test_filter_dropdowns_cost_no_queries(self):
+        for name in ('maintenance_list', 'coordination_list', 'task_list'):
+            with self.subTest(name):
+                url = reverse(name)
+                reference.get_cache().clear()
+                self.assertTrue(self.reference_queries(url))
+                self.assertEqual(self.reference_queries(url), [])
+                self.assertEqual(self.reference_queries(url, {'contract': 'C-1'}), [])
+
+    def test_changes_evict(self):
+        url = reverse('task_list')
+        self.client.get(url)
+
+        zone = Zone.objects.create(name="Late zone", contract=self.contract)
+        self.assertIn(zone, self.client.get(url).context['zones'])
+
+        self.contract.name = "Renamed"
+        self.contract.save()
+        self.assertEqual([c.name for c in self.client.get(url).context['contracts']], ["Renamed"])
+
+        DeviceCategory.objects.filter(name="Camera").delete()
+        DeviceCategory.objects.create(name="Sensor")
+        self.assertEqual([c.name for c in reference.categories()], ["Sensor"])
+
+    def test_last_contract_and_unknown_contracts(self):
+        make_contract("C-0")
+        Contract.objects.filter(pk="C-0").update(start_date=date(2020, 1, 1))
+        reference.get_cache().clear()
+        self.assertEqual(reference.last_contract(), Contract.objects.last())
+        self.assertEqual(reference.zones("missing"), [])
+        self.assertIsNone(reference.get_contract("missing"))
+
+
+class DevicePropertyTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        self.device = make_devices(self.warehouse, self.zones, 1)[0]
+        self.device.properties = {"mac_address": "AA:BB:CC:00:11:22", "firmware": "5.7"}
+        self.device.save()
+
+    def device_data(self, properties, prefix="properties"):
+        data = {
+            'serial_number': self.device.serial_number, 'name': "Dome", 'invoice_number': "INV-1",
+            'device_category': self.device.device_category_id, 'status': 'available',
+            'responsible_person': "Tech", f'{prefix}-TOTAL_FORMS': len(properties),
+            f'{prefix}-INITIAL_FORMS': 2, f'{prefix}-MIN_NUM_FORMS': 0, f'{prefix}-MAX_NUM_FORMS': 1000,
+        }
+        for i, row in enumerate(properties):
+            data.update({f'{prefix}-{i}-{name}': value for name, value in row.items()})
+        return data
+
+    def test_formset_edits_the_json_properties(self):
+        url = reverse('device_edit', args=[self.device.pk])
+        response = self.client.get(url)
+        self.assertContains(response, 'value="AA:BB:CC:00:11:22"')
+
+        response = self.client.post(url, self.device_data([
+            {'key': "mac_address", 'value': "AA:BB:CC:00:11:33"},
+            {'key': "firmware", 'value': "5.7", 'DELETE': "on"},
+            {'key': "poe", 'value': "802.3at"},
+        ]))
+        self.assertEqual(response.status_code, 302)
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.properties, {"mac_address": "AA:BB:CC:00:11:33", "poe": "802.3at"})
+
+    def test_duplicate_keys_are_rejected(self):
+        response = self.client.post(reverse('device_edit', args=[self.device.pk]), self.device_data([
+            {'key': "firmware", 'value': "1"}, {'key': "firmware", 'value': "2"},
+        ]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Each property can only be given once.")
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.properties["firmware"], "5.7")
+
+    def test_required_properties(self):
+        self.device.required_properties = ["mac_address"]
+        self.device.save()
+        url = reverse('device_edit', args=[self.device.pk])
+        self.assertContains(self.client.get(url), 'name="properties-0-is_required" class="form-check-input" id="id_properties-0-is_required" checked')
+
+        # Still required: it needs a value and cannot be removed
+        for row, error in (
+            ({'value': ""}, "needs a value."),
+            ({'value': "AA:BB:CC:00:11:22", 'DELETE': "on"}, "cannot be removed."),
+        ):
+            response = self.client.post(url, self.device_data([
+                {'key': "mac_address", 'is_required': "on", **row}, {'key': "firmware", 'value': ""},
+            ]))
+            self.assertContains(response, f"The required property &#x27;mac_address&#x27; {error}")
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.properties["mac_address"], "AA:BB:CC:00:11:22")
+
+        # Optional properties may be blank, and a property is removed once no longer required
+        response = self.client.post(url, self.device_data([
+            {'key': "mac_address", 'value': "AA:BB:CC:00:11:22", 'DELETE': "on"},
+            {'key': "firmware", 'value': "", 'is_required': ""},
+            {'key': "poe", 'value': "802.3at", 'is_required': "on"},
+        ]))
+        self.assertEqual(response.status_code, 302)
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.properties, {"firmware": "", "poe": "802.3at"})
+        self.assertEqual(self.device.required_properties, ["poe"])
+
+    def test_detail_reads_one_column(self):
+        response = self.client.get(reverse('device_detail', args=[self.device.pk]))
+        self.assertContains(response, "AA:BB:CC:00:11:22")
+
+    def test_filter_by_property(self):
+        make_devices(self.warehouse, self.zones, 3, prefix="O")
+        found = filter_devices(Device.objects.all(), properties={"mac_address": "AA:BB:CC:00:11:22"})
+        self.assertEqual(list(found), [self.device])
+        self.assertFalse(filter_devices(Device.objects.all(), properties={"firmware": "6.0"}).exists())
+        with self.assertRaises(ValueError):
+            filter_devices(Device.objects.all(), properties={"mac'; --": "x"})
+
+
+class DeviceSearchTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.devices = make_devices(self.warehouse, self.zones, 6)
+            self.devices[2].ip_address = "192.168.7.20"
+            self.devices[2].save()
+            self.devices[4].properties = {"firmware": "V5.7.3-build"}
+            self.devices[4].save()
+
+    def search(self, query, queryset=None):
+        return list(search_devices(queryset or Device.objects.all(), query))
+
+    def test_matches_every_searchable_field(self):
+        device = self.devices[1]
+        self.assertEqual(self.search(device.serial_number), [device])
+        self.assertEqual(self.search("168.7"), [self.devices[2]])
+        self.assertEqual(self.search("INV-3"), [self.devices[3]])
+        self.assertEqual(self.search("build"), [self.devices[4]])
+        self.assertEqual(len(self.search("Tech")), 6)
+        self.assertEqual(self.search("nothing like this"), [])
+
+    def test_short_queries_and_scope(self):
+        _, other, zones = make_contract("C-2")
+        with self.captureOnCommitCallbacks(execute=True):
+            make_devices(other, zones, 3, prefix="O")
+        self.assertEqual(len(self.search("D-", Device.objects.filter(warehouse=self.warehouse))), 6)
+        self.assertEqual(len(self.search("Device", Device.objects.filter(warehouse=other))), 3)
+
+    def test_index_follows_saves_and_deletes(self):
+        device = self.devices[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            device.name = "Thermal dome"
+            device.save()
+        self.assertEqual(self.search("dome"), [device])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.devices[4].properties = {}
+            self.devices[4].save()
+            self.devices[5].delete()
+        self.assertEqual(self.search("build"), [])
+        self.assertFalse(DeviceSearchDocument.objects.filter(device_id=self.devices[5].pk).exists())
+
+    def test_import_indexes_devices(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DeviceImporter().import_xlsx(make_workbook([import_row(i) for i in range(3)]))
+        self.assertEqual([device.serial_number for device in self.search("SN-2")], ["SN-2"])
+
+    def test_rebuild_command(self):
+        DeviceSearchDocument.objects.all().delete()
+        self.assertEqual(self.search("Tech"), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search("Tech")), 6)
+
+    def test_matches_are_not_truncated(self):
+        devices = search_devices(Device.objects.all(), "Tech")
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(devices.count(), 6)
+        self.assertNotIn('LIMIT', captured[0]['sql'])
+
+    def test_displayed_rows_are_ranked(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Device.objects.filter(pk=self.devices[1].pk).update(name="Dome camera")
+            Device.objects.filter(pk=self.devices[3].pk).update(name="Dome dome dome")
+            index_devices()
+        found = search_devices(Device.objects.all(), "dome")
+        self.assertEqual(list(found), [self.devices[1], self.devices[3]])
+        self.assertEqual(rank_devices(found, "dome"), [self.devices[3], self.devices[1]])
+
+        response = self.client.get(reverse('warehouse_detail', args=[self.warehouse.pk]), {'q': "dome"})
+        self.assertEqual(response.context['devices'], [self.devices[3], self.devices[1]])
+
+    def test_warehouse_view_search(self):
+        response = self.client.get(reverse('warehouse_detail', args=[self.warehouse.pk]), {'q': "168.7"})
+        self.assertEqual(list(response.context['devices']), [self.devices[2]])
+        self.assertEqual(response.context['total_devices'], 1)
+
+
+class QueryPlanTests(LoggedInTestCase):
+    """EXPLAIN the list view querysets and check they use the filter indexes (migrations 0007, 0011)."""
+
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        make_devices(self.warehouse, self.zones, 6)
+        self.factory = RequestFactory()
+
+    def view(self, view_class, params=None, **kwargs):
+        request = self.factory.get("/", params or {})
+        request.user = self.user
+        view = view_class()
+        view.setup(request, **kwargs)
+        return view
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are cheaper to scan, make the planner show its index choice
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+                return queryset.explain()
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.plan(queryset)
+        self.assertIn(index_name, plan, msg=f"{index_name} not used:\n{queryset.query}\n{plan}")
+
+    def assertOrderedByIndex(self, queryset, index_name):
+        """``index_name`` is read in the ORDER BY order: no sort step after the scan."""
+        self.assertUsesIndex(queryset, index_name)
+        plan = self.plan(queryset)
+        sort = r'\bSort\b' if connection.vendor == 'postgresql' else r'TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY'
+        self.assertNotRegex(plan, sort, msg=f"{index_name} does not serve the ordering:\n{queryset.query}\n{plan}")
+
+    def test_warehouse_devices(self):
+        view = self.view(WarehouseDetailView, {'status': 'damaged'}, pk=self.warehouse.pk)
+        view.object = self.warehouse
+        self.assertUsesIndex(view.get_filtered_devices(), 'device_warehouse_status_idx')
+
+        view = self.view(WarehouseDetailView, {'zone': 'warehouse'}, pk=self.warehouse.pk)
+        view.object = self.warehouse
+        self.assertUsesIndex(view.get_filtered_devices(), 'device_warehouse_loc_idx')
+
+    def test_device_properties(self):
+        devices = filter_devices(Device.objects.all(), properties={"mac_address": "AA:BB:CC:00:11:22"})
+        self.assertUsesIndex(devices, 'device_prop_mac_idx')
+
+    def test_zone_devices_by_status(self):
+        self.assertUsesIndex(Device.objects.filter(zone=self.zones[0], status='installed'), 'device_zone_status_idx')
+
+    def test_task_list(self):
+        view = self.view(TaskListView, {'zone': self.zones[0].pk, 'status': 'ongoing'})
+        self.assertOrderedByIndex(keyset.order_by(view.get_queryset(), view.keyset_ordering), 'task_zone_status_deadline_idx')
+
+    def test_tasks_by_lateness(self):
+        view = self.view(TaskListView, {'zone': self.zones[0].pk, 'sort': 'late', 'open': 1})
+        self.assertOrderedByIndex(keyset.order_by(view.get_queryset(), view.keyset_ordering), 'task_zone_deadline_idx')
+
+    def test_late_tasks(self):
+        view = self.view(TaskListView, {'zone': self.zones[0].pk, 'late': 7})
+        self.assertOrderedByIndex(keyset.order_by(view.get_queryset(), view.keyset_ordering), 'task_zone_deadline_idx')
+
+    def test_pending_maintenance_by_device(self):
+        device = Device.objects.first()
+        self.assertUsesIndex(MaintenanceCard.objects.filter(device=device, repair_date__isnull=True), 'maint_pending_device_idx')
+
+    def test_maintenance_list_ordering(self):
+        ordering = MaintenanceListView.keyset_ordering
+        self.assertOrderedByIndex(keyset.order_by(MaintenanceCard.objects.all(), ordering)[:26], 'maint_report_date_idx')
+
+    def test_coordination_list(self):
+        view = self.view(CoordinationListView, {'contract': self.contract.pk, 'zone': self.zones[0].pk})
+        self.assertOrderedByIndex(keyset.order_by(view.get_queryset(), view.keyset_ordering), 'coord_zone_date_idx')
+
+
+class ExcelExportTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        self.devices = make_devices(self.warehouse, self.zones, 6)
+        for device in self.devices[:4]:
+            MaintenanceCard.objects.create(device=device, issue_type="Broken", technician="T", report_date=date.today())
+
+    def read_sheet(self, response):
+        self.assertTrue(response.streaming)
+        workbook = openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content)))
+        return list(workbook.active.iter_rows(values_only=True))
+
+    def test_maintenance_export_streams_rows(self):
+        # Devices are zone-less when i % 3 == 0, the default contract filter keeps the other cards
+        response = self.client.get(reverse('maintenance_list'), {'contract': 'C-1', 'export': 1, 'format': 'excel'})
+        rows = self.read_sheet(response)
+
+        expected = MaintenanceCard.objects.filter(device__zone__contract=self.contract).count()
+        self.assertEqual(len(rows), expected + 1)
+        self.assertEqual(rows[0][0], MaintenanceCard._meta.get_field('device').verbose_name)
+        serials = {row[0] for row in rows[1:]}
+        self.assertTrue(serials <= {device.serial_number for device in self.devices})
+
+    def test_export_query_count_does_not_grow(self):
+        params = {'contract': 'C-1', 'export': 1, 'format': 'excel'}
+        reference.contracts()
+        with CaptureQueriesContext(connection) as small:
+            b"".join(self.client.get(reverse('maintenance_list'), params).streaming_content)
+
+        extra = make_devices(self.warehouse, self.zones, 30, prefix="X")
+        for device in extra:
+            MaintenanceCard.objects.create(device=device, issue_type="Broken", technician="T")
+        with CaptureQueriesContext(connection) as large:
+            b"".join(self.client.get(reverse('maintenance_list'), params).streaming_content)
+
+        self.assertEqual(len(small), len(large))
+
+    def test_warehouse_export(self):
+        response = self.client.get(reverse('warehouse_detail', args=[self.warehouse.pk]), {'export': 'true', 'format': 'excel'})
+        rows = self.read_sheet(response)
+
+        self.assertEqual(rows[0][0], f"Warehouse: {self.warehouse.name} ({self.warehouse.location})")
+        header_index = rows.index(("Serial", "Name", "Category", "Status", "IP", "Transfer Date",
+                                   "Installation Date", "Responsible", "Notes"))
+        self.assertEqual(len(rows) - header_index - 1, len(self.devices))
+        self.assertIn(("Total Devices", 6), [row[:2] for row in rows[:header_index]])
+
+
+@override_settings(EXPORT_JOB_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp(prefix="camtrack-media-"))
+class ExportJobTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        self.devices = make_devices(self.warehouse, self.zones, 6)
+
+    def start_job(self, url, params):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(url, {**params, 'background': 1})
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('export_job_detail', args=[job.pk]))
+        return job
+
+    def test_warehouse_excel_job(self):
+        job = self.start_job(reverse('warehouse_detail', args=[self.warehouse.pk]),
+                             {'export': 'true', 'format': 'excel', 'status': 'damaged'})
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.rows_total, Device.objects.filter(status='damaged').count())
+        self.assertEqual(job.rows_done, job.rows_total)
+        self.assertNotIn('background', job.query_string)
+
+        status = self.client.get(reverse('export_job_status', args=[job.pk])).json()
+        self.assertEqual(status['progress'], 100)
+
+        response = self.client.get(status['download_url'])
+        workbook = openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content)))
+        serials = [row[0] for row in workbook.active.iter_rows(values_only=True)]
+        for device in Device.objects.filter(status='damaged'):
+            self.assertIn(device.serial_number, serials)
+
+    def test_failed_job_records_error(self):
+        job = self.start_job(reverse('maintenance_list'), {'export': 1, 'format': 'excel', 'contract': 'missing'})
+        ExportJob.objects.filter(pk=job.pk).update(status='pending', view_name='no_such_view')
+        with self.assertLogs('contracts.services.jobs', 'ERROR'):
+            run_export_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertTrue(job.error)
+
+    def test_claimed_job_is_not_run_twice(self):
+        job = self.start_job(reverse('maintenance_list'), {'export': 1, 'format': 'excel'})
+        ExportJob.objects.filter(pk=job.pk).update(status='running', file='')
+        run_export_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.file.name), ('running', ''))
+
+    def test_interrupted_jobs_resume_after_restart(self):
+        job = self.start_job(reverse('maintenance_list'), {'export': 1, 'format': 'excel'})
+        # The process died mid-export, and another was queued but never started
+        ExportJob.objects.filter(pk=job.pk).update(status='running', rows_done=3, file='', finished_at=None)
+        queued = ExportJob.objects.create(
+            user=self.user, view_name='maintenance_list', query_string='export=1&format=excel', export_format='excel',
+        )
+        out = StringIO()
+        call_command('resume_exports', stdout=out)
+        self.assertIn("Resumed 2 export jobs", out.getvalue())
+        for job in ExportJob.objects.filter(pk__in=[job.pk, queued.pk]):
+            self.assertEqual(job.status, 'done')
+            self.assertTrue(job.file.name)
+
+    def test_jobs_are_private(self):
+        job = self.start_job(reverse('maintenance_list'), {'export': 1, 'format': 'excel'})
+        self.client.force_login(User.objects.create_user(username="other", password="secret"))
+        self.assertEqual(self.client.get(reverse('export_job_status', args=[job.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export_job_detail', args=[job.pk])).status_code, 404)
+
+
+class PdfExportTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.contract, self.warehouse, self.zones = make_contract()
+        self.devices = make_devices(self.warehouse, self.zones, 4)
+
+    def test_logo_is_parsed_once_across_exports(self):
+        pdf_assets.clear_cache()
+        url = reverse('warehouse_detail', args=[self.warehouse.pk])
+        with mock.patch('contracts.services.pdf_assets.svg2rlg', wraps=pdf_assets.svg2rlg) as svg2rlg:
+            for _ in range(3):
+                response = self.client.get(url, {'export': 'true', 'format': 'pdf'})
+                self.assertEqual(response['Content-Type'], 'application/pdf')
+                self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertEqual(svg2rlg.call_count, 1)
+
+    def test_logo_copies_are_independent(self):
+        first, second = pdf_assets.logo(), pdf_assets.logo()
+        first.scale(2, 2)
+        self.assertIsNot(first, second)
+        self.assertNotEqual(first.transform, second.transform)
+
+    def test_list_pdf_export(self):
+        card = MaintenanceCard.objects.create(device=self.devices[1], issue_type="عطل في الكاميرا", technician="فني")
+        response = self.client.get(reverse('maintenance_list'), {'contract': 'C-1', 'export': 1, 'format': 'pdf'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertIn(slugify(card._meta.model_name), response['Content-Disposition'])
+
+
+class TextShapingTests(TestCase):
+    def test_non_arabic_passthrough(self):
+        self.assertEqual(text.shape("Zone 1"), "Zone 1")
+        self.assertEqual(text.shape(None), "None")
+        self.assertEqual(text.shape(12), "12")
+
+    def test_arabic_is_shaped_and_cached(self):
+        value = "المخزن الرئيسي"
+        expected = get_display(arabic_reshaper.reshape(value))
+        with mock.patch('contracts.services.text.arabic_reshaper.reshape', wraps=arabic_reshaper.reshape) as reshape:
+            text._shape.cache_clear()
+            self.assertEqual([text.shape(value) for _ in range(5)], [expected] * 5)
+        self.assertEqual(reshape.call_count, 1)
+
+    def test_shape_rows_by_column(self):
+        rows = [["فني", "Zone"], ["فني", "Zone"], ["مدير", 3]]
+        shaped = text.shape_rows(rows)
+        self.assertEqual(shaped[0], [text.shape("فني"), "Zone"])
+        self.assertEqual(shaped[2], [text.shape("مدير"), "3"])
+        self.assertEqual(text.shape_rows([]), [])
+
+
+IMPORT_HEADERS = [
+    'serial_number', 'name', 'invoice_number', 'device_category', 'warehouse_name', 'zone_name',
+    'status', 'current_location', 'ip_address', 'responsible_person', 'transfer_date', 'installation_date', 'notes',
+]
+
+
+def import_row(i, warehouse="Main", zone=None, status="available", **overrides):
+    values = {
+        'serial_number': f"SN-{i}", 'name': f"Camera {i}", 'invoice_number': f"INV-{i}",
+        'device_category': "Camera" if i % 2 else "NVR", 'warehouse_name': warehouse, 'zone_name': zone,
+        'status': status, 'current_location': 'warehouse', 'ip_address': f"10.0.0.{i % 250 + 1}",
+        'responsible_person': "Tech", 'transfer_date': date(2025, 1, 1), 'installation_date': None, 'notes': None,
+    }
+    values.update(overrides)
+    return [values[header] for header in IMPORT_HEADERS]
+
+
+def make_workbook(rows, headers=IMPORT_HEADERS):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(headers)
+    for row in rows:
+        sheet.append(row)
+    output = BytesIO()
+    workbook.save(output)
+    output.seek(0)
+    output.name = "devices.xlsx"
+    return output
+
+
+@override_settings(IMPORT_JOB_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp(prefix="camtrack-media-"))
+class DeviceImportTests(LoggedInTestCase):
+    def post_import(self, upload, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('import_devices'), {'file': upload, **data})
+        session = ImportSession.objects.order_by('-created_at').first()
+        if session is not None:
+            self.assertRedirects(response, reverse('import_session_detail', args=[session.pk]))
+        return response, session
+
+    def test_import_creates_related_entities(self):
+        rows = [import_row(i, zone="North" if i % 3 else None) for i in range(10)]
+        rows.append(import_row(99, warehouse=None))
+        _, session = self.post_import(make_workbook(rows))
+        self.assertEqual((session.status, session.created_count, session.skipped_count), ('done', 10, 1))
+
+        self.assertEqual(Device.objects.count(), 10)
+        warehouse = Warehouse.objects.get(name="Main")
+        self.assertEqual(warehouse.contract.name, "AutoContract-Main")
+        self.assertEqual(set(warehouse.contract.items.values_list('category__name', flat=True)), {"Camera", "NVR"})
+
+        zoned = Device.objects.get(serial_number="SN-1")
+        self.assertEqual((zoned.zone.name, zoned.current_location), ("North", "zone"))
+        self.assertEqual(Device.objects.get(serial_number="SN-3").current_location, "warehouse")
+        self.assertEqual(zoned.transfer_date, date(2025, 1, 1))
+        self.assertEqual(warehouse.count_devices, 10)
+
+    def test_reimport_updates_devices(self):
+        DeviceImporter().import_xlsx(make_workbook([import_row(i) for i in range(5)]))
+        result = DeviceImporter().import_xlsx(make_workbook([
+            import_row(1, status="damaged", zone="South"),
+            import_row(7),
+        ]))
+
+        self.assertEqual((result.created, result.updated), (1, 1))
+        self.assertEqual(Device.objects.count(), 6)
+        device = Device.objects.get(serial_number="SN-1")
+        self.assertEqual((device.status, device.zone.name), ("damaged", "South"))
+        self.assertEqual(Warehouse.objects.count(), 1)
+        self.assertEqual(Warehouse.objects.get().count_damaged, 1)
+
+    def test_query_count_does_not_depend_on_rows(self):
+        def queries(count, offset):
+            rows = [import_row(offset + i, zone=f"Z{i % 4}") for i in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                DeviceImporter(chunk_size=1000).import_xlsx(make_workbook(rows))
+            # INSERTs are split by the backend's parameter limit, everything else is per chunk
+            return len([query for query in captured if not query['sql'].startswith('INSERT')])
+
+        queries(5, 0)  # warm up: create warehouse, zones and categories
+        self.assertEqual(queries(10, 1000), queries(300, 2000))
+
+    def test_validation_reports_each_failed_check(self):
+        rows = [
+            import_row(0),
+            import_row(1, status="broken"),
+            import_row(2, current_location="roof"),
+            import_row(3, ip_address="10.0.0.300"),
+            import_row(4, transfer_date="not a date"),
+            import_row(5, status="installed"),
+            import_row(0, warehouse=None),
+        ]
+        report = ImportValidator().validate(read_xlsx_chunks(make_workbook(rows), chunk_size=3))
+
+        self.assertEqual((report.rows, report.invalid_rows, report.valid_rows), (7, 6, 1))
+        self.assertEqual(
+            list(report.errors[['row', 'column']].itertuples(index=False, name=None)),
+            [
+                (3, 'status'), (4, 'current_location'), (5, 'ip_address'), (6, 'transfer_date'),
+                (7, 'zone_name'), (8, 'serial_number'), (8, 'warehouse_name'),
+            ],
+        )
+        self.assertEqual(report.errors.loc[2, 'value'], "10.0.0.300")
+
+    def test_dry_run_writes_nothing_and_offers_report(self):
+        rows = [import_row(i) for i in range(4)] + [import_row(5, status="lost")]
+        response = self.client.post(reverse('import_devices'), {'file': make_workbook(rows), 'dry_run': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Device.objects.count(), 0)
+        self.assertFalse(Warehouse.objects.exists())
+        self.assertEqual(response.context['report'].valid_rows, 4)
+        self.assertContains(response, reverse('import_devices_report'))
+
+        download = self.client.get(reverse('import_devices_report'))
+        sheet = openpyxl.load_workbook(BytesIO(b"".join(download.streaming_content))).active
+        self.assertEqual(list(sheet.iter_rows(min_row=2, values_only=True)), [(6, 'status', 'lost', mock.ANY)])
+
+    def test_import_skips_invalid_rows(self):
+        rows = [import_row(i) for i in range(3)] + [import_row(1, ip_address="nope")]
+        _, session = self.post_import(make_workbook(rows))
+
+        # The duplicate serial is rejected, the first row for it is kept
+        self.assertEqual(Device.objects.count(), 3)
+        self.assertEqual(Device.objects.get(serial_number="SN-1").ip_address, "10.0.0.2")
+        self.assertEqual(session.invalid_rows, 1)
+        self.assertEqual(self.client.get(reverse('import_session_report', args=[session.pk])).status_code, 200)
+
+    def test_dry_run_drops_stale_report(self):
+        self.client.post(reverse('import_devices'), {'file': make_workbook([import_row(1, status="x")]), 'dry_run': '1'})
+        self.assertEqual(self.client.get(reverse('import_devices_report')).status_code, 200)
+        self.client.post(reverse('import_devices'), {'file': make_workbook([import_row(1)]), 'dry_run': '1'})
+        self.assertEqual(self.client.get(reverse('import_devices_report')).status_code, 404)
+
+    def test_invalid_file_is_rejected(self):
+        def upload(name="devices.xlsx"):
+            file = BytesIO(b"not a workbook")
+            file.name = name
+            return file
+
+        response = self.client.post(reverse('import_devices'), {'file': upload(), 'dry_run': '1'}, follow=True)
+        self.assertContains(response, "not a valid Excel or CSV file")
+
+        response = self.client.post(reverse('import_devices'), {'file': upload("devices.txt")}, follow=True)
+        self.assertContains(response, "Only .xlsx and .csv files")
+        self.assertFalse(ImportSession.objects.exists())
+
+        with self.assertLogs('contracts.services.import_sessions', 'ERROR'):
+            _, session = self.post_import(upload())
+        self.assertEqual(session.status, 'failed')
+        self.assertTrue(session.error)
+
+    def test_csv_import(self):
+        lines = [",".join(IMPORT_HEADERS)]
+        for i in range(5):
+            lines.append(",".join("" if value is None else str(value) for value in import_row(i, zone="North" if i % 2 else None)))
+        upload = BytesIO(("\n".join(lines) + "\n").encode("utf-8-sig"))
+        upload.name = "devices.csv"
+
+        _, session = self.post_import(upload)
+        self.assertEqual((session.file_format, session.status, session.rows_total), ('csv', 'done', 5))
+        self.assertEqual(session.created_count, 5)
+        device = Device.objects.get(serial_number="SN-1")
+        self.assertEqual((device.zone.name, device.transfer_date), ("North", date(2025, 1, 1)))
+
+    def test_interrupted_session_resumes_after_last_chunk(self):
+        rows = [import_row(i) for i in range(7)] + [import_row(3)]
+        session = ImportSession.objects.create(
+            user=self.user, file=File(make_workbook(rows), name="devices.xlsx"), file_format='xlsx', chunk_size=3,
+        )
+        real_import = DeviceImporter.import_chunk
+        calls = []
+
+        def crash_on_second_chunk(importer, df):
+            calls.append(list(df.index))
+            if len(calls) == 2:
+                raise KeyboardInterrupt  # the worker process dies, nothing is recorded
+            return real_import(importer, df)
+
+        with mock.patch.object(DeviceImporter, 'import_chunk', crash_on_second_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                run_import_session(session.pk)
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.chunks_done, session.rows_done), ('running', 1, 3))
+        self.assertEqual(Device.objects.count(), 3)
+
+        calls.clear()
+        with mock.patch.object(DeviceImporter, 'import_chunk', lambda importer, df: calls.append(list(df.index)) or real_import(importer, df)):
+            call_command('resume_imports', stdout=StringIO())
+        session.refresh_from_db()
+
+        # Chunk one is not imported again, and its serials still count as duplicates
+        self.assertEqual(calls, [[3, 4, 5], [6]])
+        self.assertEqual((session.status, session.chunks_done, session.rows_done), ('done', 3, 8))
+        self.assertEqual((session.created_count, session.invalid_rows), (7, 1))
+        self.assertEqual(Device.objects.count(), 7)
+
+    def test_claimed_session_is_not_run_twice(self):
+        session = ImportSession.objects.create(
+            user=self.user, file=File(make_workbook([import_row(0)]), name="devices.xlsx"), file_format='xlsx',
+        )
+        self.assertTrue(claim_import_session(session.pk))
+        run_import_session(session.pk)
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.rows_done), ('running', 0))
+        self.assertFalse(Device.objects.exists())
+
+    def test_status_endpoint_reports_rate(self):
+        _, session = self.post_import(make_workbook([import_row(i) for i in range(4)]))
+        data = self.client.get(reverse('import_session_status', args=[session.pk])).json()
+        self.assertEqual((data['status'], data['progress'], data['rows_done'], data['created']), ('done', 100, 4, 4))
+        self.assertGreater(data['rows_per_second'], 0)
+        self.assertIsNone(data['report_url'])
+
+        other = User.objects.create_user(username="other", password="secret")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('import_session_status', args=[session.pk])).status_code, 404)
+
+
+class SyntheticDataTests(TestCase):
+    def test_generate(self):
+        created = SyntheticData(seed=1, batch_size=50).generate(contracts=3, zones=2, devices=300)
+
+        self.assertEqual((created['contract'], created['zone'], created['device']), (3, 6, 300))
+        self.assertEqual(Device.objects.count(), 300)
+        self.assertEqual(Task.objects.count(), created['task'])
+        self.assertTrue(MaintenanceCard.objects.exists())
+        # The save() invariant holds without save(), installed devices sit in a zone
+        self.assertFalse(Device.objects.filter(zone__isnull=True, current_location='zone').exists())
+        self.assertFalse(Device.objects.filter(zone__isnull=False, current_location='warehouse').exists())
+        self.assertFalse(Device.objects.filter(status='installed', zone__isnull=True).exists())
+        # Counters and search documents were built for the bulk-created devices
+        self.assertEqual(sum(DeviceCounter.objects.values_list('total', flat=True)), 300)
+        self.assertEqual(DeviceSearchDocument.objects.count(), 300)
+        self.assertEqual(
+            sum(ContractItem.objects.values_list('quantity', flat=True)), 300,
+        )
+
+    def test_command_keeps_existing_data(self):
+        contract, warehouse, zones = make_contract()
+        call_command('generate_data', contracts=2, zones=2, devices=40, stdout=StringIO())
+        self.assertTrue(Contract.objects.filter(pk=contract.pk).exists())
+        self.assertEqual(Device.objects.count(), 40)
+        with self.assertRaisesMessage(CommandError, "SYN-"):
+            call_command('generate_data', contracts=1, devices=10, stdout=StringIO())
+
+
+class BenchmarkTests(LoggedInTestCase):
+    def test_targets(self):
+        contract, warehouse, zones = make_contract()
+        make_devices(warehouse, zones, 3)
+        found, skipped = benchmark.targets(self.user)
+        names = {target.name for target in found}
+
+        self.assertTrue({'contract_list', 'warehouse_detail', 'warehouse_detail:pdf', 'maintenance_list:excel'} <= names)
+        self.assertFalse(names & {'logout', 'task_change_status', 'contract_delete'})
+        self.assertIn('export_job_detail', skipped)
+
+        target = next(target for target in found if target.name == 'warehouse_detail')
+        self.assertEqual(target.url, reverse('warehouse_detail', args=[warehouse.pk]))
+        result = benchmark.measure(self.client, target, repeat=1)
+        self.assertEqual(result['status'], 200)
+        self.assertGreater(result['queries'], 0)
+
+    def test_compare(self):
+        baseline = {
+            'a': {'median_ms': 100.0, 'queries': 5},
+            'b': {'median_ms': 2.0, 'queries': 5},
+            'c': {'median_ms': 50.0, 'queries': 5},
+            'd': {'median_ms': 50.0, 'queries': 5},
+        }
+        results = {
+            'a': {'median_ms': 130.0, 'queries': 5},
+            'b': {'median_ms': 4.0, 'queries': 5},
+            'c': {'median_ms': 50.0, 'queries': 6},
+            'd': {'median_ms': 55.0, 'queries': 5},
+            'new': {'median_ms': 1.0, 'queries': 1},
+        }
+        regressed = {name: flag for name, _, _, _, flag in benchmark.compare(results, baseline, tolerance=0.2)}
+        # "b" doubled but only by 2 ms, "d" stayed within the tolerance
+        self.assertEqual(regressed, {'a': True, 'b': False, 'c': True, 'd': False})
+
+    def test_worker_starts_without_heavy_modules(self):
+        result = startup.sample()
+        self.assertEqual(result['modules'], [])
+        self.assertGreater(result['rss_kb'], 0)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.DashboardView.as_view(), name='dashboard'),
@@ -29,7 +29,13 @@ urlpatterns = [
     path('warehouses/devices/<int:pk>/edit', views.DeviceFormView.as_view(), name='device_edit'),
     path('warehouses/devices/<int:pk>/delete', views.DeviceDeleteView.as_view(), name='device_delete'),
     path('warehouses/devices/<int:pk>/status', views.update_device_status, name='update_device_status'),
+    path('warehouses/devices/bulk', views.bulk_update_devices, name='bulk_update_devices'),
+    path('select2/choices.json', views.select2_choices, name='select2_choices'),
     path("import/devices/", views.DeviceImportView.as_view(), name="import_devices"),
+    path("import/devices/report/", views.import_devices_report, name="import_devices_report"),
+    path("imports/<uuid:pk>/", views.ImportSessionDetailView.as_view(), name="import_session_detail"),
+    path("imports/<uuid:pk>/status/", views.import_session_status, name="import_session_status"),
+    path("imports/<uuid:pk>/report/", views.import_session_report, name="import_session_report"),
 
     # Maintenance 
     path('maintenance/', views.MaintenanceListView.as_view(), name='maintenance_list'),
@@ -49,4 +55,16 @@ urlpatterns = [
     path('coordination/add/', views.CoordinationCreateView.as_view(), name='coordination_add'),
     path('coordination/<int:pk>/edit/', views.CoordinationUpdateView.as_view(), name='coordination_edit'),
     path('coordination/<int:pk>/delete/', views.CoordinationDeleteView.as_view(), name='coordination_delete'),
+
+    # Export Jobs
+    path('exports/<uuid:pk>/', views.ExportJobDetailView.as_view(), name='export_job_detail'),
+    path('exports/<uuid:pk>/status/', views.export_job_status, name='export_job_status'),
+    path('exports/<uuid:pk>/download/', views.export_job_download, name='export_job_download'),
+
+    # Read-only JSON API
+    *[
+        path(f'api/{api.API_VERSION}/{resource}/', api.resource_list, {'resource': resource}, name=f'api_{resource}')
+        for resource in api.RESOURCES
+    ],
+    path('sync/', api.sync_feed, name='sync'),
 ]
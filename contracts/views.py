@@ -1,42 +1,35 @@
+import json
 import os
-from io import BytesIO
-from datetime import datetime, date
+import uuid
+from dataclasses import asdict
+from datetime import date
 from decimal import Decimal
 
 # 🧠 Python Standard + Django
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.utils.text import slugify
+from django.utils.functional import SimpleLazyObject
 from django.conf import settings
 from django.contrib import messages
-from django.db.models import Count, Q, F, ProtectedError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Count, Q, F, Prefetch, ProtectedError
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET
 from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView, ListView, FormView, DetailView, CreateView, UpdateView, DeleteView
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LogoutView as DjangoLogoutView
 from django.contrib.auth.views import LoginView as DjangoLoginView
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.models import User
 
-# 📦 Third-party
-import pandas as pd
-import openpyxl
-from openpyxl.styles import Font, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.styles import ParagraphStyle
-from svglib.svglib import svg2rlg
-import arabic_reshaper
-from bidi.algorithm import get_display
+# 📦 Third-party (pandas, openpyxl and reportlab load on demand: contracts.imports / contracts.exports)
+from django_select2.views import AutoResponseView
 
 # 🧩 Local
 from .forms import (
@@ -47,8 +40,16 @@ from .forms import (
 
 from .models import (
     Contract, DeviceCategory, ContractItem, Warehouse, Zone,
-    Task, Device, DeviceProperty, MaintenanceCard, CoordinationRequest
+    Task, Device, MaintenanceCard, CoordinationRequest, ExportJob, ImportSession
 )
+from .services.counters import warehouse_stats, zone_category_totals, zone_stats
+from .services.dashboard import (
+    DeviceStats, coordination_stats, dashboard_snapshot, maintenance_stats, task_stats,
+)
+from .services.devices import BulkUpdate, BulkUpdateError, UNCHANGED, filter_devices
+from .services import keyset, reference, sla
+from .services.jobs import submit_export_job, track_progress
+from .services.search import rank_devices
 
 
 def custom_403(request, exception):
@@ -60,12 +61,52 @@ def custom_404(request, exception):
 def custom_500(request):
     return render(request, '500.html', status=500)
 
+# Keyset Pagination
+class KeysetPaginationMixin:
+    """
+    Replace OFFSET pagination in a ListView with seek pagination.
+
+    ``keyset_ordering`` must end with a unique field, the page cursor travels in
+    the ``cursor`` query parameter and the page exposes ``next_query`` /
+    ``previous_query`` with the other filters kept.
+    """
+    keyset_ordering = ('-pk',)
+    paginate_by = 25
+    cursor_param = "cursor"
+
+    def paginate_queryset(self, queryset, page_size):
+        try:
+            page = keyset.paginate(queryset, self.keyset_ordering, self.request.GET.get(self.cursor_param), page_size)
+        except keyset.InvalidCursor:
+            raise Http404("Invalid page cursor.")
+        page.next_query = self.cursor_query(page.next_cursor)
+        page.previous_query = self.cursor_query(page.previous_cursor)
+        return None, page, page.object_list, page.has_other_pages()
+
+    def cursor_query(self, cursor):
+        if not cursor:
+            return None
+        params = self.request.GET.copy()
+        params[self.cursor_param] = cursor
+        return params.urlencode()
+
 # Export Excels & PDFs
 class ExportMixin:
+    # يُضبط من طرف مهمة التصدير في الخلفية لمتابعة التقدم
+    export_progress = None
+    # The pk and the sync timestamps are not report columns
+    export_exclude = ('id', 'created_at', 'updated_at')
+
+    def get_export_fields(self, model):
+        return [field for field in model._meta.fields if field.name not in self.export_exclude]
+
     def get(self, request, *args, **kwargs):
         if "export" in request.GET:
             export_format = request.GET.get("format", "excel")
-            queryset = self.get_queryset()
+            if request.GET.get("background"):
+                return self.start_export_job(export_format)
+
+            queryset = self.get_export_queryset()
 
             if not queryset.exists():
                 return HttpResponse("لا توجد بيانات للتصدير", content_type="text/plain")
@@ -77,164 +118,39 @@ class ExportMixin:
 
         return super().get(request, *args, **kwargs)
 
-    def prepare_export_response(self, content, file_type, model_name):
-        timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
-        safe_model_name = slugify(model_name) or "export"
-        filename = f"export_{safe_model_name}_{timestamp}.{file_type}"
-
-        content_types = {
-            "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            "pdf": "application/pdf",
-        }
-
-        response = HttpResponse(content, content_type=content_types.get(file_type, "application/octet-stream"))
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        return response
+    def get_export_queryset(self):
+        return self.get_queryset()
+
+    def get_export_ordering(self):
+        # قوائم الترقيم بالمفتاح تُصدَّر على دفعات بنفس الترتيب
+        return getattr(self, "keyset_ordering", None)
+
+    def track_export(self, rows):
+        if self.export_progress is None:
+            return rows
+        return track_progress(rows, self.export_progress)
+
+    def start_export_job(self, export_format):
+        params = self.request.GET.copy()
+        params.pop("background", None)
+        job = ExportJob.objects.create(
+            user=self.request.user,
+            view_name=self.request.resolver_match.url_name,
+            view_kwargs=self.kwargs,
+            query_string=params.urlencode(),
+            export_format="pdf" if export_format == "pdf" else "excel",
+        )
+        submit_export_job(job)
+        return redirect("export_job_detail", pk=job.pk)
 
+    # The report libraries load with the first export (contracts.exports), not at startup
     def export_to_excel(self, queryset):
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = f"{queryset.model._meta.verbose_name_plural}"
-
-        fields = [field.name for field in queryset.model._meta.fields[1:]]
-        headers = [field.verbose_name for field in queryset.model._meta.fields[1:]]
-
-        # Header style
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = openpyxl.styles.PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-
-        for col_num, header in enumerate(headers, 1):
-            cell = sheet.cell(row=1, column=col_num, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            sheet.column_dimensions[get_column_letter(col_num)].width = max(15, len(header) + 2)
-
-        for obj in queryset:
-            row = []
-            for field in fields:
-                value = getattr(obj, field, "")
-                if hasattr(value, "get_FOO_display"):
-                    value = value.get_FOO_display()
-                elif hasattr(value, "__str__"):
-                    value = str(value)
-                row.append(value)
-            sheet.append(row)
-
-        # Apply border to all cells
-        border = Border(left=Side(style="thin"), right=Side(style="thin"),
-                        top=Side(style="thin"), bottom=Side(style="thin"))
-
-        for row in sheet.iter_rows(min_row=1, max_row=sheet.max_row,
-                                   min_col=1, max_col=sheet.max_column):
-            for cell in row:
-                cell.border = border
-
-        output = BytesIO()
-        workbook.save(output)
-        output.seek(0)
-
-        return self.prepare_export_response(output.read(), "xlsx", queryset.model._meta.model_name)
+        from .exports import model_excel
+        return model_excel(self, queryset)
 
     def export_to_pdf(self, queryset):
-        model_name = queryset.model._meta.model_name
-        buffer = BytesIO()
-
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=landscape(A4),
-            rightMargin=10,
-            leftMargin=10,
-            topMargin=4,
-            bottomMargin=20
-        )
-
-        font_path = os.path.join(settings.STATIC_ROOT, "contracts/fonts/Janna LT Bold/Janna LT Bold.ttf")
-        pdfmetrics.registerFont(TTFont("Janna", font_path))
-
-        elements = []
-
-        # ✅ إضافة صورة SVG
-        svg_path = os.path.join(settings.STATIC_ROOT, "contracts/img/logo-1.svg")
-
-        drawing = svg2rlg(svg_path)
-        drawing.scale(1, 1)  # التحكم بالحجم
-        drawing.hAlign = "LEFT"
-
-        # إعداد العنوان
-        title_text = get_display(arabic_reshaper.reshape(f"تقرير {queryset.model._meta.verbose_name_plural}"))
-        title_style = ParagraphStyle(name="Title", fontName="Janna", fontSize=20, alignment=1, spaceAfter=0)
-        title_paragraph = Paragraph(title_text, title_style)
-
-        # إنشاء جدول مكون من عمودين: [الصورة, العنوان]
-        title_table = Table(
-            data=[[drawing, title_paragraph]],
-            colWidths=[80, 650],  # يمكنك تعديل العرض حسب حجم الصورة والعنوان
-            hAlign='RIGHT'
-        )
-        title_table.setStyle(TableStyle([
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("ALIGN", (0, 0), (0, 0), "RIGHT"),  # الصورة
-            ("ALIGN", (1, 0), (1, 0), "RIGHT"),  # العنوان
-        ]))
-
-        elements.append(title_table)
-        elements.append(Spacer(1, 25))
-
-        # ✅ جدول البيانات
-        fields = [[field.name, field.verbose_name] for field in queryset.model._meta.fields[-1:0:-1]]
-        headers = [get_display(arabic_reshaper.reshape(field[1])) for field in fields]
-        table_data = [headers]
-        max_col_lengths = [len(h) for h in headers]
-
-        for obj in queryset:
-            row = []
-            for i, field in enumerate(fields):
-                value = getattr(obj, field[0], "")
-                if hasattr(obj, f"get_{field[0]}_display"):
-                    value = getattr(obj, f"get_{field[0]}_display")()
-                elif isinstance(value, (datetime, date)):
-                    value = value.strftime("%Y-%m-%d")
-                elif isinstance(value, bool):
-                    value = "نعم" if value else "لا"
-                else:
-                    value = str(value)
-
-                if any("\u0600" <= c <= "\u06FF" for c in value):
-                    value = get_display(arabic_reshaper.reshape(value))
-
-                max_col_lengths[i] = max(max_col_lengths[i], len(value))
-                row.append(value)
-            table_data.append(row)
-
-        # ✅ تحديد عرض الأعمدة تلقائيًا
-        total_width = 780
-        min_width = 55
-        max_width = 220 
-        col_widths = []
-        sum_lengths = sum(max_col_lengths) or 1 
-        col_widths = [
-          max(min_width, min((length / sum_lengths) * total_width, max_width)) 
-          for length in max_col_lengths
-        ]
-
-        table = Table(table_data, colWidths=col_widths, repeatRows=1)
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
-            ("FONTNAME", (0, 0), (-1, -1), "Janna"),
-            ("FONTSIZE", (0, 0), (-1, -1), 10),
-            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-        ]))
-
-        elements.append(table)
-        elements.append(Spacer(1, 16))
-
-        doc.build(elements)
-        return self.prepare_export_response(buffer.getvalue(), "pdf", model_name)
+        from .exports import model_pdf
+        return model_pdf(self, queryset)
 
 class AuthViewMixin(LoginRequiredMixin):
     login_url = 'login'  # تأكد من توفر هذا الـ URL
@@ -290,66 +206,17 @@ class DashboardView(AuthViewMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # عقود
-        contracts = Contract.objects.all()
-        total_contracts = contracts.count()
-        latest_contracts = contracts.order_by('-start_date')[:5]
-
-        # مناطق
-        total_zones = Zone.objects.count()
-
-        # أجهزة
-        devices = Device.objects.all()
-        total_devices = devices.count()
-        installed_devices = devices.filter(status='installed').count()
-        available_devices = devices.filter(status='available').count()
-        damaged_devices = devices.filter(status='damaged').count()
-        devices_in_warehouse = devices.filter(current_location='warehouse').count()
-
-        # مهام
-        tasks = Task.objects.all()
-        task_summary = {
-            'total': tasks.count(),
-            'completed': tasks.filter(status='completed').count(),
-            'not_started': tasks.filter(status='not_started').count(),
-            'ongoing': tasks.filter(status='ongoing').count(),
-            'delayed': tasks.filter(status='delayed').count(),
-        }
-
-        # صيانة
-        maintenance = MaintenanceCard.objects.all()
-        maintenance_summary = {
-            'total': maintenance.count(),
-            'repaired': maintenance.exclude(repair_date__isnull=True).count(),
-            'pending': maintenance.filter(repair_date__isnull=True).count(),
-        }
-
-        # تنسيق
-        coordination = CoordinationRequest.objects.all()
-        coordination_summary = {
-            'total': coordination.count(),
-            'last_date': coordination.order_by("-request_date").first().request_date if coordination.exists() else "—"
-        }
-        latest_tasks = Task.objects.filter(status__in=["not_started", "ongoing"]).order_by('-deadline')[:20]
-
+        # Lazy: the template only evaluates these when its cached fragment is stale
         context.update({
-            "total_contracts": total_contracts,
-            "latest_contracts": latest_contracts,
-            "total_zones": total_zones,
-            "total_devices": total_devices,
-            "installed_devices": installed_devices,
-            "available_devices": available_devices,
-            "damaged_devices": damaged_devices,
-            "devices_in_warehouse": devices_in_warehouse,
-            "task_summary": task_summary,
-            "maintenance_summary": maintenance_summary,
-            "coordination_summary": coordination_summary,
-            'latest_tasks': latest_tasks,
+            "stats": SimpleLazyObject(dashboard_snapshot),
+            "latest_contracts": Contract.objects.annotate(zone_count=Count('zones')).order_by('-start_date')[:5],
+            "latest_tasks": Task.objects.filter(status__in=["not_started", "ongoing"]).order_by('-deadline')[:20],
         })
         return context
 
-class ContractListView(AuthViewMixin, ListView):
+class ContractListView(AuthViewMixin, KeysetPaginationMixin, ListView):
     model = Contract
+    keyset_ordering = ('-start_date', 'pk')
     template_name = 'contracts/contracts/list.html'
     context_object_name = 'contracts'
 
@@ -369,21 +236,39 @@ class ContractDetailView(AuthViewMixin, DetailView):
     template_name = 'contracts/contracts/detail.html'
     context_object_name = 'contract'
 
+    def get_queryset(self):
+        return Contract.objects.select_related('warehouse').prefetch_related(
+            Prefetch('items', queryset=ContractItem.objects.select_related('category')),
+            'zones',
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         contract = self.object
 
+        # الإحصائيات تُحسب باستعلامات مجمّعة (GROUP BY) بدلاً من استعلام لكل فئة أو منطقة
         context["items"] = contract.items.all()
         context["zones"] = contract.zones.all()
         context["warehouse"] = getattr(contract, 'warehouse', None)
-        context["devices"] = Device.objects.filter(zone__contract=contract)
-        context["maintenance_cards"] = MaintenanceCard.objects.filter(device__zone__contract=contract)
-        context["coordination_requests"] = CoordinationRequest.objects.filter(zone__contract=contract)
-        context["tasks"] = Task.objects.filter(zone__contract=contract)
+        context["devices"] = Device.objects.filter(zone__contract=contract).select_related('device_category', 'zone')
+        context["maintenance_cards"] = MaintenanceCard.objects.filter(device__zone__contract=contract).select_related('device')
+        context["coordination_requests"] = CoordinationRequest.objects.filter(zone__contract=contract).select_related('zone')
+        context["tasks"] = Task.objects.filter(zone__contract=contract).select_related('zone')
+
+        # Lazy: the template only evaluates these when its cached fragments are stale
+        context["category_stats"] = SimpleLazyObject(lambda: self.get_category_stats(context["items"]))
+        context["zone_stats"] = SimpleLazyObject(lambda: self.get_zone_stats(context["zones"]))
+        context["task_summary"] = SimpleLazyObject(lambda: task_stats(context["tasks"]))
+        context["maintenance_summary"] = SimpleLazyObject(lambda: maintenance_stats(context["maintenance_cards"]))
+        context["coordination_summary"] = SimpleLazyObject(lambda: coordination_stats(context["coordination_requests"]))
 
+        return context
+
+    def get_category_stats(self, items):
+        category_totals = zone_category_totals(self.object.pk)
         category_data = []
-        for item in context["items"]:
-            device_count = Device.objects.filter(device_category=item.category, zone__contract=contract).count()
+        for item in items:
+            device_count = category_totals.get(item.category_id, 0)
             percentage = (device_count / item.quantity * 100) if item.quantity else 0
             category_data.append({
                 "category_label": item.category.name,
@@ -391,43 +276,14 @@ class ContractDetailView(AuthViewMixin, DetailView):
                 "available": device_count,
                 "percentage": round(percentage, 1)
             })
-        context["category_stats"] = category_data
-
-        zone_stats = []
-        for zone in context["zones"]:
-            devices = zone.devices.all()
-            zone_stats.append({
-                'zone': zone,
-                'installed': devices.filter(status='installed').count(),
-                'available': devices.filter(status='available').count(),
-                'damaged': devices.filter(status='damaged').count(),
-                'total': devices.count(),
-            })
-        context["zone_stats"] = zone_stats
-
-        tasks = context["tasks"]
-        context["task_summary"] = {
-            'total': tasks.count(),
-            'completed': tasks.filter(status='completed').count(),
-            'ongoing': tasks.filter(status='ongoing').count(),
-            'not_started': tasks.filter(status='not_started').count(),
-            'delayed': tasks.filter(status='delayed').count(),
-        }
-
-        maintenance = context["maintenance_cards"]
-        context["maintenance_summary"] = {
-            'total': maintenance.count(),
-            'repaired': maintenance.exclude(repair_date__isnull=True).count(),
-            'pending': maintenance.filter(repair_date__isnull=True).count(),
-        }
-
-        coordination = context["coordination_requests"]
-        context["coordination_summary"] = {
-            'total': coordination.count(),
-            'last_date': coordination.order_by("-request_date").first().request_date if coordination.exists() else "—"
-        }
+        return category_data
 
-        return context
+    def get_zone_stats(self, zones):
+        stats = zone_stats(zone.pk for zone in zones)
+        return [
+            {'zone': zone, **asdict(stats.get(zone.pk, DeviceStats()))}
+            for zone in zones
+        ]
 
 class ContractFormView(AuthViewMixin, CreateView, UpdateView):
     model = Contract
@@ -544,428 +400,131 @@ def manage_device_categories(request):
         'form': form,
     })
 
-class WarehouseListView(AuthViewMixin, ListView):
+class WarehouseListView(AuthViewMixin, KeysetPaginationMixin, ListView):
     model = Warehouse
+    keyset_ordering = ('name', 'pk')
     template_name = 'contracts/warehouses/list.html'
     context_object_name = 'warehouses'
 
-class WarehouseDetailView(AuthViewMixin, DetailView):
-    model = Warehouse
-    template_name = 'contracts/warehouses/detail.html'
-    context_object_name = 'warehouse'
-
     def get_queryset(self):
-        return Warehouse.objects.select_related("contract").prefetch_related("devices")
-
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
-
-        if request.GET.get("export") == "true":
-            format_ = request.GET.get("format")
-            queryset = self.get_filtered_devices()
-            if format_ == "excel":
-                return self.export_to_excel(queryset)
-            elif format_ == "pdf":
-                return self.export_to_pdf(queryset)
-        return super().get(request, *args, **kwargs)
+        return Warehouse.objects.select_related('contract').annotate(zones_total=Count('contract__zones'))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        warehouse = self.object
-
-        # فلترة
-        devices = self.get_filtered_devices()
-        context['devices'] = devices
-
-        context['filter_status'] = self.request.GET.get('status')
-        context['filter_zone'] = self.request.GET.get('zone')
-        context['search_query'] = self.request.GET.get('q')
-        context['zones'] = Zone.objects.filter(contract=warehouse.contract)
-
-        context['total_devices'] = devices.count()
-        context['category_counts'] = devices.values('device_category__name').annotate(total=Count('serial_number'))
+        warehouses = context['warehouses']
+        stats = warehouse_stats([warehouse.pk for warehouse in warehouses])
+        for warehouse in warehouses:
+            warehouse.device_stats = stats.get(warehouse.pk, DeviceStats())
         return context
 
-    def export_to_pdf(self, queryset):
-        warehouse = self.object
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=20, leftMargin=20, topMargin=20, bottomMargin=20)
-
-        font_path = os.path.join(settings.BASE_DIR, "static", "contracts", "fonts", "Janna LT Bold", "Janna LT Bold.ttf")
-        pdfmetrics.registerFont(TTFont("Janna", font_path))
-
-        content = []
-
-        # ✅ إضافة صورة SVG
-        svg_path = os.path.join(settings.STATIC_ROOT, "contracts/img/logo-1.svg")
-
-        drawing = svg2rlg(svg_path)
-        drawing.scale(1, 1)  # التحكم بالحجم
-        drawing.hAlign = "LEFT"
+class WarehouseDetailView(AuthViewMixin, ExportMixin, DetailView):
+    model = Warehouse
+    template_name = 'contracts/warehouses/detail.html'
+    context_object_name = 'warehouse'
 
-        # إعداد العنوان
-        contract_info = f"تقرير أجهزة العقد  : {warehouse.contract.name} - {warehouse.contract.contract_number}"
-        title_text = get_display(arabic_reshaper.reshape(contract_info))
-        title_style = ParagraphStyle(name="Title", fontName="Janna", fontSize=20, alignment=1, spaceAfter=0)
-        title_paragraph = Paragraph(title_text, title_style)
+    def get_queryset(self):
+        return Warehouse.objects.select_related("contract")
 
-        # إنشاء جدول مكون من عمودين: [الصورة, العنوان]
-        title_table = Table(
-            data=[[drawing, title_paragraph]],
-            colWidths=[80, 650],  # يمكنك تعديل العرض حسب حجم الصورة والعنوان
-            hAlign='RIGHT'
-        )
-        title_table.setStyle(TableStyle([
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("ALIGN", (0, 0), (0, 0), "RIGHT"),  # الصورة
-            ("ALIGN", (1, 0), (1, 0), "RIGHT"),  # العنوان
-        ]))
-
-        content.append(title_table)
-        content.append(Spacer(1, 25))
-
-        
-        title_text = f""
-        if any("\u0600" <= c <= "\u06FF" for c in title_text):
-            title_text = get_display(arabic_reshaper.reshape(title_text))
-
-        title = Paragraph(title_text, ParagraphStyle("title", fontName="Janna", fontSize=14, alignment=1))
-        content.append(title)
-        content.append(Spacer(1, 10))
-
-        # إنشاء الفقرات
-        stats = [
-            f"عدد الأجهزة في المخزن: {warehouse.count_in_warehouse}",
-            f"المخزن: {warehouse.name} - {warehouse.location}",
-            f"إجمالي المناطق: {warehouse.count_zones}",
-            f"إجمالي الأجهزة: {warehouse.count_devices}",
-            f"عدد الأجهزة المركبة: {warehouse.count_installed}",
-            f"عدد الأجهزة المعطلة: {warehouse.count_damaged}",
-        ]
-        
-        # إعادة تشكيل كل عنصر بالعربية وإضافته في صف واحد
-        reshaped_stats = [
-            Paragraph(get_display(arabic_reshaper.reshape(s)), ParagraphStyle("stat_text", fontName="Janna", fontSize=11, alignment=2))
-            for s in stats
-        ]
-        
-        # تقسيمها إلى صفوف حسب عدد الأعمدة (مثلاً 3 أعمدة)
-        row_size = 2
-        stat_rows = [reshaped_stats[i:i+row_size] for i in range(0, len(reshaped_stats), row_size)]
-        
-        # إنشاء الجدول
-        stats_table = Table(stat_rows, colWidths=[380] * row_size, hAlign='RIGHT')
-        stats_table.setStyle(TableStyle([
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
-            ("FONTNAME", (0, 0), (-1, -1), "Janna"),
-            ("FONTSIZE", (0, 0), (-1, -1), 11),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-        ]))
-        
-        content.append(stats_table)
-        content.append(Spacer(1, 20))
-
-        
-        headers = [
-            "ملاحظات",
-            "المنطقة",
-            "تاريخ التركيب",
-            "تاريخ النقل",
-            "المسؤول",
-            "IP",
-            "الحالة",
-            "الفئة",
-            "الاسم",
-            "الرقم التسلسلي"
-        ]
-        data = [[get_display(arabic_reshaper.reshape(h)) for h in headers]]
-
-        for device in queryset:
-            row = [
-                device.notes or "",
-                device.zone.name if device.zone else "المخزن",
-                device.responsible_person or "",
-                device.installation_date.strftime("%Y-%m-%d") if device.installation_date else "",
-                device.transfer_date.strftime("%Y-%m-%d") if device.transfer_date else "",
-                device.ip_address or "",
-                dict(Device.DEVICE_STATUS_CHOICES).get(device.status, ""),
-                device.device_category.name if device.device_category else "",
-                device.name,
-                device.serial_number
-            ]
-            row = [get_display(arabic_reshaper.reshape(str(col))) if any('\u0600' <= c <= '\u06FF' for c in str(col)) else str(col) for col in row]
-            data.append(row)
-
-        table = Table(data, repeatRows=1)
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-            ("FONTNAME", (0, 0), (-1, -1), "Janna"),
-            ("FONTSIZE", (0, 0), (-1, -1), 9),
-            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
-        ]))
-        content.append(table)
-
-        doc.build(content)
-        filename = f"devices_{slugify(warehouse.name)}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        return HttpResponse(buffer.getvalue(), content_type="application/pdf", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    def get_export_queryset(self):
+        self.object = self.get_object()
+        return self.get_filtered_devices().select_related('device_category', 'zone')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         warehouse = self.object
         devices = self.get_filtered_devices().select_related('device_category', 'zone')
         context.update({
-            'devices': devices,
+            # Search ranks only the rows shown, the counts below cover every match
+            'devices': rank_devices(
+                devices.annotate(maintenance_cards_total=Count('maintenance_cards')), self.request.GET.get('q'),
+            ),
             'filter_status': self.request.GET.get('status'),
             'filter_zone': self.request.GET.get('zone'),
             'search_query': self.request.GET.get('q'),
             'zones': Zone.objects.filter(contract=warehouse.contract),
             'total_devices': devices.count(),
-            'category_counts': devices.values('device_category__name').annotate(total=Count('serial_number'))
+            'category_counts': devices.order_by().values('device_category__name').annotate(total=Count('serial_number'))
         })
         return context
 
     def get_filtered_devices(self):
-        warehouse = self.object
-        devices = warehouse.devices.all()
-        status = self.request.GET.get('status')
-        zone_id = self.request.GET.get('zone')
-        query = self.request.GET.get('q')
-
-        if status:
-            devices = devices.filter(status=status)
-        if zone_id == 'warehouse':
-            devices = devices.filter(current_location='warehouse')
-        elif zone_id:
-            devices = devices.filter(zone_id=zone_id)
-        if query:
-            devices = devices.filter(name__icontains=query)
-
-        return devices
+        return filter_devices(
+            self.object.devices.all(),
+            status=self.request.GET.get('status'),
+            zone=self.request.GET.get('zone'),
+            query=self.request.GET.get('q'),
+        )
 
     def export_to_excel(self, queryset):
-        warehouse = self.object
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Devices"
-
-        ws.merge_cells("A1:E1")
-        ws["A1"] = f"Warehouse: {warehouse.name} ({warehouse.location})"
-        ws["A1"].font = Font(bold=True)
-
-        if warehouse.contract:
-            ws.merge_cells("A2:E2")
-            ws["A2"] = f"Linked Contract: {warehouse.contract.name} ({warehouse.contract.contract_number})"
-            ws["A2"].font = Font(bold=True)
-
-        ws.append([])
-
-        stats = [
-            ("Total Zones", warehouse.count_zones),
-            ("Total Devices", warehouse.count_devices),
-            ("In Warehouse", warehouse.count_in_warehouse),
-            ("Installed", warehouse.count_installed),
-            ("Damaged", warehouse.count_damaged),
-        ]
-        ws.append(["Statistics", "Count"])
-        for label, count in stats:
-            ws.append([label, count])
-
-        ws.append([])
-
-        headers = ["Serial", "Name", "Category", "Status", "IP", "Transfer Date", "Installation Date", "Responsible", "Notes"]
-        ws.append(headers)
-
-        for device in queryset:
-            ws.append([
-                device.serial_number,
-                device.name,
-                device.device_category.name if device.device_category else "",
-                dict(Device.DEVICE_STATUS_CHOICES).get(device.status, ""),
-                device.ip_address,
-                device.transfer_date.strftime("%Y-%m-%d") if device.transfer_date else "",
-                device.installation_date.strftime("%Y-%m-%d") if device.installation_date else "",
-                device.responsible_person,
-                device.notes or ""
-            ])
-
-        for col in range(1, ws.max_column + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 20
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        filename = f"devices_{warehouse.name}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        return HttpResponse(output.read(), content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+        from .exports import warehouse_excel
+        return warehouse_excel(self, queryset)
 
     def export_to_pdf(self, queryset):
-        warehouse = self.object
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=20, leftMargin=20, topMargin=20, bottomMargin=20)
-
-        font_path = os.path.join(settings.STATIC_ROOT, "contracts/fonts/Janna LT Bold/Janna LT Bold.ttf")
-        pdfmetrics.registerFont(TTFont("Janna", font_path))
-
-        content = []
-        svg_path = os.path.join(settings.STATIC_ROOT, "contracts/img/logo-1.svg")
-        drawing = svg2rlg(svg_path)
-        drawing.scale(1, 1)
-        drawing.hAlign = "LEFT"
-
-        title_text = get_display(arabic_reshaper.reshape(f"تقرير أجهزة العقد  : {warehouse.contract.name} - {warehouse.contract.contract_number}"))
-        title_paragraph = Paragraph(title_text, ParagraphStyle(name="Title", fontName="Janna", fontSize=20, alignment=1))
-
-        title_table = Table([[drawing, title_paragraph]], colWidths=[80, 650], hAlign='RIGHT')
-        title_table.setStyle(TableStyle([
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("ALIGN", (0, 0), (0, 0), "RIGHT"),
-            ("ALIGN", (1, 0), (1, 0), "RIGHT"),
-        ]))
-
-        content.append(title_table)
-        content.append(Spacer(1, 25))
-
-        stats = [
-            f"عدد الأجهزة في المخزن: {warehouse.count_in_warehouse}",
-            f"المخزن: {warehouse.name} - {warehouse.location}",
-            f"إجمالي المناطق: {warehouse.count_zones}",
-            f"إجمالي الأجهزة: {warehouse.count_devices}",
-            f"عدد الأجهزة المعطلة: {warehouse.count_damaged}",
-            f"عدد الأجهزة المركبة: {warehouse.count_installed}"
-        ]
-
-        reshaped_stats = [
-            Paragraph(get_display(arabic_reshaper.reshape(s)), ParagraphStyle("stat_text", fontName="Janna", fontSize=11, alignment=2))
-            for s in stats
-        ]
-
-        row_size = 2
-        stat_rows = [reshaped_stats[i:i + row_size] for i in range(0, len(reshaped_stats), row_size)]
-        stats_table = Table(stat_rows, colWidths=[380] * row_size, hAlign='RIGHT')
-        stats_table.setStyle(TableStyle([
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
-            ("FONTNAME", (0, 0), (-1, -1), "Janna"),
-            ("FONTSIZE", (0, 0), (-1, -1), 11),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-        ]))
-
-        content.append(stats_table)
-        content.append(Spacer(1, 20))
-
-        headers = ["ملاحظات", "المنطقة", "تاريخ التركيب", "تاريخ النقل", "المسؤول", "IP", "الحالة", "الفئة", "الاسم", "الرقم التسلسلي"]
-        data = [[get_display(arabic_reshaper.reshape(h)) for h in headers]]
-
-        for device in queryset:
-            row = [
-                device.notes or "",
-                device.zone.name if device.zone else "المخزن",
-                device.installation_date.strftime("%Y-%m-%d") if device.installation_date else "",
-                device.transfer_date.strftime("%Y-%m-%d") if device.transfer_date else "",
-                device.responsible_person or "",
-                device.ip_address or "",
-                dict(Device.DEVICE_STATUS_CHOICES).get(device.status, ""),
-                device.device_category.name if device.device_category else "",
-                device.name,
-                device.serial_number
-            ]
-            row = [get_display(arabic_reshaper.reshape(str(col))) if any("\u0600" <= c <= "\u06FF" for c in str(col)) else str(col) for col in row]
-            data.append(row)
-
-        table = Table(data, repeatRows=1)
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-            ("FONTNAME", (0, 0), (-1, -1), "Janna"),
-            ("FONTSIZE", (0, 0), (-1, -1), 9),
-            ("ALIGN", (0, 0), (-1, -1), "RIGHT")
-        ]))
-
-        content.append(table)
-        doc.build(content)
-
-        filename = f"devices_{warehouse.name}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        return HttpResponse(buffer.getvalue(), content_type="application/pdf", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+        from .exports import warehouse_pdf
+        return warehouse_pdf(self, queryset)
 
 class DeviceImportView(AuthViewMixin, View):
     template_name = "contracts/devices/import_devices.html"
+    # عدد الأخطاء المعروضة في الصفحة، التقرير الكامل يُحمّل كملف Excel
+    preview_errors = 50
+    report_session_key = "device_import_report"
 
     def get(self, request):
-        return render(request, self.template_name)
+        return render(request, self.template_name, self.get_context_data())
+
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault("has_report", self.report_session_key in self.request.session)
+        return kwargs
+
+    def discard_report(self):
+        name = self.request.session.pop(self.report_session_key, None)
+        if name:
+            default_storage.delete(name)
+
+    def save_report(self, report):
+        self.discard_report()
+        if not report.is_valid:
+            name = f"imports/reports/{uuid.uuid4().hex}.xlsx"
+            self.request.session[self.report_session_key] = default_storage.save(name, File(report.to_xlsx()))
 
     def post(self, request):
-        excel_file = request.FILES.get("file")
-        if not excel_file:
-            messages.error(request, "Please upload an Excel file.")
+        from .imports import UnreadableFile, detect_format, dry_run, start_session
+
+        upload = request.FILES.get("file")
+        if not upload:
+            messages.error(request, "Please upload an Excel or CSV file.")
             return redirect("import_devices")
 
+        file_format = detect_format(upload.name)
+        if file_format is None:
+            messages.error(request, "Only .xlsx and .csv files can be imported.")
+            return redirect("import_devices")
+
+        if not request.POST.get("dry_run"):
+            session = start_session(request.user, upload, file_format)
+            return redirect("import_session_detail", pk=session.pk)
+
         try:
-            df = pd.read_excel(excel_file, engine="openpyxl")
-
-            for index, row in df.iterrows():
-                category_name = str(row.get("device_category") or "").strip()
-                warehouse_name = str(row.get("warehouse_name") or "").strip()
-                zone_name = str(row.get("zone_name") or "").strip()
-
-                if not category_name or not warehouse_name:
-                    continue
-
-                category, _ = DeviceCategory.objects.get_or_create(name=category_name)
-
-                contract_name = f"AutoContract-{warehouse_name}"
-                contract, _ = Contract.objects.get_or_create(
-                    name=contract_name,
-                    defaults={
-                        "contract_number": f"CN-{warehouse_name[:5]}-{index}",
-                        "start_date": timezone.now().date(),
-                        "notes": "Auto-generated contract for import"
-                    }
-                )
-
-                warehouse, _ = Warehouse.objects.get_or_create(
-                    name=warehouse_name,
-                    defaults={"location": "Auto-Imported", "contract": contract}
-                )
-
-                zone = None
-                if zone_name:
-                    zone, _ = Zone.objects.get_or_create(
-                        name=zone_name,
-                        contract=contract,
-                        defaults={"notes": "Auto-created via import"}
-                    )
-
-                ContractItem.objects.get_or_create(
-                    contract=contract,
-                    category=category,
-                    defaults={"quantity": 1, "notes": "Auto-added on import"}
-                )
-
-                Device.objects.update_or_create(
-                    serial_number=str(row.get("serial_number")).strip(),
-                    defaults={
-                        "name": str(row.get("name") or "").strip(),
-                        "invoice_number": str(row.get("invoice_number") or "").strip(),
-                        "device_category": category,
-                        "warehouse": warehouse,
-                        "zone": zone,
-                        "status": str(row.get("status") or "").strip(),
-                        "current_location": str(row.get("current_location") or "").strip(),
-                        "ip_address": row.get("ip_address") or None,
-                        "responsible_person": str(row.get("responsible_person") or "").strip(),
-                        "transfer_date": row.get("transfer_date") if not pd.isna(row.get("transfer_date")) else None,
-                        "installation_date": row.get("installation_date") if not pd.isna(row.get("installation_date")) else None,
-                        "notes": str(row.get("notes") or "").strip(),
-                    }
-                )
-
-            messages.success(request, "Devices imported successfully.")
-
-        except Exception as e:
-            messages.error(request, f"An error occurred during import: {str(e)}")
-
-        return redirect("import_devices")
+            report = dry_run(upload, file_format)
+        except UnreadableFile:
+            messages.error(request, "The uploaded file is not a valid Excel or CSV file.")
+            return redirect("import_devices")
+
+        self.save_report(report)
+        return render(request, self.template_name, self.get_context_data(
+            dry_run=True,
+            report=report,
+            errors=report.errors.head(self.preview_errors).itertuples(index=False),
+        ))
+
+
+@login_required
+@require_GET
+def import_devices_report(request):
+    name = request.session.get(DeviceImportView.report_session_key)
+    if not name or not default_storage.exists(name):
+        raise Http404("No import report available.")
+    return FileResponse(default_storage.open(name, 'rb'), as_attachment=True, filename="device_import_errors.xlsx")
 
 class DeviceFormView(AuthViewMixin, FormView):
     model = Device
@@ -1005,9 +564,9 @@ class DeviceFormView(AuthViewMixin, FormView):
         form.instance.warehouse = self.warehouse
 
         if form.is_valid() and formset.is_valid():
+            form.instance.properties = formset.properties
+            form.instance.required_properties = formset.required_properties
             self.object = form.save()
-            formset.instance = self.object
-            formset.save()
 
             action = 'updated' if self.device else 'added'
             messages.success(self.request, f"Device '{form.instance.name}' has been successfully {action}.")
@@ -1080,9 +639,81 @@ def update_device_status(request, pk):
     messages.error(request, "Invalid status selected.")
     return redirect('device_detail', pk=device.pk)
 
+
+def _bulk_devices(payload):
+    """The devices a bulk update targets: ``(queryset, None)`` for a filter, ``(None, ids)`` for a list of ids."""
+    if 'devices' in payload:
+        device_ids = payload['devices']
+        # bool is an int too, and int() would take "12" or 1.5
+        if not isinstance(device_ids, list) or not all(type(pk) is int for pk in device_ids):
+            raise BulkUpdateError("devices must be a list of device ids.")
+        return None, device_ids
+    device_filter = payload.get('filter')
+    if not isinstance(device_filter, dict) or not device_filter.get('warehouse'):
+        raise BulkUpdateError("Give a list of devices or a filter with a warehouse.")
+    warehouse = Warehouse.objects.filter(pk=device_filter['warehouse']).first()
+    if warehouse is None:
+        raise BulkUpdateError(f"Warehouse {device_filter['warehouse']} does not exist.")
+    try:
+        devices = filter_devices(
+            warehouse.devices.all(),
+            status=device_filter.get('status'),
+            zone=device_filter.get('zone'),
+            query=device_filter.get('q'),
+            category=device_filter.get('category'),
+            properties=device_filter.get('properties'),
+        )
+    except (AttributeError, ValueError) as exc:
+        raise BulkUpdateError(f"Invalid property filter: {exc}")
+    return devices, None
+
+
+@login_required
+@require_POST
+def bulk_update_devices(request):
+    """
+    Change the status, zone or transfer date of many devices at once. The JSON body
+    names the devices (``"devices": [ids]``) or filters them like the warehouse page
+    (``"filter": {"warehouse": id, "status", "zone", "category", "q", "properties"}``), and gives the
+    changes: ``"status"``, ``"zone"`` (null for the warehouse) and ``"transfer_date"``.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': "The body must be a JSON object."}, status=400)
+
+    try:
+        transfer_date = payload.get('transfer_date')
+        try:
+            transfer_date = date.fromisoformat(transfer_date) if transfer_date else None
+        except (TypeError, ValueError):
+            raise BulkUpdateError(f"Invalid transfer date: {transfer_date}.")
+        operation = BulkUpdate(
+            status=payload.get('status') or None,
+            zone=payload.get('zone') if 'zone' in payload else UNCHANGED,
+            transfer_date=transfer_date,
+        )
+        devices, device_ids = _bulk_devices(payload)
+        results = operation.apply(devices=devices, device_ids=device_ids)
+    except BulkUpdateError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    return JsonResponse({
+        'updated': len(operation.updated),
+        'failed': len(results) - len(operation.updated),
+        'results': [asdict(result) for result in results],
+    })
+
+
+# Pages of options for the AJAX Select2 widgets of contracts.fields
+select2_choices = login_required(AutoResponseView.as_view())
+
 # Maintenance Views
-class MaintenanceListView(AuthViewMixin, ExportMixin, ListView):
+class MaintenanceListView(AuthViewMixin, KeysetPaginationMixin, ExportMixin, ListView):
     model = MaintenanceCard
+    keyset_ordering = ('-report_date', '-pk')
     template_name = 'contracts/maintenance/list.html'
     context_object_name = 'maintenance_cards'
 
@@ -1090,17 +721,12 @@ class MaintenanceListView(AuthViewMixin, ExportMixin, ListView):
         queryset = super().get_queryset().select_related('device', 'device__zone', 'device__zone__contract')
 
         # Get filters
-        contract_number = self.request.GET.get('contract')
         zone_id = self.request.GET.get('zone')
         category_id = self.request.GET.get('category')
         status = self.request.GET.get('status')
 
         # Get contract
-        if contract_number:
-            contract = Contract.objects.filter(contract_number=contract_number).first()
-        else:
-            contract = Contract.objects.last()
-
+        contract = self.get_filter_contract()
         if contract:
             queryset = queryset.filter(device__zone__contract=contract)
 
@@ -1120,6 +746,12 @@ class MaintenanceListView(AuthViewMixin, ExportMixin, ListView):
 
         return queryset
 
+    def get_filter_contract(self):
+        contract_number = self.request.GET.get('contract')
+        if contract_number:
+            return reference.get_contract(contract_number)
+        return reference.last_contract()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
@@ -1129,15 +761,13 @@ class MaintenanceListView(AuthViewMixin, ExportMixin, ListView):
         status = self.request.GET.get('status')
 
         # Get current contract (to list zones)
-        if contract_number:
-            contract = Contract.objects.filter(contract_number=contract_number).first()
-        else:
-            contract = Contract.objects.last()
+        contract = self.get_filter_contract()
 
+        # Dropdowns come from the reference cache
         context.update({
-            'contracts': Contract.objects.all(),
-            'zones': Zone.objects.filter(contract=contract) if contract else Zone.objects.none(),
-            'categories': DeviceCategory.objects.all(),
+            'contracts': reference.contracts(),
+            'zones': reference.zones(contract.pk) if contract else [],
+            'categories': reference.categories(),
 
             'filter_contract': contract_number or (contract.contract_number if contract else None),
             'filter_zone': zone_id,
@@ -1213,11 +843,11 @@ class MaintenanceDeleteView(AuthViewMixin, DeleteView):
 
 
 # Coordination Views
-class CoordinationListView(AuthViewMixin, ExportMixin, ListView):
+class CoordinationListView(AuthViewMixin, KeysetPaginationMixin, ExportMixin, ListView):
     model = CoordinationRequest
     template_name = 'contracts/coordination/list.html'
     context_object_name = 'coordination'
-    paginate_by = 25
+    keyset_ordering = ('-request_date', '-pk')
 
     def get_queryset(self):
         contract_id = self.request.GET.get('contract')
@@ -1227,7 +857,7 @@ class CoordinationListView(AuthViewMixin, ExportMixin, ListView):
         if contract_id:
             queryset = queryset.filter(zone__contract_id=contract_id)
         else:
-            last_contract = Contract.objects.last()
+            last_contract = reference.last_contract()
             if last_contract:
                 queryset = queryset.filter(zone__contract=last_contract)
 
@@ -1238,13 +868,13 @@ class CoordinationListView(AuthViewMixin, ExportMixin, ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        last_contract = Contract.objects.last()
+        last_contract = reference.last_contract()
         contract_id = self.request.GET.get('contract') or (last_contract.contract_number if last_contract else None)
         zone_id = self.request.GET.get('zone')
 
         context.update({
-            'contracts': Contract.objects.all(),
-            'zones': Zone.objects.filter(contract_id=contract_id) if contract_id else Zone.objects.none(),
+            'contracts': reference.contracts(),
+            'zones': reference.zones(contract_id),
             'filter_contract': contract_id,
             'filter_zone': zone_id if zone_id and zone_id.isdigit() else ''
         })
@@ -1280,23 +910,49 @@ class CoordinationDeleteView(AuthViewMixin, DeleteView):
         messages.success(request, "Coordination request deleted successfully.")
         return super().delete(request, *args, **kwargs)
 
-class TaskListView(AuthViewMixin, ListView):
+class TaskListView(AuthViewMixin, KeysetPaginationMixin, ListView):
     model = Task
     template_name = 'contracts/tasks/list.html'
     context_object_name = 'tasks'
     paginate_by = 10
+    deadline_ordering = ('deadline', 'pk')
+    # ?sort=late: most days past the deadline first
+    lateness_ordering = ('-sla_late_days', 'deadline', 'pk')
+
+    @property
+    def keyset_ordering(self):
+        # An open task is the later the older its deadline, so with ?open=1 the deadline
+        # order is already the most late first, read from the (zone, deadline, id) index.
+        # Delivered tasks keep the lateness of their delivery, which only the computed
+        # sla_late_days orders.
+        if self.request.GET.get('sort') == 'late' and not self.open_only():
+            return self.lateness_ordering
+        return self.deadline_ordering
+
+    def open_only(self):
+        """``?open=1``: only the tasks not delivered yet."""
+        return self.request.GET.get('open') == '1'
+
+    def get_min_late_days(self):
+        """``?late=N``: only tasks at least N days past their deadline (``late=1`` for every late task)."""
+        try:
+            return max(int(self.request.GET.get('late', '')), 1)
+        except ValueError:
+            return None
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related('zone', 'zone__contract')
+        on = sla.today()
+        queryset = sla.annotate(super().get_queryset().select_related('zone', 'zone__contract'), on)
 
         contract_id = self.request.GET.get('contract')
         zone_id = self.request.GET.get('zone')
         status = self.request.GET.get('status')
+        min_late_days = self.get_min_late_days()
 
         if contract_id:
             queryset = queryset.filter(zone__contract_id=contract_id)
         else:
-            last_contract = Contract.objects.last()
+            last_contract = reference.last_contract()
             if last_contract:
                 queryset = queryset.filter(zone__contract=last_contract)
 
@@ -1304,29 +960,15 @@ class TaskListView(AuthViewMixin, ListView):
             queryset = queryset.filter(zone_id=zone_id)
 
         if status:
-            queryset = queryset.filter(status=status)
+            queryset = queryset.filter(sla.status_filter(status, on))
 
-        return queryset.order_by('deadline')
+        if min_late_days:
+            queryset = queryset.filter(sla.late_filter(min_late_days, on))
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        contract_id = self.request.GET.get('contract')
+        if self.open_only():
+            queryset = queryset.filter(actual_delivery_date__isnull=True)
 
-        context['contracts'] = Contract.objects.all()
-
-        # تحديد العقد الحالي أو الأخير
-        if contract_id:
-            context['filter_contract'] = str(contract_id)
-            context['zones'] = Zone.objects.filter(contract_id=contract_id)
-        else:
-            last_contract = Contract.objects.last()
-            context['filter_contract'] = last_contract.pk if last_contract else None
-            context['zones'] = Zone.objects.filter(contract=last_contract) if last_contract else []
-
-        context['selected_zone'] = self.request.GET.get('zone')
-        context['selected_status'] = self.request.GET.get('status')
-
-        return context
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -1335,14 +977,19 @@ class TaskListView(AuthViewMixin, ListView):
         zone_id = self.request.GET.get('zone')
         status = self.request.GET.get('status')
 
-        last_contract = Contract.objects.last()
+        last_contract = reference.last_contract()
+        filter_contract = contract_id or (last_contract.pk if last_contract else None)
 
         context.update({
-            'contracts': Contract.objects.all(),
-            'zones': Zone.objects.filter(contract_id=contract_id) if contract_id else Zone.objects.filter(contract=last_contract) if last_contract else Zone.objects.none(),
-            'filter_contract': contract_id or (last_contract.pk if last_contract else None),
+            'contracts': reference.contracts(),
+            'zones': reference.zones(filter_contract),
+            'filter_contract': filter_contract,
             'selected_zone': zone_id,
             'selected_status': status,
+            'selected_late': self.get_min_late_days(),
+            'selected_sort': self.request.GET.get('sort'),
+            'selected_open': self.open_only(),
+            'late_choices': (1, 7, 30),
         })
 
         return context
@@ -1405,3 +1052,75 @@ class TaskDeleteView(AuthViewMixin, DeleteView):
         task = self.get_object()
         messages.success(request, f"Task '{task.name}' has been deleted successfully.")
         return super().delete(request, *args, **kwargs)
+
+
+# Export Jobs
+class ExportJobDetailView(AuthViewMixin, DetailView):
+    model = ExportJob
+    template_name = 'contracts/exports/detail.html'
+    context_object_name = 'job'
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user)
+
+
+@login_required
+@require_GET
+def export_job_status(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+    return JsonResponse({
+        'id': str(job.pk),
+        'status': job.status,
+        'progress': job.progress,
+        'rows_total': job.rows_total,
+        'rows_done': job.rows_done,
+        'error': job.error,
+        'download_url': reverse('export_job_download', args=[job.pk]) if job.status == 'done' else None,
+    })
+
+
+@login_required
+@require_GET
+def export_job_download(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user, status='done')
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=os.path.basename(job.file.name))
+
+
+# Import Sessions
+class ImportSessionDetailView(AuthViewMixin, DetailView):
+    model = ImportSession
+    template_name = 'contracts/devices/import_session.html'
+    context_object_name = 'session'
+
+    def get_queryset(self):
+        return ImportSession.objects.filter(user=self.request.user)
+
+
+@login_required
+@require_GET
+def import_session_status(request, pk):
+    session = get_object_or_404(ImportSession, pk=pk, user=request.user)
+    return JsonResponse({
+        'id': str(session.pk),
+        'status': session.status,
+        'progress': session.progress,
+        'rows_total': session.rows_total,
+        'rows_done': session.rows_done,
+        'rows_per_second': session.rows_per_second,
+        'chunks_done': session.chunks_done,
+        'created': session.created_count,
+        'updated': session.updated_count,
+        'skipped': session.skipped_count,
+        'invalid_rows': session.invalid_rows,
+        'error': session.error,
+        'report_url': reverse('import_session_report', args=[session.pk]) if session.report else None,
+    })
+
+
+@login_required
+@require_GET
+def import_session_report(request, pk):
+    session = get_object_or_404(ImportSession, pk=pk, user=request.user)
+    if not session.report:
+        raise Http404("No import report available.")
+    return FileResponse(session.report.open('rb'), as_attachment=True, filename="device_import_errors.xlsx")